@@ -0,0 +1,274 @@
+"""Benchmarks every parse_* method, parse_spell_library_json and csv_to_sql against local data.
+
+The API is replaced by an in-memory replay of json_dumps/ (optionally scaled up with synthetic copies of every
+entity) and the parse results go to a sink that only counts rows, so the numbers cover fetching, caching and row
+building only. Results are written as json for comparing commits:
+
+    python benchmark.py --scales 1,10 --output benchmark_results.json
+    python benchmark.py --compare benchmark_results.json
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from cache_service import FileCache, SqliteCache, DEFAULT_PATHS, is_partial_folder
+from config import CSV_OUTPUT_DIR, SPELL_LIBRARY_PATH
+from parser import Parser, Methods
+from transport import ReplayTransport, request_key
+
+API_URL = 'https://www.dnd5eapi.co/api/'
+
+
+class CountingSink:
+    def __init__(self):
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def write(self, name, rows) -> None:
+        count = sum(1 for _ in rows) - 1
+        with self._lock:
+            self.rows += count
+
+    def close(self) -> None:
+        pass
+
+
+class CountingTransport:
+    def __init__(self, transport):
+        self.transport = transport
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.requests += 1
+        return self.transport.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def _levels(index: str) -> List[Dict]:
+    return [
+        {
+            'level': level,
+            'ability_score_bonuses': level // 4,
+            'prof_bonus': 2 + (level - 1) // 4,
+            'features': [{'index': f'{index}-{level}', 'name': f'Feature {level}'}],
+            'spellcasting': {'cantrips_known': 2, 'spell_slots_level_1': 2},
+            'index': f'{index}-{level}',
+        }
+        for level in range(1, 21)
+    ]
+
+
+def stub_api(source_dir: str = DEFAULT_PATHS['files'], scale: int = 1, url: str = API_URL) -> Dict[str, Dict]:
+    """Replay archive entries for every list, item and /levels route of the entities in a json_dumps tree.
+
+    ``scale`` > 1 adds synthetic copies of every entity (``<index>-x<n>``).
+    """
+    source = FileCache(source_dir)
+    entries = {}
+
+    def add(path, body):
+        entries[request_key('GET', url + path)] = {
+            'status': 200, 'headers': {'Content-Type': 'application/json'}, 'body': json.dumps(body),
+        }
+
+    for folder in source.folders():
+        # route lists and /levels responses (lists, not entities) are cached next to the entities, they are
+        # generated here instead, the graphql backend's partial entities are left out
+        if folder == 'lists' or folder.endswith('_levels') or is_partial_folder(folder):
+            continue
+        route = folder.replace('_', '-')
+        results = []
+        for index, entry in source.get_entries(folder).items():
+            data = entry.data
+            for copy in range(scale):
+                copy_index = index if copy == 0 else f'{index}-x{copy}'
+                item = dict(data, index=copy_index, name=f"{data.get('name')}{'' if copy == 0 else f' {copy}'}")
+                results.append({'index': copy_index, 'name': item['name'], 'url': f'/api/{route}/{copy_index}'})
+                add(f'{route}/{copy_index}', item)
+                if folder in ('classes', 'subclasses'):
+                    add(f'{route}/{copy_index}/levels', _levels(copy_index))
+        add(route, {'count': len(results), 'results': results})
+    return entries
+
+
+def scaled_spell_library(scale: int, directory: str) -> str:
+    if scale == 1:
+        return SPELL_LIBRARY_PATH
+    with open(SPELL_LIBRARY_PATH) as spell_library:
+        spells = json.load(spell_library)
+    path = os.path.join(directory, 'spell_library.json')
+    with open(path, 'w') as scaled:
+        json.dump({f'{key}-{copy}': spell for copy in range(scale) for key, spell in spells.items()}, scaled)
+    return path
+
+
+def scaled_csv(path: str, scale: int, directory: str) -> str:
+    if scale == 1:
+        return path
+    scaled_path = os.path.join(directory, os.path.basename(path))
+    with open(path, newline='') as source, open(scaled_path, 'w', newline='') as scaled:
+        reader = csv.reader(source)
+        writer = csv.writer(scaled)
+        writer.writerow(next(reader))
+        rows = list(reader)
+        for _ in range(scale):
+            writer.writerows(rows)
+    return scaled_path
+
+
+def measure(name: str, func: Callable[[], Dict], memory: bool = True) -> Dict:
+    """Runs ``func`` once for wall time and, with ``memory``, once more under tracemalloc for peak memory."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        counters = func()
+        seconds = time.perf_counter() - started
+        peak = None
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    result = {'name': name, 'seconds': round(seconds, 4), 'peak_memory_bytes': peak, **counters}
+    units = counters.get('items') or counters.get('rows')
+    result['throughput_per_second'] = round(units / seconds, 1) if units and seconds else None
+    return result
+
+
+def parse_scenarios(scale: int, backend: str, memory: bool, workers: int) -> List[Dict]:
+    entries = stub_api(scale=scale)
+    results = []
+
+    for method in [method for method in Methods if method.value.startswith('parse_')]:
+        workdir = tempfile.mkdtemp(prefix='dnd_bench_')
+        try:
+            cache_path = os.path.join(workdir, 'cache.sqlite') if backend == 'sqlite' else os.path.join(workdir, 'json_dumps')
+
+            def run(fresh_cache: bool):
+                def job():
+                    if fresh_cache and backend == 'sqlite':
+                        for suffix in ('', '-wal', '-shm'):
+                            with contextlib.suppress(FileNotFoundError):
+                                os.remove(cache_path + suffix)
+                    elif fresh_cache:
+                        shutil.rmtree(cache_path, ignore_errors=True)
+                    cache = SqliteCache(cache_path) if backend == 'sqlite' else FileCache(cache_path)
+                    sink = CountingSink()
+                    transport = CountingTransport(ReplayTransport(entries=entries))
+                    parser = Parser(cache=cache, sinks=[sink], transport=transport, max_workers=workers,
+                                    fetch_backend='rest', offline=False)
+                    parser.url = API_URL
+                    getattr(parser, method.value)()
+                    parser.close()
+                    return {'rows': sink.rows, 'requests': transport.requests}
+                return job
+
+            results.append(measure(f'{method.value}[cold,x{scale},{backend}]', run(fresh_cache=True), memory))
+            results.append(measure(f'{method.value}[warm,x{scale},{backend}]', run(fresh_cache=False), memory))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def export_scenarios(scale: int, memory: bool) -> List[Dict]:
+    results = []
+    workdir = tempfile.mkdtemp(prefix='dnd_bench_')
+    try:
+        library = scaled_spell_library(scale, workdir)
+
+        def spell_library():
+            sink = CountingSink()
+            Parser(sinks=[sink]).parse_spell_library_json(library)
+            return {'rows': sink.rows, 'requests': 0}
+
+        results.append(measure(f'parse_spell_library_json[x{scale}]', spell_library, memory))
+
+        spells_csv = os.path.abspath(scaled_csv(os.path.join(CSV_OUTPUT_DIR, 'DnD entities data - Spells.csv'),
+                                                scale, workdir))
+
+        def csv_to_sql():
+            # csv_to_sql writes output.sql into the working directory
+            current = os.getcwd()
+            os.chdir(workdir)
+            try:
+                Parser.csv_to_sql(spells_csv, 'spells')
+            finally:
+                os.chdir(current)
+            with open(spells_csv, newline='') as csv_file:
+                return {'rows': sum(1 for _ in csv.reader(csv_file)) - 1, 'requests': 0}
+
+        results.append(measure(f'csv_to_sql[spells,x{scale}]', csv_to_sql, memory))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path: str, results: List[Dict]) -> None:
+    with open(previous_path) as previous_file:
+        previous = {result['name']: result for result in json.load(previous_file)['results']}
+    for result in results:
+        old = previous.get(result['name'])
+        if not old or not old['seconds']:
+            continue
+        change = (result['seconds'] - old['seconds']) / old['seconds'] * 100
+        print(f"{result['name']:<55} {old['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s ({change:+.1f}%)")
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument('--scales', default='1,10', help='comma separated entity count multipliers')
+    arguments.add_argument('--backends', default='files,sqlite', help='cache backends to run the parsers with')
+    arguments.add_argument('--workers', type=int, default=16, help='max_workers of the parser')
+    arguments.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    arguments.add_argument('--output', default='benchmark_results.json')
+    arguments.add_argument('--compare', help='earlier results file to compare against')
+    args = arguments.parse_args()
+
+    results = []
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        for backend in args.backends.split(','):
+            results.extend(parse_scenarios(scale, backend, not args.no_memory, args.workers))
+        results.extend(export_scenarios(scale, not args.no_memory))
+
+    for result in results:
+        peak = f"{result['peak_memory_bytes'] / 1e6:.1f} MB" if result['peak_memory_bytes'] is not None else '-'
+        print(f"{result['name']:<55} {result['seconds']:>9.3f}s {result['throughput_per_second'] or 0:>12.0f}/s "
+              f"{result['requests']:>7} requests {peak:>10}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+    with open(args.output, 'w') as output:
+        json.dump({
+            'commit': git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'results': results,
+        }, output, indent=2)
+    print(f'results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Iterable, Tuple
+
+from cachetools import LRUCache
+
+from config import CACHE_BACKEND, CACHE_PATH, CACHE_TTLS, CACHE_DEFAULT_TTL, CACHE_MEMORY_SIZE
+
+DEFAULT_PATHS = {
+    'files': 'json_dumps',
+    'sqlite': 'cache.sqlite',
+}
+
+
+# entities of the graphql backend only carry the fields the parsers read, they are cached next to the full REST
+# ones (spells_graphql/fireball) so that nothing reading spells/ gets a partial entity
+PARTIAL_FOLDER_SUFFIX = '_graphql'
+
+
+def partial_folder(folder: str) -> str:
+    return folder + PARTIAL_FOLDER_SUFFIX
+
+
+def is_partial_folder(folder: str) -> bool:
+    return folder.endswith(PARTIAL_FOLDER_SUFFIX)
+
+
+def content_hash(data) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    data: Dict
+    fetched_at: Optional[float] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    hash: Optional[str] = None
+
+    def meta(self) -> Dict:
+        return {
+            'fetched_at': self.fetched_at,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'hash': self.hash,
+        }
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """Writes a temporary file next to ``path`` and renames it, so a crash never leaves a truncated file."""
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as to_local:
+            json.dump(data, to_local)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+class FileCache:
+    """One json file per entity: <root_dir>/<folder>/<key>.json
+
+    Fetch metadata (time, ETag, Last-Modified, hash) lives in one file per folder: <root_dir>/_meta/<folder>.json
+    """
+
+    META_FOLDER = '_meta'
+
+    def __init__(self, root_dir: str = DEFAULT_PATHS['files']):
+        self.root_dir = root_dir
+        self._known_folders = set()
+        self._meta: Dict[str, Dict[str, Dict]] = {}
+        self._meta_lock = threading.Lock()
+
+    def _folder_path(self, folder: str) -> str:
+        path = os.path.join(self.root_dir, folder)
+        if folder not in self._known_folders:
+            os.makedirs(path, exist_ok=True)
+            self._known_folders.add(folder)
+        return path
+
+    def _item_path(self, folder: str, key: str) -> str:
+        return os.path.join(self._folder_path(folder), f'{key}.json')
+
+    def _meta_path(self, folder: str) -> str:
+        return os.path.join(self._folder_path(self.META_FOLDER), f'{folder}.json')
+
+    def _folder_meta(self, folder: str) -> Dict[str, Dict]:
+        # must be called with _meta_lock held
+        if folder not in self._meta:
+            try:
+                with open(self._meta_path(folder), 'r') as from_local:
+                    self._meta[folder] = json.load(from_local)
+            except (FileNotFoundError, ValueError):
+                # a meta file truncated by a crash only loses the validators, the items are revalidated
+                self._meta[folder] = {}
+        return self._meta[folder]
+
+    def folders(self) -> List[str]:
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(
+            folder for folder in os.listdir(self.root_dir)
+            if folder != self.META_FOLDER and os.path.isdir(os.path.join(self.root_dir, folder))
+        )
+
+    def keys(self, folder: str) -> List[str]:
+        return sorted(
+            file_name[:-len('.json')] for file_name in os.listdir(self._folder_path(folder))
+            if file_name.endswith('.json')
+        )
+
+    def get_entries(self, folder: str, keys: Optional[Iterable[str]] = None) -> Dict[str, CacheEntry]:
+        keys = self.keys(folder) if keys is None else keys
+        with self._meta_lock:
+            folder_meta = dict(self._folder_meta(folder))
+
+        found = {}
+        for key in keys:
+            path = self._item_path(folder, key)
+            try:
+                with open(path, 'r') as from_local:
+                    data = json.load(from_local)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                # a file truncated by a crash (before writes were atomic) is refetched like a missing one
+                continue
+            meta = folder_meta.get(key) or {'fetched_at': os.path.getmtime(path)}
+            found[key] = CacheEntry(data=data, **meta)
+        return found
+
+    def put_entries(self, folder: str, entries: Dict[str, CacheEntry]) -> None:
+        for key, entry in entries.items():
+            _write_json_atomic(self._item_path(folder, key), entry.data)
+        self.put_meta(folder, entries)
+
+    def put_meta(self, folder: str, entries: Dict[str, CacheEntry]) -> None:
+        if not entries:
+            return
+        with self._meta_lock:
+            folder_meta = self._folder_meta(folder)
+            folder_meta.update({key: entry.meta() for key, entry in entries.items()})
+            _write_json_atomic(self._meta_path(folder), folder_meta)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteCache:
+    """All entities in a single sqlite file, indexed by (folder, key)."""
+
+    # sqlite's default limit of host parameters per statement is 999
+    _BATCH = 900
+    _META_COLUMNS = ('fetched_at', 'etag', 'last_modified', 'hash')
+
+    def __init__(self, path: str = DEFAULT_PATHS['sqlite']):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS entities ('
+            'folder TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, '
+            'fetched_at REAL, etag TEXT, last_modified TEXT, hash TEXT, '
+            'PRIMARY KEY (folder, key)) WITHOUT ROWID'
+        )
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(entities)')}
+        for column in self._META_COLUMNS:
+            if column not in columns:
+                column_type = 'REAL' if column == 'fetched_at' else 'TEXT'
+                self._connection.execute(f'ALTER TABLE entities ADD COLUMN {column} {column_type}')
+        self._connection.commit()
+
+    def folders(self) -> List[str]:
+        with self._lock:
+            return [folder for folder, in self._connection.execute('SELECT DISTINCT folder FROM entities ORDER BY folder')]
+
+    def keys(self, folder: str) -> List[str]:
+        with self._lock:
+            cursor = self._connection.execute('SELECT key FROM entities WHERE folder = ? ORDER BY key', (folder,))
+            return [key for key, in cursor]
+
+    def get_entries(self, folder: str, keys: Optional[Iterable[str]] = None) -> Dict[str, CacheEntry]:
+        select = f'SELECT key, data, {", ".join(self._META_COLUMNS)} FROM entities WHERE folder = ?'
+        with self._lock:
+            if keys is None:
+                rows = self._connection.execute(select, (folder,)).fetchall()
+            else:
+                keys = list(keys)
+                rows = []
+                for start in range(0, len(keys), self._BATCH):
+                    batch = keys[start:start + self._BATCH]
+                    rows.extend(self._connection.execute(
+                        f'{select} AND key IN ({", ".join("?" * len(batch))})', (folder, *batch)
+                    ).fetchall())
+        return {
+            key: CacheEntry(json.loads(data), fetched_at, etag, last_modified, hash_)
+            for key, data, fetched_at, etag, last_modified, hash_ in rows
+        }
+
+    def put_entries(self, folder: str, entries: Dict[str, CacheEntry]) -> None:
+        if not entries:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO entities (folder, key, data, fetched_at, etag, last_modified, hash) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(folder, key, json.dumps(entry.data), entry.fetched_at, entry.etag, entry.last_modified, entry.hash)
+                 for key, entry in entries.items()]
+            )
+
+    def put_meta(self, folder: str, entries: Dict[str, CacheEntry]) -> None:
+        if not entries:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'UPDATE entities SET fetched_at = ?, etag = ?, last_modified = ?, hash = ? WHERE folder = ? AND key = ?',
+                [(entry.fetched_at, entry.etag, entry.last_modified, entry.hash, folder, key)
+                 for key, entry in entries.items()]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class CachePolicy:
+    """Per-route TTLs and an in-process LRU tier on top of a cache backend.
+
+    Entries older than their route's TTL are returned as stale; the caller revalidates them
+    and hands the outcome back to ``update`` which only rewrites entities whose content changed.
+    """
+
+    def __init__(self, backend, ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: Optional[float] = CACHE_DEFAULT_TTL, memory_size: int = CACHE_MEMORY_SIZE):
+        self.backend = backend
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self._memory = LRUCache(maxsize=memory_size) if memory_size > 0 else None
+        self._memory_lock = threading.Lock()
+
+    def ttl(self, folder: str) -> Optional[float]:
+        return self.ttls.get(folder, self.default_ttl)
+
+    def is_fresh(self, folder: str, entry: CacheEntry, now: Optional[float] = None) -> bool:
+        ttl = self.ttl(folder)
+        if ttl is None or entry.fetched_at is None:
+            return ttl is None
+        return (now or time.time()) - entry.fetched_at < ttl
+
+    def _remember(self, folder: str, entries: Dict[str, CacheEntry]) -> None:
+        if self._memory is None:
+            return
+        with self._memory_lock:
+            for key, entry in entries.items():
+                self._memory[(folder, key)] = entry
+
+    def lookup(self, folder: str, keys: Iterable[str]) -> Tuple[Dict[str, CacheEntry], Dict[str, CacheEntry]]:
+        """Returns (fresh, stale) entries; keys found in neither are not cached at all."""
+        keys = list(dict.fromkeys(keys))
+        entries = {}
+        if self._memory is not None:
+            with self._memory_lock:
+                for key in keys:
+                    entry = self._memory.get((folder, key))
+                    if entry is not None:
+                        entries[key] = entry
+
+        from_backend = self.backend.get_entries(folder, [key for key in keys if key not in entries])
+        self._remember(folder, from_backend)
+        entries.update(from_backend)
+
+        now = time.time()
+        fresh, stale = {}, {}
+        for key, entry in entries.items():
+            (fresh if self.is_fresh(folder, entry, now) else stale)[key] = entry
+        return fresh, stale
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def update(self, folder: str, fetched: Dict[str, Optional[CacheEntry]],
+               previous: Dict[str, CacheEntry]) -> Dict[str, CacheEntry]:
+        """Stores fetch results. ``None`` means the server answered 304 Not Modified for a previous entry."""
+        now = time.time()
+        changed, unchanged = {}, {}
+        for key, entry in fetched.items():
+            old = previous.get(key)
+            if entry is None:
+                unchanged[key] = CacheEntry(old.data, now, old.etag, old.last_modified, old.hash)
+                continue
+            entry.fetched_at = entry.fetched_at or now
+            entry.hash = entry.hash or content_hash(entry.data)
+            if old is not None and (old.hash or content_hash(old.data)) == entry.hash:
+                unchanged[key] = CacheEntry(old.data, entry.fetched_at, entry.etag, entry.last_modified, entry.hash)
+            else:
+                changed[key] = entry
+
+        self.backend.put_entries(folder, changed)
+        self.backend.put_meta(folder, unchanged)
+        self._remember(folder, changed)
+        self._remember(folder, unchanged)
+        return {**changed, **unchanged}
+
+    def get_many(self, folder: str, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        if keys is None:
+            keys = self.backend.keys(folder)
+        fresh, stale = self.lookup(folder, keys)
+        return {key: entry.data for key, entry in {**stale, **fresh}.items()}
+
+    def put_many(self, folder: str, items: Dict[str, Dict]) -> None:
+        self.update(folder, {key: CacheEntry(data=data) for key, data in items.items()}, {})
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+CACHE_BACKENDS = {
+    'files': FileCache,
+    'sqlite': SqliteCache,
+}
+
+
+def build_cache(backend: str = CACHE_BACKEND, path: Optional[str] = CACHE_PATH):
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f'unknown cache backend {backend}, expected one of: {", ".join(CACHE_BACKENDS)}')
+    return CACHE_BACKENDS[backend](path or DEFAULT_PATHS[backend])
+
+
+def import_json_dumps(target, source_dir: str = DEFAULT_PATHS['files']) -> int:
+    """Copies every entity of a json_dumps tree into another cache backend."""
+    source = FileCache(source_dir)
+    imported = 0
+    for folder in source.folders():
+        entries = source.get_entries(folder)
+        for entry in entries.values():
+            entry.hash = entry.hash or content_hash(entry.data)
+        target.put_entries(folder, entries)
+        imported += len(entries)
+        print(f'imported {len(entries)} {folder}')
+    return imported
+
+
+if __name__ == '__main__':
+    # python cache_service.py [json_dumps dir] [sqlite file]
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATHS['files']
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PATHS['sqlite']
+    cache = SqliteCache(sqlite_path)
+    print(f'{import_json_dumps(cache, source_dir)} entities imported into {sqlite_path}')
+    cache.close()
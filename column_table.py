@@ -0,0 +1,231 @@
+"""Compact columnar buffer for parsed tables.
+
+Iterating a ColumnTable yields the headers and then every row as a list, like the lists of rows the sinks used
+to get, but the rows are not kept as lists: every column stores each distinct value once plus one small code
+per row (1 byte while a column has at most 256 distinct values), numeric columns with many distinct values
+switch to a typed array.
+"""
+from array import array
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sinks import sheet_value
+
+# a column of ints or floats moves from dictionary codes to a typed array past this many distinct values
+TYPED_COLUMN_THRESHOLD = 256
+# code array type -> how many distinct values its codes can address
+CODE_WIDTHS = (('B', 2 ** 8), ('H', 2 ** 16), ('I', 2 ** 32))
+ARROW_CODE_TYPES = {'B': 'uint8', 'H': 'uint16', 'I': 'uint32'}
+# rows ColumnTable.extend transposes at a time
+EXTEND_CHUNK = 128
+_NOTHING = object()
+
+
+class DictionaryColumn:
+    def __init__(self):
+        self.values: List = []
+        self.lookup: Dict = {}
+        self.codes = array('B')
+        self._capacity = CODE_WIDTHS[0][1]
+        # consecutive rows often repeat the very same object (one row per class and level of a spell)
+        self.last, self.last_code = _NOTHING, 0
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def append(self, value) -> bool:
+        """Returns True when the value reaches TYPED_COLUMN_THRESHOLD distinct values."""
+        # 1, 1.0 and True are equal dict keys but have to come back as they went in
+        key = value if value.__class__ is str else (value.__class__, value)
+        code = self.lookup.get(key)
+        added = code is None
+        if added:
+            code = self.lookup[key] = len(self.values)
+            self.values.append(value)
+            if code == self._capacity:
+                self._widen()
+        self.codes.append(code)
+        self.last, self.last_code = value, code
+        return added and code + 1 == TYPED_COLUMN_THRESHOLD
+
+    def extend(self, values: Iterable) -> bool:
+        """Like append for every value, returns True when the column reached TYPED_COLUMN_THRESHOLD values."""
+        below_threshold = len(self.values) < TYPED_COLUMN_THRESHOLD
+        lookup, distinct, codes = self.lookup, self.values, self.codes
+        last, last_code = self.last, self.last_code
+        for value in values:
+            if value is last:
+                codes.append(last_code)
+                continue
+            key = value if value.__class__ is str else (value.__class__, value)
+            code = lookup.get(key)
+            if code is None:
+                code = lookup[key] = len(distinct)
+                distinct.append(value)
+                if code == self._capacity:
+                    self._widen()
+                    codes = self.codes
+            codes.append(code)
+            last, last_code = value, code
+        self.last, self.last_code = last, last_code
+        return below_threshold and len(distinct) >= TYPED_COLUMN_THRESHOLD
+
+    def _widen(self) -> None:
+        for type_code, capacity in CODE_WIDTHS:
+            if capacity > self._capacity:
+                self.codes = array(type_code, self.codes)
+                self._capacity = capacity
+                return
+
+    def __getitem__(self, row: int):
+        return self.values[self.codes[row]]
+
+    def __iter__(self) -> Iterator:
+        return map(self.values.__getitem__, self.codes)
+
+    def typed(self) -> Optional['TypedColumn']:
+        """The column as a TypedColumn if all its values (besides None and '') are ints or all are floats."""
+        types = {type(value) for value in self.values if value is not None and value != ''}
+        if types not in ({int}, {float}):
+            return None
+        column = TypedColumn('q' if types == {int} else 'd')
+        for value in self:
+            column.append(value)
+        return column
+
+
+class TypedColumn:
+    """Numbers in an int64 or float64 array, anything else (None, '', the odd string) kept aside by row."""
+
+    # never repeats, see ColumnTable.append
+    last = _NOTHING
+
+    def __init__(self, type_code: str):
+        self.number_type = int if type_code == 'q' else float
+        self.numbers = array(type_code)
+        self.other: Dict[int, object] = {}
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def append(self, value) -> bool:
+        if type(value) is self.number_type and (self.number_type is float or -2 ** 63 <= value < 2 ** 63):
+            self.numbers.append(value)
+        else:
+            self.other[len(self.numbers)] = value
+            self.numbers.append(0)
+        return False
+
+    def extend(self, values: Iterable) -> bool:
+        for value in values:
+            self.append(value)
+        return False
+
+    def __getitem__(self, row: int):
+        return self.other[row] if row in self.other else self.numbers[row]
+
+    def __iter__(self) -> Iterator:
+        if not self.other:
+            return iter(self.numbers)
+        return (self.other[row] if row in self.other else number for row, number in enumerate(self.numbers))
+
+
+def arrow_values(values: List) -> List:
+    """Makes a column's values fit a single arrow type: mixed columns become strings, '' in typed ones null."""
+    types = {type(value) for value in values if value is not None and value != ''}
+    if len(types) > 1 and types != {int, float}:
+        return [None if value is None else sheet_value(value) for value in values]
+    if types and str not in types:
+        return [None if value == '' else value for value in values]
+    return values
+
+
+class ColumnTable:
+    """Rows appended like to a list of lists, stored per column.
+
+        table = ColumnTable(['index', 'level'])
+        table.append(['fireball', 3])
+        list(table)  # [['index', 'level'], ['fireball', 3]]
+    """
+
+    def __init__(self, headers: Sequence[str]):
+        self.headers = list(headers)
+        self.columns: List = [DictionaryColumn() for _ in self.headers]
+        self._rows = 0
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> 'ColumnTable':
+        """From a table with the headers first."""
+        rows = iter(rows)
+        table = cls(next(rows))
+        table.extend(rows)
+        return table
+
+    def __len__(self) -> int:
+        """Number of rows, without the headers."""
+        return self._rows
+
+    def append(self, row: Sequence) -> None:
+        if len(row) != len(self.headers):
+            raise ValueError(f'row has {len(row)} values, expected {len(self.headers)}: {row}')
+        for position, value in enumerate(row):
+            column = self.columns[position]
+            if value is column.last:
+                column.codes.append(column.last_code)
+            elif column.append(value):
+                self.columns[position] = column.typed() or column
+        self._rows += 1
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        """Appends the rows a chunk at a time, column by column, which is faster than one append per row."""
+        rows = iter(rows)
+        width = len(self.headers)
+        while True:
+            chunk = list(islice(rows, EXTEND_CHUNK))
+            if not chunk:
+                return
+            for row in chunk:
+                if len(row) != width:
+                    raise ValueError(f'row has {len(row)} values, expected {width}: {row}')
+            for position, values in enumerate(zip(*chunk)):
+                if self.columns[position].extend(values):
+                    self.columns[position] = self.columns[position].typed() or self.columns[position]
+            self._rows += len(chunk)
+
+    def column(self, header: str) -> List:
+        return list(self.columns[self.headers.index(header)])
+
+    def row(self, row: int) -> List:
+        if not -self._rows <= row < self._rows:
+            raise IndexError(f'row {row} of {self._rows}')
+        # TypedColumn keeps its other values by non-negative row
+        row %= self._rows
+        return [column[row] for column in self.columns]
+
+    def rows(self) -> Iterator[List]:
+        """Every row as a new list, without the headers."""
+        return map(list, zip(*self.columns)) if self.columns else iter([[] for _ in range(self._rows)])
+
+    def __iter__(self) -> Iterator[List]:
+        yield list(self.headers)
+        yield from self.rows()
+
+    def to_arrow(self, dictionary: bool = False):
+        """A pyarrow.Table, string columns as dictionary arrays when ``dictionary`` is set. Requires pyarrow."""
+        import pyarrow
+
+        arrays = []
+        for column in self.columns:
+            if type(column) is DictionaryColumn:
+                values = arrow_values(column.values)
+                if all(value is None or type(value) is str for value in values) and any(values):
+                    # the codes become the arrow indices as they are, only the distinct values are converted
+                    codes = pyarrow.Array.from_buffers(
+                        getattr(pyarrow, ARROW_CODE_TYPES[column.codes.typecode])(), len(column.codes),
+                        [None, pyarrow.py_buffer(column.codes)],
+                    )
+                    array_ = pyarrow.DictionaryArray.from_arrays(codes, pyarrow.array(values, pyarrow.string()))
+                    arrays.append(array_ if dictionary else array_.dictionary_decode())
+                    continue
+            arrays.append(pyarrow.array(arrow_values(list(column))))
+        return pyarrow.table(dict(zip(self.headers, arrays)))
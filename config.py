@@ -7,6 +7,16 @@ load_dotenv()
 def get_local_secret(name, default=None):
     return os.getenv(name, default)
 
+
+def _parse_mapping(value):
+    # "spells=86400,magic_items=604800" -> {'spells': 86400.0, 'magic_items': 604800.0}
+    mapping = {}
+    for pair in filter(None, (value or '').split(',')):
+        name, number = pair.split('=')
+        mapping[name.strip()] = float(number)
+    return mapping
+
+
 GSPREAD_SCOPE = [
         "https://spreadsheets.google.com/feeds",
         "https://www.googleapis.com/auth/drive",
@@ -24,4 +34,111 @@ SUBRACES_SHEET_NAME = 'Subraces'
 SUBCLASSES_SHEET_NAME = 'Subclasses'
 EQUIPMENT_SHEET_NAME = 'Equipment'
 MAGIC_ITEMS_SHEET_NAME = 'Magic Items'
+# NORMALIZED_OUTPUT writes its entity tables under their own names, their columns differ from the sheets above
+SPELLS_NORMALIZED_SHEET_NAME = 'Spells_Normalized'
+TRAITS_NORMALIZED_SHEET_NAME = 'Traits_Normalized'
+PROFICIENCIES_NORMALIZED_SHEET_NAME = 'Proficiencies_Normalized'
+SPELL_CLASSES_SHEET_NAME = 'Spell_Classes'
+SPELL_DAMAGE_PROGRESSION_SHEET_NAME = 'Spell_Damage_Progression'
+TRAIT_RACES_SHEET_NAME = 'Trait_Races'
+TRAIT_SUBRACES_SHEET_NAME = 'Trait_Subraces'
+TRAIT_PROFICIENCIES_SHEET_NAME = 'Trait_Proficiencies'
+TRAIT_DAMAGE_PROGRESSION_SHEET_NAME = 'Trait_Damage_Progression'
+PROFICIENCY_CLASSES_SHEET_NAME = 'Proficiency_Classes'
+PROFICIENCY_RACES_SHEET_NAME = 'Proficiency_Races'
+
+
+MAX_WORKERS = int(get_local_secret("MAX_WORKERS", 16))
+MAX_PARALLEL_JOBS = int(get_local_secret("MAX_PARALLEL_JOBS", 4))
+HTTP_POOL_SIZE = int(get_local_secret("HTTP_POOL_SIZE", MAX_WORKERS * MAX_PARALLEL_JOBS))
+HTTP_RETRIES = int(get_local_secret("HTTP_RETRIES", 5))
+HTTP_BACKOFF_FACTOR = float(get_local_secret("HTTP_BACKOFF_FACTOR", 0.5))
+HTTP_BACKOFF_JITTER = float(get_local_secret("HTTP_BACKOFF_JITTER", 0.5))
+HTTP_TIMEOUT = float(get_local_secret("HTTP_TIMEOUT", 30))
+# requests per second per host ("www.dnd5eapi.co=50,sheets.googleapis.com=1"), the Sheets API allows 60 a minute
+RATE_LIMITS = {
+    'www.dnd5eapi.co': 50, 'sheets.googleapis.com': 1, **_parse_mapping(get_local_secret("RATE_LIMITS"))
+}
+DEFAULT_RATE_LIMIT = float(get_local_secret("DEFAULT_RATE_LIMIT", 20))
+# most requests in flight per host, the limiter lowers it while a host throttles or slows down
+RATE_LIMIT_CONCURRENCY = int(get_local_secret("RATE_LIMIT_CONCURRENCY", HTTP_POOL_SIZE))
+# average seconds per request above which a host counts as overloaded
+RATE_LIMIT_LATENCY_TARGET = float(get_local_secret("RATE_LIMIT_LATENCY_TARGET", 5))
+RATE_LIMIT_RETRIES = int(get_local_secret("RATE_LIMIT_RETRIES", 8))
+CACHE_BACKEND = get_local_secret("CACHE_BACKEND", "files")
+CACHE_PATH = get_local_secret("CACHE_PATH")
+
 
+# seconds before a cached entity gets revalidated, None keeps it forever
+CACHE_DEFAULT_TTL = float(get_local_secret("CACHE_DEFAULT_TTL")) if get_local_secret("CACHE_DEFAULT_TTL") else None
+# route lists (/api/spells, ...) are revalidated daily so new entities show up
+CACHE_TTLS = {'lists': 86400, **_parse_mapping(get_local_secret("CACHE_TTLS"))}
+CACHE_MEMORY_SIZE = int(get_local_secret("CACHE_MEMORY_SIZE", 4096))
+# comma separated list of output sinks: gsheet, csv, sqlite, parquet, sql, snapshot
+SINKS = get_local_secret("SINKS", "gsheet")
+CSV_OUTPUT_DIR = get_local_secret("CSV_OUTPUT_DIR", "csv")
+CSV_FILE_PREFIX = 'DnD entities data - '
+SQLITE_OUTPUT_PATH = get_local_secret("SQLITE_OUTPUT_PATH", "output.sqlite")
+PARQUET_OUTPUT_DIR = get_local_secret("PARQUET_OUTPUT_DIR", "parquet")
+# memory mapped binary file holding every table, see snapshot.py
+SNAPSHOT_PATH = get_local_secret("SNAPSHOT_PATH", "snapshot.dndsnap")
+# gsheet sink: 'diff' only writes changed rows but holds the whole table in memory, 'replace' clears the worksheet
+# and uploads everything in batches
+GSHEET_SYNC_MODE = get_local_secret("GSHEET_SYNC_MODE", "diff")
+GSHEET_BATCH_SIZE = int(get_local_secret("GSHEET_BATCH_SIZE", 2000))
+# columns identifying a row in each sheet, tables not listed here are keyed by the whole row
+GSHEET_KEY_COLUMNS = {
+    SPELLS_SHEET_NAME: ['index', 'class_index', 'modifier_lvl'],
+    CLASS_SHEET_NAME: ['index', 'level'],
+    'Classes_Skills': ['class_index', 'skill_index'],
+    RACES_SHEET_NAME: ['index'],
+    FEATURES_SHEET_NAME: ['index'],
+    TRAITS_SHEET_NAME: ['index', 'race_index', 'subrace_index', 'proficiency_index', 'level'],
+    PROFICIENCIES_SHEET_NAME: ['index', 'class_index', 'race_index'],
+    SKILLS_SHEET_NAME: ['index'],
+    SUBRACES_SHEET_NAME: ['index'],
+    SUBCLASSES_SHEET_NAME: ['index', 'level'],
+    'Subclasses_Spells': ['subclass_index', 'spell_index'],
+    EQUIPMENT_SHEET_NAME: ['index'],
+    MAGIC_ITEMS_SHEET_NAME: ['index'],
+    'Spells from Spell Library Json': ['name', 'source'],
+    SPELLS_NORMALIZED_SHEET_NAME: ['index'],
+    TRAITS_NORMALIZED_SHEET_NAME: ['index'],
+    PROFICIENCIES_NORMALIZED_SHEET_NAME: ['index'],
+    SPELL_CLASSES_SHEET_NAME: ['spell_index', 'class_index'],
+    SPELL_DAMAGE_PROGRESSION_SHEET_NAME: ['spell_index', 'modifier_lvl'],
+    TRAIT_RACES_SHEET_NAME: ['trait_index', 'race_index'],
+    TRAIT_SUBRACES_SHEET_NAME: ['trait_index', 'subrace_index'],
+    TRAIT_PROFICIENCIES_SHEET_NAME: ['trait_index', 'proficiency_index'],
+    TRAIT_DAMAGE_PROGRESSION_SHEET_NAME: ['trait_index', 'level'],
+    PROFICIENCY_CLASSES_SHEET_NAME: ['proficiency_index', 'class_index'],
+    PROFICIENCY_RACES_SHEET_NAME: ['proficiency_index', 'race_index'],
+}
+SQL_OUTPUT_DIR = get_local_secret("SQL_OUTPUT_DIR", "sql")
+SQL_DATASET = get_local_secret("SQL_DATASET", "core")
+SQL_BATCH_SIZE = int(get_local_secret("SQL_BATCH_SIZE", 500))
+# write entities once (Spells_Normalized, ...) with separate link tables instead of the denormalized sheets
+NORMALIZED_OUTPUT = get_local_secret("NORMALIZED_OUTPUT", "false").lower() in ("1", "true", "yes")
+# 'rest' fetches items one by one, 'graphql' bulk loads whole collections where a query is defined
+FETCH_BACKEND = get_local_secret("FETCH_BACKEND", "rest")
+GRAPHQL_URL = get_local_secret("GRAPHQL_URL", "https://www.dnd5eapi.co/graphql")
+GRAPHQL_PAGE_SIZE = int(get_local_secret("GRAPHQL_PAGE_SIZE", 500))
+# run from the local cache only, without any network access
+OFFLINE = get_local_secret("OFFLINE", "false").lower() in ("1", "true", "yes")
+# 'passthrough' talks to the API, 'record' also saves every exchange to TRANSPORT_ARCHIVE, 'replay' serves them back
+TRANSPORT_MODE = get_local_secret("TRANSPORT_MODE", "passthrough")
+TRANSPORT_ARCHIVE = get_local_secret("TRANSPORT_ARCHIVE", "http_archive.json.gz")
+# seconds added to every replayed response
+REPLAY_LATENCY = float(get_local_secret("REPLAY_LATENCY", 0))
+# seconds between progress lines of a parse job
+PROGRESS_INTERVAL = float(get_local_secret("PROGRESS_INTERVAL", 2))
+# run metrics written at the end of parse_all, empty to skip
+METRICS_JSON_PATH = get_local_secret("METRICS_JSON_PATH", "metrics.json")
+METRICS_PROMETHEUS_PATH = get_local_secret("METRICS_PROMETHEUS_PATH", "metrics.prom")
+# completed jobs and cached items of the current parse_all run, read back by main.py --resume
+RUN_JOURNAL_PATH = get_local_secret("RUN_JOURNAL_PATH", "run_journal.jsonl")
+# fetched items are stored (and journaled) in batches of this size while a route is still being fetched
+CHECKPOINT_INTERVAL = int(get_local_secret("CHECKPOINT_INTERVAL", 100))
+SPELL_LIBRARY_PATH = get_local_secret("SPELL_LIBRARY_PATH", "Spell Library 11-16-19.JSON")
+# full-text index built by the build_search_index job after the parse jobs
+SEARCH_INDEX_PATH = get_local_secret("SEARCH_INDEX_PATH", "search_index.json.gz")
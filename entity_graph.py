@@ -0,0 +1,146 @@
+"""Every cached entity by type and index, with the references between them indexed in both directions.
+
+    graph = EntityGraph.from_cache()
+    graph.spells_of_class('wizard')       # spell indices
+    graph.traits_of_subrace('high-elf')
+    graph.parent_of('ammunition-1')       # 'ammunition'
+
+All lookups are dict reads on indexes built once while loading.
+"""
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache_service import build_cache, is_partial_folder
+
+# (folder, path of the {index, name, url} reference inside the entity, referenced folder)
+REFERENCES: List[Tuple[str, Tuple[str, ...], str]] = [
+    ('spells', ('classes',), 'classes'),
+    ('spells', ('subclasses',), 'subclasses'),
+    ('classes', ('subclasses',), 'subclasses'),
+    ('classes', ('proficiencies',), 'proficiencies'),
+    ('subclasses', ('class',), 'classes'),
+    ('subclasses', ('spells', 'spell'), 'spells'),
+    ('features', ('class',), 'classes'),
+    ('features', ('subclass',), 'subclasses'),
+    ('races', ('traits',), 'traits'),
+    ('races', ('subraces',), 'subraces'),
+    ('races', ('starting_proficiencies',), 'proficiencies'),
+    ('subraces', ('race',), 'races'),
+    ('subraces', ('racial_traits',), 'traits'),
+    ('subraces', ('starting_proficiencies',), 'proficiencies'),
+    ('traits', ('races',), 'races'),
+    ('traits', ('subraces',), 'subraces'),
+    ('traits', ('proficiencies',), 'proficiencies'),
+    ('proficiencies', ('classes',), 'classes'),
+    ('proficiencies', ('races',), 'races'),
+    ('magic_items', ('variants',), 'magic_items'),
+]
+
+
+def _referenced_indices(value, path: Tuple[str, ...]) -> Iterable[str]:
+    if isinstance(value, list):
+        for element in value:
+            yield from _referenced_indices(element, path)
+    elif isinstance(value, dict):
+        if path:
+            yield from _referenced_indices(value.get(path[0]), path[1:])
+        elif value.get('index'):
+            yield value['index']
+
+
+class EntityGraph:
+    def __init__(self, entities: Dict[str, Dict[str, Dict]], references=None):
+        self.entities = entities
+        # (folder, field) -> {index: referenced indices} and {referenced index: indices referencing it}
+        self.links: Dict[Tuple[str, str], Dict[str, Tuple[str, ...]]] = {}
+        self.backlinks: Dict[Tuple[str, str], Dict[str, Tuple[str, ...]]] = {}
+        self.targets: Dict[Tuple[str, str], str] = {}
+
+        for folder, path, target_folder in REFERENCES if references is None else references:
+            field = '.'.join(path)
+            self.targets[(folder, field)] = target_folder
+            forward, backward = {}, defaultdict(list)
+            for index, entity in entities.get(folder, {}).items():
+                targets = tuple(dict.fromkeys(_referenced_indices(entity, path)))
+                if targets:
+                    forward[index] = targets
+                for target in targets:
+                    backward[target].append(index)
+            self.links[(folder, field)] = forward
+            self.backlinks[(folder, field)] = {target: tuple(indices) for target, indices in backward.items()}
+
+    @classmethod
+    def from_cache(cls, backend=None, folders: Optional[Iterable[str]] = None) -> 'EntityGraph':
+        """Loads every folder (or only ``folders``) of a cache backend, the configured one by default."""
+        backend = backend if backend is not None else build_cache()
+        folders = backend.folders() if folders is None else folders
+        return cls({
+            folder: {index: entry.data for index, entry in backend.get_entries(folder).items()}
+            for folder in folders
+            if folder != 'lists' and not is_partial_folder(folder)
+        })
+
+    def entity(self, folder: str, index: str) -> Optional[Dict]:
+        return self.entities.get(folder, {}).get(index)
+
+    def linked(self, folder: str, index: str, field: str) -> Tuple[str, ...]:
+        """Indices the entity references in ``field``, e.g. linked('spells', 'fireball', 'classes')."""
+        return self.links.get((folder, field), {}).get(index, ())
+
+    def linked_entities(self, folder: str, index: str, field: str) -> List[Dict]:
+        """The referenced entities themselves, where they are cached."""
+        target_folder = self.entities.get(self.targets.get((folder, field)), {})
+        return [target_folder[target] for target in self.linked(folder, index, field) if target in target_folder]
+
+    def referencing(self, folder: str, field: str, index: str) -> Tuple[str, ...]:
+        """Indices of ``folder`` entities referencing ``index`` in ``field``, e.g. ('spells', 'classes', 'wizard')."""
+        return self.backlinks.get((folder, field), {}).get(index, ())
+
+    @staticmethod
+    def _union(*groups: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys(index for group in groups for index in group))
+
+    def spells_of_class(self, class_index: str) -> List[str]:
+        return list(self.referencing('spells', 'classes', class_index))
+
+    def spells_of_subclass(self, subclass_index: str) -> List[str]:
+        return self._union(self.linked('subclasses', subclass_index, 'spells.spell'),
+                           self.referencing('spells', 'subclasses', subclass_index))
+
+    def traits_of_race(self, race_index: str) -> List[str]:
+        return self._union(self.linked('races', race_index, 'traits'),
+                           self.referencing('traits', 'races', race_index))
+
+    def traits_of_subrace(self, subrace_index: str) -> List[str]:
+        return self._union(self.linked('subraces', subrace_index, 'racial_traits'),
+                           self.referencing('traits', 'subraces', subrace_index))
+
+    def classes_with_proficiency(self, proficiency_index: str) -> List[str]:
+        return self._union(self.linked('proficiencies', proficiency_index, 'classes'),
+                           self.referencing('classes', 'proficiencies', proficiency_index))
+
+    def races_with_proficiency(self, proficiency_index: str) -> List[str]:
+        return self._union(self.linked('proficiencies', proficiency_index, 'races'),
+                           self.referencing('races', 'starting_proficiencies', proficiency_index),
+                           self.referencing('subraces', 'starting_proficiencies', proficiency_index))
+
+    def features_of_class(self, class_index: str) -> List[str]:
+        return list(self.referencing('features', 'class', class_index))
+
+    def features_of_subclass(self, subclass_index: str) -> List[str]:
+        return list(self.referencing('features', 'subclass', subclass_index))
+
+    def variants_of(self, magic_item_index: str) -> List[str]:
+        return list(self.linked('magic_items', magic_item_index, 'variants'))
+
+    def parent_of(self, magic_item_index: str) -> Optional[str]:
+        parents = self.referencing('magic_items', 'variants', magic_item_index)
+        return parents[0] if parents else None
+
+
+if __name__ == '__main__':
+    # python entity_graph.py spells_of_class wizard
+    graph = EntityGraph.from_cache()
+    found = getattr(graph, sys.argv[1])(*sys.argv[2:])
+    print('\n'.join([found] if isinstance(found, str) else found or []))
@@ -0,0 +1,168 @@
+"""Declarative row extraction: a Schema lists the columns of a table as JSON paths into an entity and is compiled
+once into a single python generator that turns a whole route's entities into rows.
+
+    SKILLS = Schema([
+        Field('index', KEY),
+        Field('name', 'name'),
+        Field('ability_score', 'ability_score.name'),
+        Field('description', 'desc', default=(), transform=lines),
+    ])
+    table = SKILLS.extract(zip(keys, entities))
+
+Paths are dotted keys, digits index into lists and a missing or empty step reads as {} like ``.get(key, {})``
+chains. ``KEY`` is the entity's index in the route, ``None`` the entity itself. An Explode emits one row per
+element of a list; fields and later explodes reach the element through its alias, e.g. ``'class.index'``.
+Every path prefix is read once per entity (or per element), however many fields share it.
+"""
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from column_table import ColumnTable
+
+KEY = '@key'
+EMPTY: Dict = {}
+
+Path = Optional[str]
+
+
+def lines(values: Sequence[str]) -> str:
+    return '\n'.join(values)
+
+
+def join_names(references: Sequence[Dict]) -> str:
+    return ', '.join([reference.get('name') for reference in references])
+
+
+def join_indices(references: Sequence[Dict]) -> str:
+    return ', '.join([reference.get('index') for reference in references])
+
+
+class Field:
+    """A column: the value at ``path`` (``default`` when its last key is missing), passed through ``transform``.
+
+    With a tuple of paths the transform gets one value per path.
+    """
+
+    def __init__(self, name: str, path: Union[Path, Tuple[Path, ...]] = None, default=None,
+                 transform: Optional[Callable] = None):
+        self.name = name
+        self.paths = path if isinstance(path, tuple) else (path,)
+        self.default = default
+        self.transform = transform
+
+
+class Explode:
+    """One row per element of the list at ``path`` (after ``transform``), available to fields as ``alias``.
+
+    ``default`` stands in for a missing list, ``empty`` for a missing or empty one (no rows otherwise).
+    Explodes nest in the order given, the first one is the outer loop.
+    """
+
+    def __init__(self, alias: str, path: Path = None, default=None, transform: Optional[Callable] = None,
+                 empty: Optional[List] = None):
+        self.alias = alias
+        self.path = path
+        self.default = default
+        self.transform = transform
+        self.empty = empty
+
+
+class Schema:
+    def __init__(self, fields: List[Field], explode: Sequence[Explode] = ()):
+        self.fields = list(fields)
+        self.explode = list(explode)
+        self.headers = [field.name for field in self.fields]
+        self.source, self._extract = _compile(self.fields, self.explode)
+
+    def extract(self, entities: Iterable[Tuple[str, Dict]], table: Optional[ColumnTable] = None) -> ColumnTable:
+        """Appends the rows of every (index, entity) pair to ``table`` (a new one by default)."""
+        table = ColumnTable(self.headers) if table is None else table
+        table.extend(self._extract(entities))
+        return table
+
+
+def _compile(fields: List[Field], explodes: List[Explode]) -> Tuple[str, Callable]:
+    depths: Dict[str, int] = {}
+    for depth, explode in enumerate(explodes, 1):
+        if explode.alias in depths or explode.alias == KEY:
+            raise ValueError(f'duplicate explode alias {explode.alias}')
+        depths[explode.alias] = depth
+
+    # code lines run once per entity (depth 0) or once per element of the n-th explode
+    code: List[List[str]] = [[] for _ in range(len(explodes) + 1)]
+    namespace = {'EMPTY': EMPTY}
+    steps: Dict[Tuple[str, ...], str] = {}
+    names = count()
+
+    def constant(value) -> str:
+        name = f'k{next(names)}'
+        namespace[name] = value
+        return name
+
+    def resolve(path: Path, default) -> Tuple[str, int]:
+        """(expression, depth) reading ``path``, intermediate steps are emitted as shared variables."""
+        if path is None:
+            return 'entity', 0
+        if path == KEY:
+            return 'key', 0
+        segments = path.split('.')
+        if segments[0] in depths:
+            depth = depths[segments[0]]
+            root, segments = f'x{depth}', segments[1:]
+        else:
+            depth, root = 0, 'entity'
+        expression = root
+        for position, segment in enumerate(segments[:-1]):
+            prefix = (root,) + tuple(segments[:position + 1])
+            if prefix not in steps:
+                steps[prefix] = f'v{next(names)}'
+                code[depth].append(f'{steps[prefix]} = {_step(expression, segment)}')
+            expression = steps[prefix]
+        if segments:
+            expression = _leaf(expression, segments[-1], None if default is None else constant(default))
+        return expression, depth
+
+    def value(paths: Sequence[Path], default, transform: Optional[Callable]) -> Tuple[str, int]:
+        resolved = [resolve(path, default) for path in paths]
+        depth = max(depth for _, depth in resolved)
+        expression = ', '.join(expression for expression, _ in resolved)
+        return (f'{constant(transform)}({expression})' if transform else expression), depth
+
+    for depth, explode in enumerate(explodes, 1):
+        items, items_depth = value([explode.path], explode.default, explode.transform)
+        if items_depth >= depth:
+            raise ValueError(f'explode {explode.alias} reads {explode.path} of a later explode')
+        # computed where its path is available, not again for every element of the enclosing explodes
+        code[items_depth].append(f'items{depth} = {items}')
+        if explode.empty is not None:
+            code[items_depth].append(f'items{depth} = items{depth} or {constant(explode.empty)}')
+
+    columns = []
+    for position, field in enumerate(fields):
+        expression, depth = value(field.paths, field.default, field.transform)
+        code[depth].append(f'c{position} = {expression}')
+        columns.append(f'c{position}')
+
+    source = ['def extract(entities):', '    for key, entity in entities:']
+    for depth, block in enumerate(code):
+        indent = '    ' * (depth + 2)
+        source.extend(indent + line for line in block)
+        if depth < len(explodes):
+            source.append(f'{indent}for x{depth + 1} in items{depth + 1}:')
+    source.append('    ' * (len(explodes) + 2) + f'yield [{", ".join(columns)}]')
+    source = '\n'.join(source) + '\n'
+
+    exec(compile(source, '<schema>', 'exec'), namespace)
+    return source, namespace['extract']
+
+
+def _step(expression: str, segment: str) -> str:
+    if segment.isdigit():
+        return f'({expression}[{segment}] if len({expression}) > {segment} else EMPTY)'
+    return f'({expression}.get({segment!r}) or EMPTY)'
+
+
+def _leaf(expression: str, segment: str, default: Optional[str]) -> str:
+    if segment.isdigit():
+        return f'({expression}[{segment}] if len({expression}) > {segment} else {default})'
+    return f'{expression}.get({segment!r}, {default})' if default else f'{expression}.get({segment!r})'
@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional
+
+import requests
+
+from config import GRAPHQL_URL, GRAPHQL_PAGE_SIZE, HTTP_TIMEOUT
+
+REFERENCE = '{ index name url }'
+ABILITY_BONUSES = '{ ability_score { index name url } bonus }'
+
+# local cache folder -> (query field, selection set); the selections mirror the REST payloads the parsers read, the
+# results are cached as partial entities (see cache_service.partial_folder).
+# Left out, and fetched through REST: equipment, traits and proficiencies, whose items are of several GraphQL types
+# (weapons, armor, gear..., trait_specific and reference unions) with per type fields, and classes and subclasses,
+# whose /levels are nested routes and whose proficiency choices are nested option unions. A query naming a field
+# the schema does not have fails for the whole collection.
+COLLECTIONS = {
+    'spells': ('spells', f'''
+        index name desc higher_level range components material ritual duration concentration
+        casting_time level attack_type url
+        area_of_effect {{ type size }}
+        school {REFERENCE}
+        classes {REFERENCE}
+        subclasses {REFERENCE}
+        damage {{
+            damage_type {REFERENCE}
+            damage_at_slot_level {{ level damage }}
+            damage_at_character_level {{ level damage }}
+        }}
+    '''),
+    'features': ('features', f'''
+        index name level desc url
+        class {REFERENCE}
+        subclass {REFERENCE}
+    '''),
+    'skills': ('skills', f'''
+        index name desc url
+        ability_score {REFERENCE}
+    '''),
+    'magic_items': ('magicItems', f'''
+        index name desc variant url
+        equipment_category {REFERENCE}
+        rarity {{ name }}
+        variants {REFERENCE}
+    '''),
+    'races': ('races', f'''
+        index name speed alignment age size size_description language_desc url
+        ability_bonuses {ABILITY_BONUSES}
+        starting_proficiencies {REFERENCE}
+        languages {REFERENCE}
+        traits {REFERENCE}
+    '''),
+    'subraces': ('subraces', f'''
+        index name desc url
+        race {REFERENCE}
+        ability_bonuses {ABILITY_BONUSES}
+        racial_traits {REFERENCE}
+        starting_proficiencies {REFERENCE}
+    '''),
+}
+
+# GraphQL returns these as [{level, damage}], REST as {"<level>": damage}
+LEVEL_MAPS = ('damage_at_slot_level', 'damage_at_character_level')
+
+
+class GraphqlError(Exception):
+    pass
+
+
+def to_rest_shape(value):
+    """Drops nulls (REST omits missing fields) and turns level lists back into REST's level dicts."""
+    if isinstance(value, dict):
+        shaped = {}
+        for key, item in value.items():
+            if item is None:
+                continue
+            if key in LEVEL_MAPS and isinstance(item, list):
+                shaped[key] = {str(level['level']): level['damage'] for level in item}
+            else:
+                shaped[key] = to_rest_shape(item)
+        return shaped
+    if isinstance(value, list):
+        return [to_rest_shape(item) for item in value]
+    return value
+
+
+class GraphqlFetcher:
+    """Loads whole collections from the GraphQL endpoint in pages of ``page_size``.
+
+    ``session`` is anything with a requests style ``request`` method: a session or a transport.
+    """
+
+    def __init__(self, session=None, url: str = GRAPHQL_URL,
+                 page_size: int = GRAPHQL_PAGE_SIZE, timeout: float = HTTP_TIMEOUT,
+                 collections: Optional[Dict[str, tuple]] = None):
+        self.session = session or requests.Session()
+        self.url = url
+        self.page_size = page_size
+        self.timeout = timeout
+        self.collections = COLLECTIONS if collections is None else collections
+
+    def supports(self, local_folder: str) -> bool:
+        return local_folder in self.collections
+
+    def _query(self, query: str, variables: Dict) -> Dict:
+        response = self.session.request(
+            'POST', self.url,
+            json={'query': query, 'variables': variables},
+            headers={'Accept': 'application/json'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('errors'):
+            raise GraphqlError('; '.join(error.get('message', str(error)) for error in payload['errors']))
+        return payload['data']
+
+    def fetch_collection(self, local_folder: str) -> Dict[str, Dict]:
+        """{index: entity} for every entity of the collection, shaped like the REST item responses."""
+        field, selection = self.collections[local_folder]
+        query = f'query ($skip: Int, $limit: Int!) {{ {field}(skip: $skip, limit: $limit) {{ {selection} }} }}'
+
+        entities: Dict[str, Dict] = {}
+        skip = 0
+        while True:
+            page: List[Dict] = self._query(query, {'skip': skip, 'limit': self.page_size})[field] or []
+            for entity in page:
+                entities[entity['index']] = to_rest_shape(entity)
+            if len(page) < self.page_size:
+                return entities
+            skip += self.page_size
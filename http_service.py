@@ -0,0 +1,52 @@
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_BACKOFF_JITTER
+
+# 429 and 503 are left to rate_limit, which waits for their Retry-After and slows down the whole host
+RETRY_STATUSES = (500, 502, 504)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class JitterRetry(Retry):
+    """Exponential backoff with a random jitter added to every sleep."""
+
+    def __init__(self, *args, jitter: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, self.jitter)
+
+
+def build_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES,
+                  backoff_factor: float = HTTP_BACKOFF_FACTOR,
+                  jitter: float = HTTP_BACKOFF_JITTER) -> requests.Session:
+    retry = JitterRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        jitter=jitter,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
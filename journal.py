@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Set
+
+from config import RUN_JOURNAL_PATH
+
+
+class RunJournal:
+    """Append-only json lines log of a parse_all run: which jobs finished and which items were cached.
+
+    Nothing is written until ``start`` is called. Every record is flushed and synced to disk right away,
+    a record cut short by a crash is ignored when the journal is read back.
+    """
+
+    def __init__(self, path: str = RUN_JOURNAL_PATH):
+        self.path = path
+        self.completed_jobs: Set[str] = set()
+        self.completed_items: Dict[str, Set[str]] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def _load(self) -> bool:
+        """Reads the previous run, returns False if there is none to resume (missing or finished)."""
+        if not os.path.exists(self.path):
+            return False
+        finished = False
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record['event'] == 'job':
+                    self.completed_jobs.add(record['name'])
+                elif record['event'] == 'items':
+                    self.completed_items.setdefault(record['folder'], set()).update(record['items'])
+                elif record['event'] == 'finish':
+                    finished = True
+        if finished:
+            self.completed_jobs.clear()
+            self.completed_items.clear()
+        return not finished
+
+    def start(self, resume: bool = False) -> None:
+        """Opens the journal, continuing an unfinished previous run with ``resume``, a new one otherwise."""
+        with self._lock:
+            self._close()
+            self.completed_jobs.clear()
+            self.completed_items.clear()
+            resuming = resume and self._load()
+            self._file = open(self.path, 'a' if resuming else 'w')
+            if resuming and self._file.tell() and not self._ends_with_newline():
+                # end a record cut short by a crash, the next one would be lost on the same line
+                self._file.write('\n')
+        self._append({'event': 'resume' if resuming else 'start', 'time': time.time()})
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            return journal.read(1) == b'\n'
+
+    def _append(self, record: Dict) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def job_done(self, name: str) -> None:
+        self._append({'event': 'job', 'name': name})
+
+    def items_done(self, folder: str, items: Iterable[str]) -> None:
+        items = list(items)
+        if items:
+            self._append({'event': 'items', 'folder': folder, 'items': items})
+
+    def item_done(self, folder: str, item: str) -> bool:
+        """Whether the run being resumed already cached ``item``."""
+        return item in self.completed_items.get(folder, ())
+
+    def finish(self) -> None:
+        self._append({'event': 'finish', 'time': time.time()})
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        # must be called with _lock held
+        if self._file is not None:
+            self._file.close()
+            self._file = None
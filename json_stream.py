@@ -0,0 +1,78 @@
+import json
+import re
+from typing import IO, Iterator, Tuple, Any
+
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+# what is left of the buffer after a number that may still be part of it ('12' of '12.5', '1e' of '1e3')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+def iter_object_items(file: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yields the (key, value) pairs of a top-level JSON object one by one.
+
+    Only the current value and one read chunk are held in memory, whatever the size of the whole document.
+    """
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    def expect(*tokens: str) -> str:
+        nonlocal position
+        skip_whitespace()
+        if position >= len(buffer) or buffer[position] not in tokens:
+            found = buffer[position:position + 20] if position < len(buffer) else 'end of file'
+            raise ValueError(f'expected {" or ".join(tokens)}, found {found!r}')
+        position += 1
+        return buffer[position - 1]
+
+    def decode() -> Any:
+        nonlocal position
+        skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+                # a number is only complete once something else follows it, it could continue in the next chunk
+                if eof or type(value) not in (int, float) or not _NUMBER_TAIL.match(buffer, end):
+                    position = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    fill()
+    if buffer.startswith('﻿'):
+        position = 1
+    expect('{')
+    skip_whitespace()
+    if position < len(buffer) and buffer[position] == '}':
+        return
+    while True:
+        key = decode()
+        expect(':')
+        yield key, decode()
+        if expect(',', '}') == '}':
+            return
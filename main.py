@@ -1,8 +1,20 @@
+import argparse
+
 from parser import Parser, Methods
+from mirror import Mirror
 
 
 def main():
+    arguments = argparse.ArgumentParser(description='Parses the D&D 5e API into the configured sinks')
+    arguments.add_argument('--resume', action='store_true',
+                           help='continue an interrupted run, skipping its finished jobs and fetched items')
+    arguments.add_argument('--mirror', action='store_true',
+                           help='crawl the whole API into the local cache first, parse jobs then run from it')
+    args = arguments.parse_args()
+
     parser = Parser()
+    if args.mirror:
+        Mirror(parser).crawl()
 
     parser.parse_all(exceptions=[
         Methods.PARSE_SPELLS,
@@ -16,7 +28,9 @@ def main():
         Methods.PARSE_SUBCLASSES,
         Methods.PARSE_EQUIPMENT,
         # Methods.PARSE_MAGIC_ITEMS,
-    ])
+        Methods.BUILD_SEARCH_INDEX,
+    ], resume=args.resume)
+    parser.close()
     """
     parser.csv_to_sql(
         table_name='classes_skills',
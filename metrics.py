@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import PROGRESS_INTERVAL
+
+STAGES = ('request', 'cache', 'transform', 'sink')
+# work done outside of a parse_all job, e.g. a parse_* method called directly
+UNATTRIBUTED = 'other'
+
+
+class JobMetrics:
+    def __init__(self):
+        self.seconds = 0.0
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.response_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rows: Dict[str, int] = defaultdict(int)
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    def as_dict(self) -> Dict:
+        # transform is whatever the job spent outside of requests, cache and sinks
+        stages = {stage: self.stages.get(stage, 0.0) for stage in STAGES}
+        if self.seconds:
+            stages['transform'] = max(0.0, self.seconds - sum(stages[stage] for stage in STAGES if stage != 'transform'))
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'seconds': round(self.seconds, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in stages.items()},
+            'requests': self.requests,
+            'status_codes': dict(self.statuses),
+            'response_bytes': self.response_bytes,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_ratio': round(self.cache_hits / lookups, 4) if lookups else None,
+            'rows': dict(self.rows),
+        }
+
+
+class Metrics:
+    """Per job stage timings, request, cache and row counters.
+
+    The job is tracked per thread: ``job()`` sets it for the running parse job and ``attach()`` carries it
+    over to the worker threads a job fans out to.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, JobMetrics] = defaultdict(JobMetrics)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_job(self) -> str:
+        return getattr(self._local, 'job', UNATTRIBUTED)
+
+    @contextmanager
+    def attach(self, job: str):
+        previous = getattr(self._local, 'job', None)
+        self._local.job = job
+        try:
+            yield
+        finally:
+            self._local.job = previous if previous is not None else UNATTRIBUTED
+
+    @contextmanager
+    def job(self, name: str):
+        started = time.perf_counter()
+        with self.attach(name):
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.jobs[name].seconds += time.perf_counter() - started
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Times a stage, time spent in a stage nested inside it only counts for the nested one."""
+        if not hasattr(self._local, 'nested'):
+            self._local.nested = []
+        nested = self._local.nested
+        nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            exclusive = elapsed - nested.pop()
+            if nested:
+                nested[-1] += elapsed
+            with self._lock:
+                self.jobs[self.current_job()].stages[stage] += exclusive
+
+    def count_response(self, status_code: int, size: int) -> None:
+        with self._lock:
+            job = self.jobs[self.current_job()]
+            job.statuses[str(status_code)] += 1
+            job.response_bytes += size
+
+    def count_cache(self, hits: int, misses: int) -> None:
+        with self._lock:
+            job = self.jobs[self.current_job()]
+            job.cache_hits += hits
+            job.cache_misses += misses
+
+    def count_rows(self, table: str, rows: int) -> None:
+        with self._lock:
+            self.jobs[self.current_job()].rows[table] += rows
+
+    def report(self) -> Dict:
+        with self._lock:
+            jobs = {name: job.as_dict() for name, job in self.jobs.items()}
+        return {
+            'started_at': self.started,
+            'jobs': jobs,
+            'totals': {
+                'requests': sum(job['requests'] for job in jobs.values()),
+                'response_bytes': sum(job['response_bytes'] for job in jobs.values()),
+                'cache_hits': sum(job['cache_hits'] for job in jobs.values()),
+                'cache_misses': sum(job['cache_misses'] for job in jobs.values()),
+                'rows': sum(sum(job['rows'].values()) for job in jobs.values()),
+            },
+        }
+
+    def prometheus(self) -> str:
+        report = self.report()
+        metrics = {
+            'dnd_parser_job_seconds': ('gauge', 'Wall time of the parse job'),
+            'dnd_parser_stage_seconds': ('gauge', 'Wall time of the parse job per stage'),
+            'dnd_parser_requests_total': ('counter', 'API responses by status code'),
+            'dnd_parser_response_bytes_total': ('counter', 'API response body bytes'),
+            'dnd_parser_cache_hits_total': ('counter', 'Entities served from the local cache'),
+            'dnd_parser_cache_misses_total': ('counter', 'Entities missing or expired in the local cache'),
+            'dnd_parser_rows_total': ('counter', 'Rows written per table'),
+        }
+        samples = defaultdict(list)
+        for name, job in report['jobs'].items():
+            samples['dnd_parser_job_seconds'].append(({'job': name}, job['seconds']))
+            for stage, seconds in job['stages'].items():
+                samples['dnd_parser_stage_seconds'].append(({'job': name, 'stage': stage}, seconds))
+            for status, count in job['status_codes'].items():
+                samples['dnd_parser_requests_total'].append(({'job': name, 'status': status}, count))
+            samples['dnd_parser_response_bytes_total'].append(({'job': name}, job['response_bytes']))
+            samples['dnd_parser_cache_hits_total'].append(({'job': name}, job['cache_hits']))
+            samples['dnd_parser_cache_misses_total'].append(({'job': name}, job['cache_misses']))
+            for table, rows in job['rows'].items():
+                samples['dnd_parser_rows_total'].append(({'job': name, 'table': table}, rows))
+
+        lines = []
+        for metric, (metric_type, help_text) in metrics.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+            for labels, value in samples[metric]:
+                label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+                lines.append(f'{metric}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None) -> None:
+        if json_path:
+            _write_atomic(json_path, json.dumps(self.report(), indent=2))
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.prometheus())
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(path: str, text: str) -> None:
+    # textfile collectors may read at any moment, so never leave a half written file behind
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+class MeteredTransport:
+    """Counts status codes and response bytes of every exchange going through the wrapped transport."""
+
+    def __init__(self, transport, metrics: Metrics):
+        self.transport = transport
+        self.metrics = metrics
+
+    def request(self, method: str, url: str, **kwargs):
+        response = self.transport.request(method, url, **kwargs)
+        self.metrics.count_response(response.status_code, len(response.content or b''))
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class Progress:
+    """Prints ``label: done/total`` at most once per ``interval`` seconds and once at the end.
+
+    A single item (a route list, a class's levels) prints nothing.
+    """
+
+    def __init__(self, label: str, total: int, interval: float = PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self._printed = self.started
+
+    def advance(self, count: int = 1) -> None:
+        self.done += count
+        if self.total <= 1:
+            return
+        now = time.perf_counter()
+        if self.done >= self.total or now - self._printed >= self.interval:
+            self._printed = now
+            rate = self.done / (now - self.started) if now > self.started else 0
+            print(f'{self.label}: {self.done} of {self.total} ({rate:.0f}/s)')
@@ -0,0 +1,163 @@
+"""Breadth-first mirror of the whole API into the local cache.
+
+Starts from the API root, follows every ``/api/...`` reference of every response and stores each resource where
+the parse methods look for it, so after one mirror run every parse_* call works from the cache:
+
+    /api/spells                   -> lists/spells
+    /api/spells/acid-arrow        -> spells/acid-arrow
+    /api/classes/wizard/levels    -> classes_levels/wizard
+    /api/classes/wizard/levels/3  -> classes_levels/wizard-3
+"""
+import argparse
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cache_service import CacheEntry
+from config import MAX_WORKERS
+
+API_PREFIX = '/api/'
+# newer API releases prefix every path with the ruleset, e.g. /api/2014/spells
+VERSION_SEGMENT = re.compile(r'^\d{4}$')
+
+
+def cache_location(path: str) -> Optional[Tuple[str, str]]:
+    """(folder, key) of an api path, None for the API root."""
+    segments = [segment for segment in path.split('?')[0].strip('/').split('/') if segment]
+    if segments[:1] == ['api']:
+        segments = segments[1:]
+    if segments and VERSION_SEGMENT.match(segments[0]):
+        segments = segments[1:]
+    if not segments:
+        return None
+    if len(segments) == 1:
+        return 'lists', segments[0]
+    resource, index, *nested = segments
+    folder = '_'.join([resource] + [segment for segment in nested if not segment.isdigit()]).replace('-', '_')
+    key = '-'.join([index] + [segment for segment in nested if segment.isdigit()])
+    return folder, key
+
+
+def iter_references(data) -> Iterator[str]:
+    """Every api path in a response: ``url`` fields, the root's route map and links like ``class_levels``."""
+    if isinstance(data, dict):
+        for value in data.values():
+            yield from iter_references(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from iter_references(value)
+    elif isinstance(data, str) and data.startswith(API_PREFIX) and '?' not in data:
+        yield data.rstrip('/')
+
+
+class Mirror:
+    """Crawls through a Parser, so requests share its transport, rate limiter, metrics and cache policy.
+
+    Each breadth-first level is resolved in one go: cached fresh resources are read from the cache (and still
+    followed), the rest are fetched by a pool of ``max_workers`` threads and stored per folder.
+    """
+
+    def __init__(self, parser, max_workers: int = MAX_WORKERS):
+        self.parser = parser
+        self.max_workers = max_workers
+        self.visited = set()
+        self.stats = {'resources': 0, 'cached': 0, 'fetched': 0, 'failed': 0}
+
+    @staticmethod
+    def _relative(path: str) -> str:
+        # relative to the parser's url, which ends with /api/
+        segments = path.strip('/').split('/')
+        return '/'.join(segments[1:] if segments[0] == 'api' else segments)
+
+    def _resolve(self, paths: List[str]) -> Dict[str, object]:
+        """{path: data} for a level of the crawl, from the cache where fresh and from the API otherwise."""
+        locations = {path: cache_location(path) for path in paths}
+        by_folder: Dict[str, Dict[str, str]] = {}
+        for path, location in locations.items():
+            if location is not None:
+                by_folder.setdefault(location[0], {})[location[1]] = path
+
+        resolved, stale = {}, {}
+        for folder, keys in by_folder.items():
+            with self.parser.metrics.stage('cache'):
+                fresh, folder_stale = self.parser.cache.lookup(folder, list(keys))
+            resolved.update({keys[key]: entry.data for key, entry in fresh.items()})
+            stale.update({keys[key]: entry for key, entry in folder_stale.items()})
+        self.stats['cached'] += len(resolved)
+
+        to_fetch = [path for path in paths if path not in resolved]
+        job = self.parser.metrics.current_job()
+
+        def fetch(path: str) -> Optional[CacheEntry]:
+            with self.parser.metrics.attach(job):
+                return self.parser._fetch_item(self._relative(path), '', stale.get(path))
+
+        fetched: Dict[str, Dict[str, Optional[CacheEntry]]] = {}
+        if to_fetch:
+            with self.parser.metrics.stage('request'), \
+                    ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_fetch))) as executor:
+                futures = {executor.submit(fetch, path): path for path in to_fetch}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    error = future.exception()
+                    if error is not None:
+                        self.stats['failed'] += 1
+                        print(f'mirror: {path} failed: {error}')
+                        continue
+                    self.stats['fetched'] += 1
+                    location = locations[path]
+                    if location is None:
+                        resolved[path] = future.result().data
+                    else:
+                        fetched.setdefault(location[0], {})[path] = future.result()
+
+        for folder, entries in fetched.items():
+            previous = {locations[path][1]: stale[path] for path in entries if path in stale}
+            with self.parser.metrics.stage('cache'):
+                stored = self.parser.cache.update(
+                    folder, {locations[path][1]: entry for path, entry in entries.items()}, previous
+                )
+            resolved.update({path: stored[locations[path][1]].data for path in entries})
+            self.parser.journal.items_done(folder, [locations[path][1] for path in entries])
+        return resolved
+
+    def crawl(self, roots: Optional[List[str]] = None, max_depth: Optional[int] = None) -> Dict[str, int]:
+        frontier = [root.rstrip('/') for root in roots or ['/api']]
+        self.visited.update(frontier)
+        depth = 0
+        with self.parser.metrics.job('mirror'):
+            while frontier and (max_depth is None or depth <= max_depth):
+                resolved = self._resolve(frontier)
+                self.stats['resources'] += len(resolved)
+                next_frontier = []
+                for path in frontier:
+                    for reference in iter_references(resolved.get(path)):
+                        if reference not in self.visited:
+                            self.visited.add(reference)
+                            next_frontier.append(reference)
+                print(f'mirror: level {depth}, {len(frontier)} resources, {len(next_frontier)} new references')
+                frontier = next_frontier
+                depth += 1
+        return self.stats
+
+
+def main():
+    from parser import Parser
+
+    arguments = argparse.ArgumentParser(description='Mirrors the whole API into the local cache')
+    arguments.add_argument('roots', nargs='*', default=['/api'], help='api paths to start from')
+    arguments.add_argument('--workers', type=int, default=MAX_WORKERS)
+    arguments.add_argument('--max-depth', type=int, help='stop after this many reference hops')
+    args = arguments.parse_args()
+
+    parser = Parser(sinks=[])
+    try:
+        stats = Mirror(parser, max_workers=args.workers).crawl(args.roots, max_depth=args.max_depth)
+    finally:
+        parser.close()
+    print(f"mirror: {stats['resources']} resources, {stats['fetched']} fetched, {stats['cached']} from cache, "
+          f"{stats['failed']} failed")
+
+
+if __name__ == '__main__':
+    main()
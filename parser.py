@@ -1,17 +1,33 @@
-import requests
-import csv
-import json
-import re
 import os
-import inspect
-from typing import Union, Dict, List, Optional
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Union, Dict, List, Optional, Callable, Iterable, Iterator, Tuple, TYPE_CHECKING
 from enum import Enum
 
 from config import SPELLS_SHEET_NAME, CLASS_SHEET_NAME, RACES_SHEET_NAME, FEATURES_SHEET_NAME, \
     TRAITS_SHEET_NAME, SKILLS_SHEET_NAME, \
     PROFICIENCIES_SHEET_NAME, SUBRACES_SHEET_NAME, SUBCLASSES_SHEET_NAME, \
-    EQUIPMENT_SHEET_NAME, MAGIC_ITEMS_SHEET_NAME
-from gsheet_service import Gsheet
+    EQUIPMENT_SHEET_NAME, MAGIC_ITEMS_SHEET_NAME, MAX_WORKERS, HTTP_POOL_SIZE, HTTP_TIMEOUT, \
+    MAX_PARALLEL_JOBS, SQL_BATCH_SIZE, NORMALIZED_OUTPUT, SPELL_CLASSES_SHEET_NAME, SPELL_DAMAGE_PROGRESSION_SHEET_NAME, \
+    TRAIT_RACES_SHEET_NAME, TRAIT_SUBRACES_SHEET_NAME, TRAIT_PROFICIENCIES_SHEET_NAME, \
+    TRAIT_DAMAGE_PROGRESSION_SHEET_NAME, PROFICIENCY_CLASSES_SHEET_NAME, PROFICIENCY_RACES_SHEET_NAME, FETCH_BACKEND, \
+    SPELLS_NORMALIZED_SHEET_NAME, TRAITS_NORMALIZED_SHEET_NAME, PROFICIENCIES_NORMALIZED_SHEET_NAME, \
+    OFFLINE, METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH, CHECKPOINT_INTERVAL, SPELL_LIBRARY_PATH, SEARCH_INDEX_PATH
+from scheduler import Scheduler, JobResult, JobStatus
+from cache_service import build_cache, CachePolicy, CacheEntry, partial_folder
+from sinks import build_sinks
+from column_table import ColumnTable
+import schemas
+from sql_export import export_csv
+from json_stream import iter_object_items
+from metrics import Metrics, MeteredTransport, Progress
+from rate_limit import RateLimiter, shared_limiter
+from journal import RunJournal
+
+if TYPE_CHECKING:
+    import requests
 
 
 class Methods(str, Enum):
@@ -26,733 +42,562 @@ class Methods(str, Enum):
     PARSE_SUBCLASSES = 'parse_subclasses'
     PARSE_EQUIPMENT = 'parse_equipment'
     PARSE_MAGIC_ITEMS = 'parse_magic_items'
+    BUILD_SEARCH_INDEX = 'build_search_index'
+
+
+# jobs that have to wait for other jobs, e.g. {Methods.PARSE_SUBCLASSES: [Methods.PARSE_CLASSES]}
+JOB_DEPENDENCIES: Dict[Methods, List[Methods]] = {
+    # the parse jobs fill the cache the index is built from
+    Methods.BUILD_SEARCH_INDEX: [
+        Methods.PARSE_SPELLS, Methods.PARSE_FEATURES, Methods.PARSE_TRAITS, Methods.PARSE_MAGIC_ITEMS,
+    ],
+}
+
+
+class OfflineError(Exception):
+    pass
 
 
 class Parser:
-    def __init__(self, auth=None):
-        self.sheet = Gsheet()
+    def __init__(self, auth=None, max_workers: int = MAX_WORKERS,
+                 pool_size: int = HTTP_POOL_SIZE, timeout: float = HTTP_TIMEOUT, cache=None,
+                 sinks: Optional[List] = None, normalized: bool = NORMALIZED_OUTPUT,
+                 fetch_backend: str = FETCH_BACKEND, offline: bool = OFFLINE, transport=None,
+                 metrics: Optional[Metrics] = None, rate_limiter: Optional[RateLimiter] = None,
+                 journal: Optional[RunJournal] = None):
+        self.sinks = sinks if sinks is not None else build_sinks()
+        # one row per entity plus link tables instead of one row per entity x class x level
+        self.normalized = normalized
         self.url = 'https://www.dnd5eapi.co/api/'
         self.auth = auth
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.pool_size = max(pool_size, max_workers)
+        self.cache = CachePolicy(cache if cache is not None else build_cache())
+        if fetch_backend not in ('rest', 'graphql'):
+            raise ValueError(f'unknown fetch backend {fetch_backend}, expected rest or graphql')
+        self.fetch_backend = fetch_backend
+        # everything comes from the local cache, no requests at all
+        self.offline = offline
+        self.metrics = metrics if metrics is not None else Metrics()
+        # per host request budgets, shared with the gsheet sink unless given
+        self.rate_limiter = rate_limiter if rate_limiter is not None else shared_limiter()
+        # only written to while parse_all runs
+        self.journal = journal if journal is not None else RunJournal()
+
+        # the http session, transport and graphql client are only built once something needs the network
+        self._session = None
+        self._transport = MeteredTransport(transport, self.metrics) if transport is not None else None
+        self._graphql = None
+        self._lazy_lock = threading.RLock()
+
+    @property
+    def session(self) -> 'requests.Session':
+        if self._session is None:
+            with self._lazy_lock:
+                if self._session is None:
+                    from http_service import build_session
+                    self._session = build_session(pool_size=self.pool_size)
+        return self._session
+
+    @property
+    def transport(self):
+        """Passthrough to the session, or recording / replaying exchanges depending on TRANSPORT_MODE."""
+        if self._transport is None:
+            with self._lazy_lock:
+                if self._transport is None:
+                    from transport import build_transport
+                    self._transport = MeteredTransport(
+                        build_transport(session_factory=lambda: self.session, limiter=self.rate_limiter),
+                        self.metrics,
+                    )
+        return self._transport
+
+    @property
+    def graphql(self):
+        if self.fetch_backend != 'graphql' or self.offline:
+            return None
+        if self._graphql is None:
+            with self._lazy_lock:
+                if self._graphql is None:
+                    from graphql_service import GraphqlFetcher
+                    self._graphql = GraphqlFetcher(self.transport, timeout=self.timeout)
+        return self._graphql
 
     def _request(self, method: str = 'GET',
                  json_payload: Union[Dict, List, None] = None,
                  params: Optional[Dict] = None,
                  path: str = '', headers: Optional[Dict] = None
-                 ) -> requests.Response:
+                 ) -> 'requests.Response':
+        if self.offline:
+            raise OfflineError(f'offline mode, refusing to request {path}')
         if headers is None:
             headers = {
                 "Accept": "application/json",
             }
-        return requests.request(
+        return self.transport.request(
             url=self.url + path,
             auth=self.auth,
             method=method,
             params=params,
             json=json_payload,
             headers=headers,
+            timeout=self.timeout,
         )
 
-    def _get_item(self, item: str, local_folder: str, api_route: str) -> Optional[Dict]:
-
-        root_dir = 'json_dumps'
-
-        os.makedirs(
-            os.path.join(
-                root_dir, local_folder
-            ),
-            exist_ok=True
+    def _fetch_item(self, item: str, api_route: str, cached: Optional[CacheEntry] = None,
+                    sub_route: Optional[str] = None) -> Optional[CacheEntry]:
+        """Fetches an item (or its nested ``sub_route`` like ``levels``),
+        returns None if the server confirms that ``cached`` is still up to date."""
+        headers = {
+            "Accept": "application/json",
+            **CachePolicy.conditional_headers(cached),
+        }
+        path = '/'.join(part.strip('/') for part in (api_route, item, sub_route) if part)
+        response = self._request(path=path, headers=headers)
+        if cached is not None and response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return CacheEntry(
+            data=response.json(),
+            fetched_at=time.time(),
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
         )
 
-        local_storage = os.path.join(root_dir, local_folder, f'{item}.json')
-
-        if os.path.exists(local_storage):
-            with open(local_storage, "r") as from_local:
-                data = json.load(from_local)
-        else:
-            response = self._request(path=f'{api_route}/{item}')
-            if response.ok:
-                data = response.json()
-                with open(local_storage, 'w') as to_local:
-                    json.dump(data, to_local)
-        return data
+    def _graphql_folder(self, local_folder: str, sub_route: Optional[str]) -> Optional[str]:
+        """The cache folder of the graphql backend's partial entities, if ``local_folder`` is loaded by it."""
+        if self.fetch_backend != 'graphql' or sub_route is not None:
+            return None
+        from graphql_service import COLLECTIONS
+        return partial_folder(local_folder) if local_folder in COLLECTIONS else None
+
+    def _get_item(self, item: str, local_folder: str, api_route: str,
+                  sub_route: Optional[str] = None) -> Union[Dict, List, None]:
+        return self._get_items([item], local_folder=local_folder, api_route=api_route, sub_route=sub_route)[0]
+
+    def _get_items(self, items: List[str], local_folder: str, api_route: str,
+                   sub_route: Optional[str] = None) -> List[Union[Dict, List, None]]:
+        """Resolve all items of a route, keeping the order of ``items``.
+
+        Fresh cached items are read in one batch, missing and expired ones are (re)fetched concurrently
+        and stored in one batch. With ``sub_route`` the nested resource ``<api_route>/<item>/<sub_route>``
+        is resolved instead, so ``local_folder`` should be its own folder, e.g. ``classes_levels``.
+        With the graphql fetch backend a whole collection is loaded in a few paged queries instead and cached
+        in its own folder (``spells_graphql``), its entities only have the fields the parsers read.
+
+        Fetched items are stored every ``CHECKPOINT_INTERVAL`` items and recorded in the run journal, items that
+        were fetched before one of them failed are kept. Expired items that the resumed run already fetched are
+        not revalidated again.
+        """
+        graphql_folder = self._graphql_folder(local_folder, sub_route)
+        with self.metrics.stage('cache'):
+            fresh, stale = self.cache.lookup(local_folder, items)
+            if graphql_folder is not None:
+                # full REST entities serve the parsers as well, partial ones only fill the gaps
+                graphql_fresh, graphql_stale = self.cache.lookup(
+                    graphql_folder, [item for item in items if item not in fresh]
+                )
+                fresh.update(graphql_fresh)
+                # a stale REST entry is kept, its ETag still saves a download
+                stale = {**graphql_stale, **stale}
+        for item in [item for item in stale if self.journal.item_done(local_folder, item)
+                     or graphql_folder is not None and self.journal.item_done(graphql_folder, item)]:
+            fresh[item] = stale.pop(item)
+        unique_items = len(set(items))
+        self.metrics.count_cache(hits=len(fresh), misses=unique_items - len(fresh))
+
+        if self.offline:
+            # expired entries are still better than nothing
+            fresh.update(stale)
+            missing = [item for item in items if item not in fresh]
+            if missing:
+                raise OfflineError(f'offline mode, {len(missing)} {local_folder} not cached: {", ".join(missing[:5])}')
+
+        to_fetch = [item for item in dict.fromkeys(items) if item not in fresh]
+
+        if to_fetch and graphql_folder is not None and self.graphql is not None:
+            with self.metrics.stage('request'):
+                collection = self.graphql.fetch_collection(local_folder)
+            fetched = {item: CacheEntry(data=collection[item]) for item in to_fetch if item in collection}
+            with self.metrics.stage('cache'):
+                fresh.update(self.cache.update(graphql_folder, fetched, stale))
+            self.journal.items_done(graphql_folder, fetched)
+            # whatever the collection query did not return still goes through REST
+            to_fetch = [item for item in to_fetch if item not in fetched]
+
+        if to_fetch:
+            job = self.metrics.current_job()
+
+            def fetch(item: str) -> Optional[CacheEntry]:
+                with self.metrics.attach(job):
+                    return self._fetch_item(item, api_route, stale.get(item), sub_route)
+
+            pending: Dict[str, Optional[CacheEntry]] = {}
+            errors = []
+
+            def store() -> None:
+                with self.metrics.stage('cache'):
+                    fresh.update(self.cache.update(local_folder, pending, stale))
+                self.journal.items_done(local_folder, pending)
+                pending.clear()
+
+            progress = Progress(local_folder, len(to_fetch))
+            with self.metrics.stage('request'):
+                for item, entry, error in self._fetch_each(to_fetch, fetch):
+                    progress.advance()
+                    if error is not None:
+                        errors.append(error)
+                        continue
+                    pending[item] = entry
+                    if len(pending) >= CHECKPOINT_INTERVAL:
+                        store()
+                store()
+            if errors:
+                raise errors[0]
+
+        return [fresh[item].data if item in fresh else None for item in items]
+
+    def _fetch_each(self, items: List[str], fetch: Callable[[str], Optional[CacheEntry]]
+                    ) -> Iterator[Tuple[str, Optional[CacheEntry], Optional[Exception]]]:
+        """(item, entry, error) for every item as soon as its fetch completes."""
+        if self.max_workers <= 1 or len(items) == 1:
+            for item in items:
+                try:
+                    yield item, fetch(item), None
+                except Exception as error:
+                    yield item, None, error
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            futures = {executor.submit(fetch, item): item for item in items}
+            for future in as_completed(futures):
+                error = future.exception()
+                yield futures[future], None if error else future.result(), error
+
+    def _write(self, name: str, rows: Union[ColumnTable, List[List], Callable[[], Iterable[List]]]) -> None:
+        """Hands a parsed table (a ColumnTable or a list of rows, headers first) to every configured sink.
+
+        ``rows`` can also be a function returning a fresh row iterator, every sink then streams its own copy.
+        """
+        def counted(table: Iterable[List]) -> Iterable[List]:
+            count = 0
+            for count, row in enumerate(table):
+                yield row
+            self.metrics.count_rows(name, count)
+
+        if isinstance(rows, ColumnTable):
+            self.metrics.count_rows(name, len(rows))
+        elif not callable(rows):
+            self.metrics.count_rows(name, max(len(rows) - 1, 0))
+        with self.metrics.stage('sink'):
+            for position, sink in enumerate(self.sinks):
+                if callable(rows):
+                    sink.write(name, counted(rows()) if position == 0 else rows())
+                else:
+                    sink.write(name, rows)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+        self.cache.close()
+        if self._transport is not None:
+            self._transport.close()
+        if self._session is not None:
+            self._session.close()
+        self.journal.close()
 
     def _get_all(self, route: str) -> Optional[List]:
-        response = self._request(path=route)
-        if response.ok:
-            results = response.json().get('results', [])
-            return [result.get('index') for result in results]
+        if self.offline:
+            fresh, stale = self.cache.lookup('lists', [route.strip('/')])
+            if not fresh and not stale:
+                # no cached list, every cached entity of the route then ('magic-items/' lives in 'magic_items')
+                return self.cache.backend.keys(route.strip('/').replace('-', '_'))
+        route_list = self._get_item(item=route.strip('/'), local_folder='lists', api_route='')
+        return [result.get('index') for result in route_list.get('results', [])]
 
     def parse_spells(self, route: str = 'spells/') -> str:
-        worksheet = self.sheet.get_worksheet(SPELLS_SHEET_NAME)
         all_spells = self._get_all(route=route)
 
-
-        headers = [
-           'index', 'name', 'description', 'higher_level', 'range', 'components', 'material', 'area_of_effect_type', 'area_of_effect_size', 'ritual', 'duration', 'concentration', 'casting_time', 'spell_level', 'school', 'class_index', 'attack_type', 'damage_type', 'damage_modifier', 'modifier_lvl', 'damage'
-        ]
-
-        rows = [headers]
-
         if len(all_spells) > 0:
-            i = 1
-            for spell in all_spells:
-                print(f"parsing {i} of {len(all_spells)}: {spell}")
-                spell_data = self._get_item(item=spell, local_folder='spells', api_route=route)
-                name = spell_data.get('name', f"failed to parse: {spell}")
-                description = '\n'.join(spell_data.get('desc', []))
-                higher_level = '\n'.join(spell_data.get('higher_level', []))
-                range_ = spell_data.get('range')
-                components = ", ".join(spell_data.get('components', []))
-                material = spell_data.get('material')
-                area_of_effect = spell_data.get('area_of_effect', {})
-                area_of_effect_type = area_of_effect.get('type')
-                area_of_effect_size = area_of_effect.get('size')
-                ritual = spell_data.get('ritual')
-                duration = spell_data.get('duration')
-                concentration = spell_data.get('concentration')
-                casting_time = spell_data.get('casting_time')
-                level = spell_data.get('level')
-                school = spell_data.get('school', {}).get('name')
-                attack_type = spell_data.get('attack_type')
-
-                for class_ in spell_data.get('classes', [{}]):
-                    class_index = class_.get('index')
-                    damage = spell_data.get('damage', {})
-                    damage_type = damage.get('damage_type', {}).get('name')
-                    damage_at_levels = damage.get('damage_at_character_level')
-                    damage_at_slots = damage.get('damage_at_slot_level')
-                    damage_modifier = 'slot' if damage_at_slots else 'level' if damage_at_levels else ''
-
-                    if damage_modifier == 'level':
-                        level_keys = [int(key) for key in damage_at_levels.keys()]
-                        prev_value = None
-                        for lvl in range(min(level_keys), 21):
-                            modifier_lvl = lvl
-                            if lvl in level_keys:
-                                prev_value = damage_at_levels.get(f'{lvl}')
-                            damage_value = prev_value
-                            row = [spell, name, description, higher_level, range_, components, material, area_of_effect_type, area_of_effect_size, ritual, duration, concentration, casting_time, level, school, class_index, attack_type, damage_type, damage_modifier, modifier_lvl, damage_value]
-                            rows.append(row)
-
-                    elif damage_modifier == 'slot':
-                        slot_keys = [int(key) for key in damage_at_slots.keys()]
-                        prev_value = None
-                        for slot in range(level, max(slot_keys)+1):
-                            modifier_lvl = slot
-                            if slot in slot_keys:
-                                prev_value = damage_at_slots.get(f'{slot}')
-                            damage_value = prev_value
-                            row = [spell, name, description, higher_level, range_, components, material, area_of_effect_type, area_of_effect_size, ritual, duration, concentration, casting_time, level, school, class_index, attack_type, damage_type, damage_modifier, modifier_lvl, damage_value]
-                            rows.append(row)
-
-                    else:
-                        row = [spell, name, description, higher_level, range_, components, material, area_of_effect_type, area_of_effect_size, ritual, duration, concentration, casting_time, level, school, class_index, attack_type, damage_type, damage_modifier, '', '']
-                        rows.append(row)
-                i+=1
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_spells_data = self._get_items(all_spells, local_folder='spells', api_route=route)
+            spells = list(zip(all_spells, all_spells_data))
+            if self.normalized:
+                self._write(SPELLS_NORMALIZED_SHEET_NAME, schemas.SPELLS_NORMALIZED.extract(spells))
+                self._write(SPELL_CLASSES_SHEET_NAME, schemas.SPELL_CLASSES.extract(spells))
+                self._write(SPELL_DAMAGE_PROGRESSION_SHEET_NAME, schemas.SPELL_DAMAGE_PROGRESSION.extract(spells))
+            else:
+                self._write(SPELLS_SHEET_NAME, schemas.SPELLS.extract(spells))
             return 'jobs done'
         return 'failed to get spells list'
 
     @staticmethod
-    def csv_to_sql(path_to_csv: str, table_name: str, dataset: str = 'core') -> str:
-        with open(path_to_csv, newline='') as csv_file:
-            csv_reader = csv.reader(csv_file)
-
-            headers = next(csv_reader)
-            rows = list(csv_reader)
-
-            with open('output.sql', 'w') as output:
-                print(f"INSERT INTO {dataset}.{table_name} ({', '.join(headers)}) \nVALUES", file=output, end='\n')
-            for row in rows:
-                row_with_correct_single_quotation = list(
-                    map(
-                        lambda value: value.replace("'", "''"), row
-                    )
-                )
-
+    def csv_to_sql(path_to_csv: str, table_name: str, dataset: str = 'core',
+                   batch_size: int = SQL_BATCH_SIZE, copy: bool = False) -> str:
+        export_csv(path_to_csv, table_name, output_path='output.sql', dataset=dataset,
+                   batch_size=batch_size, copy=copy)
+        return 'jobs done'
 
-                sql_row_values = list(
-                    map(
-                        lambda value: "null" if value == "" else value if value in ("TRUE", "FALSE") or value.isdigit() else f"'{str(value)}'",
-                        row_with_correct_single_quotation
-                    )
-                )
-                with open('output.sql', 'a') as output:
-                    print(f'({", ".join(sql_row_values)})', end=",\n" if rows.index(row) != len(rows)-1 else ';',
-                          file=output)
-            return 'jobs done'
+    @staticmethod
+    def _spell_library_classes(classes: List[str]) -> tuple:
+        """Splits entries like 'Druid (Mountain)' once.
+
+        Returns the base classes in use and the subclass_only / subclasses_list values: classes that are
+        only available to one subclass.
+        """
+        parsed = []
+        for class_ in classes:
+            words = class_.split(" ")
+            parsed.append((words[0], words[0].lower(), " (" in class_, words[1] if len(words) > 1 else ''))
+
+        counts = {}
+        for _, base_lower, _, _ in parsed:
+            counts[base_lower] = counts.get(base_lower, 0) + 1
+
+        subclass_only = [
+            (base_lower, re.sub(r'[()]', '', subclass).lower())
+            for _, base_lower, has_subclass, subclass in parsed
+            if has_subclass and counts[base_lower] == 1
+        ]
+        return (
+            {base for base, _, _, _ in parsed},
+            ', '.join(base_lower for base_lower, _ in subclass_only),
+            ', '.join(subclass for _, subclass in subclass_only),
+        )
 
-    def parse_spell_library_json(self, path) -> str:
-        worksheet = self.sheet.get_worksheet('Spells from Spell Library Json')
-        rows = [[
+    def _spell_library_rows(self, path):
+        yield [
             'name', 'description', 'range', 'components',
             'material', 'ritual',
             'duration', 'casting_time', 'level', 'school',
             'bard', 'cleric', 'druid', 'fighter', 'monk', 'paladin', 'ranger',
             'rogue', 'sorcerer', 'warlock', 'wizard', 'subclass_only', 'subclasses_list', 'source'
 
-        ]]
+        ]
+        library_classes = ['Bard', 'Cleric', 'Druid', 'Fighter', 'Monk', 'Paladin', 'Ranger',
+                           'Rogue', 'Sorcerer', 'Warlock', 'Wizard']
+
         with open(path, "r") as spell_library:
-            all_spells = json.load(spell_library)
-
-        for spell in all_spells.values():
-            name = spell.get('Name')
-            description = spell.get('Description')
-            range = spell.get('Range')
-            components_full = spell.get('Components', '')
-            components_splitted = components_full.split(" (") if " M (" in components_full else None
-            components = components_splitted[0] if components_splitted else components_full
-            material = components_splitted[1].replace(")", "") if components_splitted else ""
-            ritual = spell.get('Ritual')
-            duration = spell.get('Duration')
-            casting_time = spell.get('CastingTime')
-            level = spell.get('Level')
-            school = spell.get('School')
-            classes_use = {class_.split(" ")[0]: True for class_ in spell.get('Classes', [])}
-            bard = classes_use.get('Bard', False)
-            cleric = classes_use.get('Cleric', False)
-            druid = classes_use.get('Druid', False)
-            fighter = classes_use.get('Fighter', False)
-            monk = classes_use.get('Monk', False)
-            paladin = classes_use.get('Paladin', False)
-            ranger = classes_use.get('Ranger', False)
-            rogue = classes_use.get('Rogue', False)
-            sorcerer = classes_use.get('Sorcerer', False)
-            warlock = classes_use.get('Warlock', False)
-            wizard = classes_use.get('Wizard', False)
-            all_classes = [class_.split(" ")[0].lower() for class_ in spell.get('Classes', [])]
-            subclass_only = ', '.join([class_.split(" ")[0].lower() for class_ in spell.get('Classes', []) if " (" in class_ and all_classes.count(class_.split(" ")[0].lower()) == 1])
-            subclasses_list = ', '.join([re.sub(r'[()]', '',class_.split(" ")[1]).lower() for class_ in spell.get('Classes', []) if " (" in class_ and all_classes.count(class_.split(" ")[0].lower()) == 1])
-            source = spell.get('Source')
-            rows.append(
-                [
-                    name, description, range, components, material, ritual, duration, casting_time, level, school,
-                    bard, cleric, druid,
-                    fighter, monk, paladin, ranger,
-                    rogue, sorcerer, warlock, wizard, subclass_only, subclasses_list, source
-                ]
-            )
-        worksheet.clear()
-        worksheet.append_rows(rows)
+            for _, spell in iter_object_items(spell_library):
+                name = spell.get('Name')
+                description = spell.get('Description')
+                range = spell.get('Range')
+                components_full = spell.get('Components', '')
+                components_splitted = components_full.split(" (") if " M (" in components_full else None
+                components = components_splitted[0] if components_splitted else components_full
+                material = components_splitted[1].replace(")", "") if components_splitted else ""
+                ritual = spell.get('Ritual')
+                duration = spell.get('Duration')
+                casting_time = spell.get('CastingTime')
+                level = spell.get('Level')
+                school = spell.get('School')
+                classes_use, subclass_only, subclasses_list = self._spell_library_classes(spell.get('Classes', []))
+                source = spell.get('Source')
+                row = [name, description, range, components, material, ritual, duration, casting_time, level, school]
+                row.extend(class_ in classes_use for class_ in library_classes)
+                row.extend([subclass_only, subclasses_list, source])
+                yield row
+
+    def parse_spell_library_json(self, path) -> str:
+        # rows are streamed from the file, once per sink
+        self._write('Spells from Spell Library Json', lambda: self._spell_library_rows(path))
+        return 'jobs done'
+
+    def build_search_index(self, path: str = SEARCH_INDEX_PATH,
+                           spell_library_path: Optional[str] = SPELL_LIBRARY_PATH) -> str:
+        """Indexes the descriptions of the cached spells, features, traits and magic items and the Spell Library."""
+        from search_index import SearchIndex
+
+        rows = self._spell_library_rows(spell_library_path) \
+            if spell_library_path and os.path.exists(spell_library_path) else None
+        index = SearchIndex.from_cache(self.cache, rows)
+        index.save(path)
+        print(f'search index: {len(index.documents)} documents, {len(index.terms)} terms')
         return 'jobs done'
 
     def parse_classes(self, route: str = 'classes/') -> str:
-        worksheet = self.sheet.get_worksheet(CLASS_SHEET_NAME)
 
         all_classes = self._get_all(route)
-        classes_skills = [['class_index', 'proficiency_skills_description', 'skills_choose', 'skill_index']]
         if len(all_classes) > 0:
-
-            headers = [
-               'index', 'name', 'hit_die',
-                'saving_throws', 'level', 'ability_score_bonuses', 'ability_score_bonuses_total', 'proficiency_bonus', 'features_names', 'is_caster', 'cantrips'
+            all_classes_details = self._get_items(all_classes, local_folder='classes', api_route=route)
+            all_classes_levels = self._get_items(
+                all_classes, local_folder='classes_levels', api_route=route, sub_route='levels'
+            )
+            classes = [
+                (class_, {**class_details, '_levels': class_levels or []})
+                for class_, class_details, class_levels in zip(all_classes, all_classes_details, all_classes_levels)
             ]
-            headers.extend([
-                f'spell_slots_level_{i}'
-                            for i in range(1, 10)
-            ])
-            rows = [headers]
-
-            for class_ in all_classes:
-
-                print(f'processing {class_}...', end='')
-
-                class_details = self._get_item(item=class_, local_folder='classes', api_route=route)
-                name = class_details.get('name')
-                hit_die = class_details.get('hit_die')
-
-                proficiencies_skills = class_details.get('proficiency_choices', [{}])
-
-                if len(proficiencies_skills) > 1:
-                    print(f'{class_} has {len(proficiencies_skills)} proficiency choices...', end='')
-
-                proficiency_skills_description = proficiencies_skills[0].get('desc')
-                proficiency_skills_choose = proficiencies_skills[0].get('choose')
-
-                saving_throws = ', '.join([st.get('name') for st in class_details.get('saving_throws', [])])
-
-                possible_skills = proficiencies_skills[0].get('from', {}).get('options', [{}])
-
-                for skill in possible_skills:
-                    possible_skill = skill.get('item', {}).get('index', 'skill-').replace('skill-', '')
-                    classes_skills.append([
-                        class_, proficiency_skills_description, proficiency_skills_choose, possible_skill
-                    ])
-
-                class_levels_response = self._request(path=f'{route + class_}/levels')
-
-                if class_levels_response.ok:
-                    class_levels = class_levels_response.json()
-                    available_spells = [class_level.get('spellcasting', {}) for class_level in class_levels]
-                    spells = [casting_level.get('cantrips_known') for casting_level in available_spells]
-                    spells.extend([
-                        casting_level.get(f'spell_slots_level_{i}') for casting_level
-                        in available_spells for i in range(1, 10)
-                    ])
-                    is_caster = any(spell for spell in spells)
-                    prev_ability_score_bonus = 0
-                    for level in class_levels:
-
-                        class_level = level.get('level')
-
-                        spellcasting_list = [level.get('spellcasting', {}).get('cantrips_known')]
-                        spellcasting_list.extend([
-                            level.get('spellcasting', {}).get(f'spell_slots_level_{i}')
-                            for i in range(1, 10)
-                        ])
-
-                        level_ability_score_bonus = level.get('ability_score_bonuses')
-                        ability_score_bonuses = level_ability_score_bonus - prev_ability_score_bonus
-
-                        if level_ability_score_bonus > prev_ability_score_bonus:
-                            prev_ability_score_bonus = level_ability_score_bonus
-
-
-                        prof_bonus = level.get('prof_bonus')
-
-                        features_names = ', '.join([feature.get('name') for feature in level.get('features', [])])
-
-                        if class_level == 1:
-
-                            print('level 1', end='\n')
-
-                        else:
-                            print(f'processing {class_}...level {class_level}', end='\n')
-                        row = [
-                            class_, name, hit_die, saving_throws, class_level, ability_score_bonuses, level_ability_score_bonus, prof_bonus,
-                                    features_names, is_caster]
-                        row.extend(spellcasting_list)
-                        rows.append(row)
-
-            worksheet.clear()
-            worksheet.append_rows(rows)
-
-            classes_skills_worksheet = self.sheet.get_worksheet('Classes_Skills')
-            classes_skills_worksheet.clear()
-            classes_skills_worksheet.append_rows(classes_skills)
+            for class_, class_details in classes:
+                proficiency_choices = class_details.get('proficiency_choices', [])
+                if len(proficiency_choices) > 1:
+                    print(f'{class_} has {len(proficiency_choices)} proficiency choices, only the first one is parsed')
 
+            self._write(CLASS_SHEET_NAME, schemas.CLASSES.extract(classes))
+            self._write('Classes_Skills', schemas.CLASSES_SKILLS.extract(classes))
             return 'jobs done'
         return 'failed to receive all classes'
 
     def parse_races(self, route: str = 'races/') -> str:
-        worksheet = self.sheet.get_worksheet(RACES_SHEET_NAME)
-        abilities_list = ['STR', 'DEX', 'CON', 'WIS', 'INT', 'CHA']
-        headers = [
-            'index', 'name', 'speed'
-        ]
-        headers.extend([
-            f'{ability}_mod' for ability in abilities_list
-        ])
-        headers.extend([
-            'alignment', 'age', 'size', 'size_description',
-            'proficiencies_names', 'languages', 'language_desc', 'traits_names'
-        ])
-
-        rows = [headers]
-
         all_races = self._get_all(route)
 
         if len(all_races) > 0:
-            for race in all_races:
-
-                print(f'collecting {race} data')
-
-                race_details = self._get_item(item=race, local_folder='races', api_route=route)
-
-                name = race_details.get('name')
-                speed = race_details.get('speed')
-                ability_bonuses = race_details.get('ability_bonuses')
-                all_abilities = {
-                    ability_bonus.get('ability_score', {}).get('name'):  ability_bonus.get('bonus')
-                    for ability_bonus in ability_bonuses
-                }
-                ability_modifiers = [all_abilities.get(ability) for ability in abilities_list]
-                alignment = race_details.get('alignment')
-                age = race_details.get('age')
-                size = race_details.get('size')
-                size_description = race_details.get('size_description')
-
-                proficiencies_names = ', '.join(
-                    [proficiency.get('name') for proficiency in
-                     race_details.get('starting_proficiencies')])
-                languages = ', '.join(
-                    [language.get('name') for language in
-                     race_details.get('languages')])
-                language_desc = race_details.get('language_desc')
-
-                traits_names = ', '.join([trait.get('name') for trait in race_details.get('traits')])
-                row = [race, name, speed]
-                row.extend(ability_modifiers)
-                row.extend([alignment, age, size, size_description,
-            proficiencies_names, languages, language_desc, traits_names])
-
-                rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_races_details = self._get_items(all_races, local_folder='races', api_route=route)
+            self._write(RACES_SHEET_NAME, schemas.RACES.extract(zip(all_races, all_races_details)))
             return 'jobs done'
         return 'failed to receive races list'
 
     def parse_features(self, route: str = 'features/') -> str:
-        worksheet = self.sheet.get_worksheet(FEATURES_SHEET_NAME)
-        headers = [
-            'index', 'name', 'class_index', 'subclass_index', 'description', 'level'
-        ]
-        rows = [headers]
-
         all_features = self._get_all(route)
 
         if len(all_features) > 0:
-            for feature in all_features:
-
-                print(f'processing {feature}')
-
-                feature_data = self._get_item(item=feature, local_folder='features', api_route=route)
-                name = feature_data.get('name')
-                class_index = feature_data.get('class', {}).get('index')
-                subclass_index = feature_data.get('subclass', {}).get('index')
-                desc = '\n'.join(feature_data.get('desc', []))
-                level = feature_data.get('level')
-                row = [
-                    feature, name, class_index, subclass_index, desc, level
-                ]
-                rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_features_data = self._get_items(all_features, local_folder='features', api_route=route)
+            self._write(FEATURES_SHEET_NAME, schemas.FEATURES.extract(zip(all_features, all_features_data)))
             return 'jobs done'
         return 'failed to get all features'
 
     def parse_traits(self, route: str = 'traits/') -> str:
-        worksheet = self.sheet.get_worksheet(TRAITS_SHEET_NAME)
-        headers = [
-            'index', 'name', 'description', 'race_index', 'subrace_index', 'proficiency_index', 'is_damage',
-            'damage_type', 'area_of_effect_type', 'area_of_effect_size', 'usage_times', 'dc', 'dc_success', 'level', 'damage'
-        ]
-
-        rows = [headers]
-
         all_traits = self._get_all(route)
 
         if len(all_traits) > 0:
-            for trait in all_traits:
-
-                print(f'processing {trait}')
-
-                trait_data = self._get_item(item=trait, local_folder='traits', api_route=route)
-                name = trait_data.get('name')
-                desc = '\n'.join(trait_data.get('desc', []))
-                race_indices = trait_data.get('races', []) if len(trait_data.get('races', [])) > 0 else [{'index':''}]
-                subrace_indices = trait_data.get('subraces', []) if len(trait_data.get('subraces', [])) > 0 else [{'index': ''}]
-                proficiencies_indices = trait_data.get('proficiencies', []) if len(trait_data.get('proficiencies', [])) > 0 else [{'index':''}]
-
-                for race in race_indices:
-                    race_index=race.get('index')
-                    for subrace in subrace_indices:
-                        subrace_index = subrace.get('index')
-                        for proficiency in proficiencies_indices:
-                            proficiency_index = proficiency.get('index')
-                            trait_specific = trait_data.get('trait_specific', {})
-                            damage_type = trait_specific.get('damage_type',{}).get('name')
-                            area_of_effect_type = trait_specific.get('breath_weapon',{}).get('area_of_effect',{}).get('type')
-                            area_of_effect_size = trait_specific.get('breath_weapon',
-                                                                     {}).get(
-                                'area_of_effect', {}).get('size')
-                            usage_times = trait_specific.get('breath_weapon',{}).get('usage',{}).get('times')
-                            dc = trait_specific.get('breath_weapon',{}).get('dc',{}).get('dc_type',{}).get('name')
-                            dc_success = trait_specific.get('breath_weapon',{}).get('dc',{}).get('success_type')
-                            damage_data = trait_specific.get('breath_weapon',{}).get('damage',[])
-
-                            is_damage = True if len(damage_data) > 0 else False
-                            prev_damage = ''
-                            damage = ''
-                            level = ''
-                            if is_damage:
-                                for lvl in range(1,21):
-                                    level = lvl
-                                    damage_at_level = damage_data[0].get('damage_at_character_level',{}).get(str(lvl))
-                                    if damage_at_level:
-                                        damage = damage_at_level
-                                        prev_damage = damage_at_level
-                                    elif prev_damage:
-                                        damage = prev_damage
-
-                                    row = [trait, name, desc, race_index, subrace_index, proficiency_index, is_damage, damage_type, area_of_effect_type,
-                                           area_of_effect_size, usage_times, dc, dc_success, level, damage, ]
-                                    rows.append(row)
-                            else:
-                                row = [trait, name, desc, race_index, subrace_index, proficiency_index, is_damage, damage_type, area_of_effect_type,
-                                       area_of_effect_size, usage_times, dc, dc_success, level, damage, ]
-                                rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_traits_data = self._get_items(all_traits, local_folder='traits', api_route=route)
+            traits = list(zip(all_traits, all_traits_data))
+            if self.normalized:
+                self._write(TRAITS_NORMALIZED_SHEET_NAME, schemas.TRAITS_NORMALIZED.extract(traits))
+                self._write(TRAIT_RACES_SHEET_NAME, schemas.TRAIT_RACES.extract(traits))
+                self._write(TRAIT_SUBRACES_SHEET_NAME, schemas.TRAIT_SUBRACES.extract(traits))
+                self._write(TRAIT_PROFICIENCIES_SHEET_NAME, schemas.TRAIT_PROFICIENCIES.extract(traits))
+                self._write(TRAIT_DAMAGE_PROGRESSION_SHEET_NAME, schemas.TRAIT_DAMAGE_PROGRESSION.extract(traits))
+            else:
+                self._write(TRAITS_SHEET_NAME, schemas.TRAITS.extract(traits))
             return 'jobs done'
 
         return 'failed to get all traits'
 
     def parse_proficiencies(self, route: str ='proficiencies/') -> str:
-        worksheet = self.sheet.get_worksheet(PROFICIENCIES_SHEET_NAME)
-
-        headers = ['index', 'name', 'reference_type', 'class_index', 'race_index', 'reference_index', 'reference_url']
-        rows = [headers]
-
         all_proficiencies = self._get_all(route)
 
         if len(all_proficiencies) > 0:
-            for proficiency in all_proficiencies:
-
-                print(f'processing {proficiency}')
-
-                proficiency_data = self._get_item(item=proficiency, local_folder='proficiencies', api_route=route)
-                name = proficiency_data.get('name')
-                reference_type = proficiency_data.get('type')
-                reference_index = proficiency_data.get('reference', {}).get('index')
-                reference_url = proficiency_data.get('reference', {}).get('url')
-                proficiency_classes = proficiency_data.get('classes', []) if len(proficiency_data.get('classes', [])) > 0 else [{'index': ''}]
-                proficiency_races = proficiency_data.get('races', []) if len(proficiency_data.get('races', [])) > 0 else [{'index': ''}]
-                for race in proficiency_races:
-                    race_index = race.get('index')
-                    for class_ in proficiency_classes:
-                        class_index = class_.get('index')
-                        row = [
-                            proficiency, name, reference_type, class_index, race_index, reference_index, reference_url
-                        ]
-                        rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_proficiencies_data = self._get_items(all_proficiencies, local_folder='proficiencies', api_route=route)
+            proficiencies = list(zip(all_proficiencies, all_proficiencies_data))
+            if self.normalized:
+                self._write(PROFICIENCIES_NORMALIZED_SHEET_NAME, schemas.PROFICIENCIES_NORMALIZED.extract(proficiencies))
+                self._write(PROFICIENCY_CLASSES_SHEET_NAME, schemas.PROFICIENCY_CLASSES.extract(proficiencies))
+                self._write(PROFICIENCY_RACES_SHEET_NAME, schemas.PROFICIENCY_RACES.extract(proficiencies))
+            else:
+                self._write(PROFICIENCIES_SHEET_NAME, schemas.PROFICIENCIES.extract(proficiencies))
             return 'jobs done'
 
         return 'failed to get all proficiencies'
 
     def parse_skills(self, route: str = 'skills/') -> str:
-        worksheet = self.sheet.get_worksheet(SKILLS_SHEET_NAME)
-        headers = ['index', 'name', 'ability_score', 'description']
-        rows = [headers]
-
         all_skills = self._get_all(route)
 
         if len(all_skills) > 0:
-            for skill in all_skills:
-                skill_data = self._get_item(item=skill, local_folder='skills', api_route=route)
-
-                print(f'processing {skill}')
-
-                name = skill_data.get('name')
-                ability_score = skill_data.get('ability_score', {}).get('name')
-                description = '\n'.join(skill_data.get('desc', []))
-
-                row = [skill, name, ability_score, description]
-                rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_skills_data = self._get_items(all_skills, local_folder='skills', api_route=route)
+            self._write(SKILLS_SHEET_NAME, schemas.SKILLS.extract(zip(all_skills, all_skills_data)))
             return 'jobs done'
 
         return 'failed to get all skills'
 
     def parse_subraces(self, route: str = 'subraces/') -> str:
-        worksheet = self.sheet.get_worksheet(SUBRACES_SHEET_NAME)
-        abilities_list = ['STR', 'DEX', 'CON', 'WIS', 'INT', 'CHA']
-        headers = ['index', 'name']
-        headers.extend([
-            f'{ability}_mod' for ability in abilities_list
-        ])
-        headers.extend(['description', 'race_index', 'traits_names', 'proficiencies_names'])
-        rows = [headers]
         all_subraces = self._get_all(route)
 
         if len(all_subraces) > 0:
-            for subrace in all_subraces:
-
-                print(f'processing {subrace}')
-
-                subrace_data = self._get_item(item=subrace, local_folder='subraces', api_route=route)
-                name = subrace_data.get('name')
-                ability_bonuses = subrace_data.get('ability_bonuses', [{}])
-                all_abilities = {
-                    ability_bonus.get('ability_score', {}).get('name'): ability_bonus.get('bonus')
-                    for ability_bonus in ability_bonuses
-                }
-                ability_modifiers = [all_abilities.get(ability) for ability in abilities_list]
-                description = subrace_data.get('desc')
-                race_index = subrace_data.get('race', {}).get('index')
-                traits = ', '.join([trait.get('name') for trait in subrace_data.get('racial_traits', [{}])])
-                proficiencies = ', '.join([prof.get('name') for prof in subrace_data.get('starting_proficiencies', [{}])])
-                row = [subrace, name]
-                row.extend(ability_modifiers)
-                row.extend([description, race_index, traits, proficiencies])
-                rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_subraces_data = self._get_items(all_subraces, local_folder='subraces', api_route=route)
+            self._write(SUBRACES_SHEET_NAME, schemas.SUBRACES.extract(zip(all_subraces, all_subraces_data)))
             return 'jobs done'
         return 'failed to get all subraces'
 
     def parse_subclasses(self, route: str = 'subclasses/') -> str:
-        worksheet = self.sheet.get_worksheet(SUBCLASSES_SHEET_NAME)
         all_subclasses = self._get_all(route)
 
-        subclasses_spells = [['subclass_index', 'spell_index', 'class_index', 'class_level']]
-
         if len(all_subclasses) > 0:
-
-            headers = [
-                'index', 'name', 'description', 'class_index', 'subclass_flavor',
-                 'level',
-                'features_names',
+            all_subclasses_details = self._get_items(all_subclasses,
+                                                     local_folder='subclasses',
+                                                     api_route=route)
+            all_subclasses_levels = self._get_items(
+                all_subclasses, local_folder='subclasses_levels', api_route=route, sub_route='levels'
+            )
+            subclasses = [
+                (subclass, {**subclass_details, '_levels': subclass_levels or []})
+                for subclass, subclass_details, subclass_levels
+                in zip(all_subclasses, all_subclasses_details, all_subclasses_levels)
             ]
-
-            rows = [headers]
-
-            for subclass in all_subclasses:
-
-                print(f'processing {subclass}...', end='')
-
-                subclass_details = self._get_item(item=subclass,
-                                               local_folder='subclasses',
-                                               api_route=route)
-                name = subclass_details.get('name')
-                description = '\n'.join(subclass_details.get('desc', []))
-                class_index = subclass_details.get('class',{}).get('index')
-                subclass_flavor = subclass_details.get('subclass_flavor')
-
-                available_spells = subclass_details.get('spells', [])
-                if len(available_spells) > 0:
-                    for spell in available_spells:
-                        subclasses_spells.append([
-                            subclass, spell.get('spell', {}).get('index'), class_index, spell.get('prerequisites', [{}])[0].get('index').replace(f'{class_index}-', '')
-                        ])
-
-                subclass_levels_response = self._request(
-                    path=f'{route + subclass}/levels')
-
-                if subclass_levels_response.ok:
-                    subclass_levels = subclass_levels_response.json()
-
-                    for level in subclass_levels:
-
-                        subclass_level = level.get('level')
-
-                        features_names = ', '.join(
-                            [feature.get('name') for feature in
-                             level.get('features', [])])
-
-                        if subclass_level == 1:
-
-                            print('level 1', end='\n')
-
-                        else:
-                            print(f'processing {subclass}...level {subclass_level}',
-                                  end='\n')
-                        row = [
-                            subclass, name, description, class_index, subclass_flavor, subclass_level,
-                            features_names]
-
-                        rows.append(row)
-            worksheet.clear()
-            worksheet.append_rows(rows)
-
-            subclasses_spells_sheet = self.sheet.get_worksheet('Subclasses_Spells')
-            subclasses_spells_sheet.clear()
-            subclasses_spells_sheet.append_rows(subclasses_spells)
-
+            self._write(SUBCLASSES_SHEET_NAME, schemas.SUBCLASSES.extract(subclasses))
+            self._write('Subclasses_Spells', schemas.SUBCLASSES_SPELLS.extract(subclasses))
             return 'jobs done'
         return 'failed to receive all classes'
 
     def parse_equipment(self, route: str = 'equipment/') -> str:
 
-        worksheet = self.sheet.get_worksheet(EQUIPMENT_SHEET_NAME)
         equipment_list = self._get_all(route)
 
         if len(equipment_list) > 0:
-            rows = [[
-                'index', 'name', 'category_index', 'cost', 'weight', 'weapon_category', 'weapon_range', 'damage_dice', 'damage_type', 'range_normal', 'range_long', 'properties_indices', '2h_damage_dice', '2h_damage_type',
-                'armor_category', 'ac', 'ac_dex_bonus', 'str_min', 'stealth_disadvantage'
-            ]]
-
-            for item in equipment_list:
-
-                print(f'processing {item}')
-
-                item_details = self._get_item(item=item, local_folder='equipment', api_route=route)
-                rows.append([
-                    item,
-                    item_details.get('name'),
-                    item_details.get('equipment_category', {}).get('index'),
-                    f"{item_details.get('cost', {}).get('quantity')} {item_details.get('cost', {}).get('unit')}",
-                    item_details.get('weight'),
-                    item_details.get('weapon_category'),
-                    item_details.get('weapon_range'),
-                    item_details.get('damage', {}).get('damage_dice'),
-                    item_details.get('damage', {}).get('damage_type', {}).get('name'),
-                    item_details.get('range', {}).get('normal'),
-                    item_details.get('range', {}).get('long'),
-                    ", ".join([property_.get('index') for property_ in item_details.get('properties', [{}])]),
-                    item_details.get('two_handed_damage',{}).get('damage_dice'),
-                    item_details.get('two_handed_damage', {}).get(
-                        'damage_type', {}).get('name'),
-                    item_details.get('armor_category'),
-                    item_details.get('armor_class', {}).get('base'),
-                    item_details.get('armor_class', {}).get('max_bonus') if item_details.get('armor_class', {}).get('dex_bonus') else 0,
-                    item_details.get('str_minimum'),
-                    item_details.get('stealth_disadvantage'),
-                ])
-
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_items_details = self._get_items(equipment_list, local_folder='equipment', api_route=route)
+            self._write(EQUIPMENT_SHEET_NAME, schemas.EQUIPMENT.extract(zip(equipment_list, all_items_details)))
             return 'jobs done'
         return 'failed to get all items'
 
     def parse_magic_items(self, route:str = 'magic-items/') -> str:
 
-        worksheet = self.sheet.get_worksheet(MAGIC_ITEMS_SHEET_NAME)
         all_items = self._get_all(route)
 
         if len(all_items) > 0:
-            rows = [[
-              'index', 'name', 'description', 'category_index', 'rarity', 'variant', 'has_children','parent_index'
-            ]]
-
-            parent_indices = {}
-
-            for item in all_items:
-
-                print(f'processing {item}')
-
-                item_details = self._get_item(item=item, local_folder='magic_items', api_route=route)
-
-                children_indices = [var.get('index') for var in
-                     item_details.get('variants', [{}])]
-                if len(children_indices)>0:
-                    for indx in children_indices:
-                        parent_indices[indx] = item
-
-                rows.append([
-                    item,
-                    item_details.get('name'),
-                    ", ".join(
-                               item_details.get('desc', [])),
-                    item_details.get('equipment_category', {}).get('index'),
-                    item_details.get('rarity',{}).get('name'),
-                    item_details.get('variant'),
-                    True if len(item_details.get('variants',[])) > 0 else False,
-                    parent_indices.get(item),
-                ])
-            worksheet.clear()
-            worksheet.append_rows(rows)
+            all_items_details = self._get_items(all_items, local_folder='magic_items', api_route=route)
+            # variants can come before the item listing them
+            parent_indices = {
+                variant.get('index'): item
+                for item, item_details in zip(all_items, all_items_details)
+                for variant in item_details.get('variants', [])
+            }
+            items = [
+                (item, {**item_details, '_parent_index': parent_indices.get(item)})
+                for item, item_details in zip(all_items, all_items_details)
+            ]
+            self._write(MAGIC_ITEMS_SHEET_NAME, schemas.MAGIC_ITEMS.extract(items))
             return 'jobs done'
         return 'failed to get all magic items'
 
-    def parse_all(self, exceptions: Union[List[Methods], None] = None):
-
-        exceptions_const = ['__init__', 'parse_all', '_request', '_get_all', '_get_item', 'csv_to_sql',
-                            'parse_spell_library_json']
-        all_methods = [name for name, method in inspect.getmembers(self, inspect.ismethod) if name not in exceptions_const]
-
-        for method_name in all_methods:
-            if method_name not in exceptions:
-
-                print(f'Launching {method_name}')
+    def parse_all(self, exceptions: Union[List[Methods], None] = None,
+                  max_parallel: int = MAX_PARALLEL_JOBS,
+                  dependencies: Optional[Dict[Methods, List[Methods]]] = None,
+                  resume: bool = False) -> Dict[str, JobResult]:
+        """Runs every parse job except ``exceptions``.
+
+        With ``resume`` the jobs an interrupted run already finished are skipped and the items it already fetched
+        are taken from the cache without revalidation.
+        """
+        exceptions = exceptions or []
+        dependencies = JOB_DEPENDENCIES if dependencies is None else dependencies
+
+        self.journal.start(resume=resume)
+        if self.journal.completed_jobs:
+            print(f'resuming, skipping finished jobs: {", ".join(sorted(self.journal.completed_jobs))}')
+        methods = [
+            method for method in Methods
+            if method not in exceptions and method.value not in self.journal.completed_jobs
+        ]
 
-                method = getattr(self, method_name)
+        scheduler = Scheduler(max_parallel=max_parallel)
+        for method in methods:
+            scheduler.add(
+                method.value,
+                self._job(method.value),
+                depends_on=[dep.value for dep in dependencies.get(method, []) if dep in methods],
+            )
 
-                result = method()
-                if result:
-                    print(result)
+        results = scheduler.run()
+        print(Scheduler.summary(results))
+        self.metrics.export(METRICS_JSON_PATH, METRICS_PROMETHEUS_PATH)
+        if all(result.status == JobStatus.DONE and result.result == 'jobs done' for result in results.values()):
+            self.journal.finish()
+        return results
+
+    def _job(self, name: str) -> Callable[[], str]:
+        def run() -> str:
+            with self.metrics.job(name):
+                result = getattr(self, name)()
+            # parse methods report a missing route list by returning a message instead of raising
+            if result == 'jobs done':
+                self.journal.job_done(name)
+            return result
+        return run
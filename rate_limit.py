@@ -0,0 +1,239 @@
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+from config import RATE_LIMITS, DEFAULT_RATE_LIMIT, RATE_LIMIT_CONCURRENCY, RATE_LIMIT_LATENCY_TARGET, \
+    RATE_LIMIT_RETRIES, HTTP_BACKOFF_FACTOR
+
+THROTTLE_STATUSES = (429, 503)
+SHEETS_HOST = 'sheets.googleapis.com'
+
+T = TypeVar('T')
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Seconds from a Retry-After header, which is either a number of seconds or an http date."""
+    value = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """``rate`` tokens per second, up to ``capacity`` saved up for bursts."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0
+            self._updated = now
+
+
+class HostLimiter:
+    """Token bucket and concurrency window of one host.
+
+    The window grows by one request per window of successful requests and is halved on throttling, errors or
+    when the average latency goes above ``latency_target`` (AIMD). The request rate recovers the same way up to
+    the configured budget and is halved when the host throttles.
+    """
+
+    def __init__(self, rate: float, max_concurrency: int, latency_target: float = RATE_LIMIT_LATENCY_TARGET):
+        self.max_rate = rate
+        self.min_rate = min(rate, 0.1)
+        self.bucket = TokenBucket(rate)
+        self.max_concurrency = max(1, max_concurrency)
+        self.window = float(self.max_concurrency)
+        self.latency_target = latency_target
+        self.latency = None
+        self.in_flight = 0
+        self.throttled = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(1, int(self.window))
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self.in_flight >= self.concurrency:
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            self.bucket.acquire()
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _decrease(self) -> None:
+        # a burst of parallel failures is one congestion signal, not one per request
+        now = time.monotonic()
+        if now - self._decreased_at < max(1.0, self.latency or 0):
+            return
+        self._decreased_at = now
+        self.window = max(1.0, self.window / 2)
+        self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+
+    def on_success(self, latency: float) -> None:
+        with self._condition:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.latency > self.latency_target:
+                self._decrease()
+            else:
+                self.window = min(self.max_concurrency, self.window + 1 / self.window)
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 20)
+            self._condition.notify_all()
+
+    def on_error(self) -> None:
+        with self._condition:
+            self._decrease()
+
+    def on_throttle(self, retry_after: float) -> None:
+        with self._condition:
+            self.throttled += 1
+            self._decrease()
+        self.bucket.block_for(retry_after)
+
+
+class RateLimiter:
+    """Per host budgets shared by every fetch and sink upload of the process.
+
+    ``call`` runs a request within the host's budget and retries it when the host answers 429/503, either as a
+    response or as an exception carrying one (gspread's APIError), after waiting for its Retry-After.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = DEFAULT_RATE_LIMIT,
+                 max_concurrency: int = RATE_LIMIT_CONCURRENCY, retries: int = RATE_LIMIT_RETRIES,
+                 backoff_factor: float = HTTP_BACKOFF_FACTOR):
+        self.rates = RATE_LIMITS if rates is None else rates
+        self.default_rate = default_rate
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.hosts: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def host(self, name: str) -> HostLimiter:
+        with self._lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostLimiter(self.rates.get(name, self.default_rate), self.max_concurrency)
+            return self.hosts[name]
+
+    def _backoff(self, response, attempt: int) -> float:
+        retry_after = retry_after_seconds(response)
+        return retry_after if retry_after is not None else max(1.0, self.backoff_factor * 2 ** attempt)
+
+    def call(self, host: str, func: Callable[..., T], *args, **kwargs) -> T:
+        limiter = self.host(host)
+        attempt = 0
+        while True:
+            with limiter.slot():
+                started = time.monotonic()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:
+                    response = getattr(error, 'response', None)
+                    if getattr(response, 'status_code', None) not in THROTTLE_STATUSES or attempt >= self.retries:
+                        limiter.on_error()
+                        raise
+                    result = None
+                else:
+                    response = result
+                latency = time.monotonic() - started
+
+            status = getattr(response, 'status_code', None)
+            if status in THROTTLE_STATUSES and attempt < self.retries:
+                limiter.on_throttle(self._backoff(response, attempt))
+                attempt += 1
+                continue
+            # a host still throttling after the last retry is congested, not a success to grow the window on
+            if status is not None and (status >= 500 or status in THROTTLE_STATUSES):
+                limiter.on_error()
+            else:
+                limiter.on_success(latency)
+            return result
+
+
+class RateLimitedTransport:
+    """Sends every request of the wrapped transport through the limiter of its host."""
+
+    def __init__(self, transport, limiter: RateLimiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def request(self, method: str, url: str, **kwargs):
+        return self.limiter.call(urlparse(url).hostname or '', self.transport.request, method, url, **kwargs)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class RateLimitedProxy:
+    """Wraps an api client object (a gspread worksheet) so that each of its method calls is rate limited."""
+
+    def __init__(self, target, limiter: RateLimiter, host: str):
+        self._target = target
+        self._limiter = limiter
+        self._host = host
+
+    def __getattr__(self, name: str):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return value
+
+        def limited(*args, **kwargs):
+            return self._limiter.call(self._host, value, *args, **kwargs)
+        return limited
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """The process wide limiter, so parallel jobs and sinks draw from the same per host budgets."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
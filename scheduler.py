@@ -0,0 +1,114 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Any
+
+
+class JobStatus:
+    DONE = 'done'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class JobResult:
+    name: str
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+class Scheduler:
+    """Runs jobs in parallel, starting each one as soon as all of its dependencies are done."""
+
+    def __init__(self, max_parallel: int):
+        self.max_parallel = max(1, max_parallel)
+        self.jobs: Dict[str, Job] = {}
+
+    def add(self, name: str, func: Callable[[], Any], depends_on: Optional[Iterable[str]] = None) -> None:
+        self.jobs[name] = Job(name=name, func=func, depends_on=list(depends_on or []))
+
+    def _validate(self) -> None:
+        for job in self.jobs.values():
+            unknown = [dep for dep in job.depends_on if dep not in self.jobs]
+            if unknown:
+                raise ValueError(f'{job.name} depends on unknown jobs: {", ".join(unknown)}')
+
+        visited, in_progress = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in in_progress:
+                raise ValueError(f'dependency cycle detected at {name}')
+            in_progress.add(name)
+            for dep in self.jobs[name].depends_on:
+                visit(dep)
+            in_progress.discard(name)
+            visited.add(name)
+
+        for name in self.jobs:
+            visit(name)
+
+    @staticmethod
+    def _run_job(job: Job) -> JobResult:
+        started = time.perf_counter()
+        try:
+            result = job.func()
+        except Exception:
+            return JobResult(name=job.name, status=JobStatus.FAILED, error=traceback.format_exc(),
+                             duration=time.perf_counter() - started)
+        return JobResult(name=job.name, status=JobStatus.DONE, result=result,
+                         duration=time.perf_counter() - started)
+
+    def run(self) -> Dict[str, JobResult]:
+        self._validate()
+
+        results: Dict[str, JobResult] = {}
+        pending = dict(self.jobs)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            while pending or running:
+                for name, job in list(pending.items()):
+                    failed_deps = [dep for dep in job.depends_on
+                                   if dep in results and results[dep].status != JobStatus.DONE]
+                    if failed_deps:
+                        results[name] = JobResult(name=name, status=JobStatus.SKIPPED,
+                                                  error=f'dependencies not done: {", ".join(failed_deps)}')
+                        del pending[name]
+                    elif all(dep in results for dep in job.depends_on):
+                        running[executor.submit(self._run_job, job)] = name
+                        del pending[name]
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+
+        return {name: results[name] for name in self.jobs}
+
+    @staticmethod
+    def summary(results: Dict[str, JobResult]) -> str:
+        lines = []
+        for result in results.values():
+            line = f'{result.name}: {result.status} in {result.duration:.2f}s'
+            if result.status == JobStatus.DONE and result.result:
+                line += f' ({result.result})'
+            lines.append(line)
+            if result.error:
+                lines.append('    ' + result.error.strip().replace('\n', '\n    '))
+        done = sum(result.status == JobStatus.DONE for result in results.values())
+        lines.append(f'{done} of {len(results)} jobs done')
+        return '\n'.join(lines)
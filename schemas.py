@@ -0,0 +1,296 @@
+"""Row schemas of every parsed table, see extractors.py.
+
+Records handed to the schemas are the cached entities, the parse methods add what comes from other requests
+under keys starting with '_' (a class's ``_levels``, a magic item's ``_parent_index``).
+"""
+from typing import Callable, Dict, List
+
+from extractors import Schema, Field, Explode, KEY, lines, join_names, join_indices
+
+ABILITIES = ['STR', 'DEX', 'CON', 'WIS', 'INT', 'CHA']
+
+
+def damage_progression(spell: Dict) -> List[tuple]:
+    """[(modifier_lvl, damage), ...] for every character level or slot level the damage applies to."""
+    damage = spell.get('damage', {})
+    damage_at_levels = damage.get('damage_at_character_level')
+    damage_at_slots = damage.get('damage_at_slot_level')
+
+    if damage_at_slots:
+        keys, values = [int(key) for key in damage_at_slots.keys()], damage_at_slots
+        levels = range(spell.get('level'), max(keys) + 1)
+    elif damage_at_levels:
+        keys, values = [int(key) for key in damage_at_levels.keys()], damage_at_levels
+        levels = range(min(keys), 21)
+    else:
+        return []
+
+    progression = []
+    prev_value = None
+    for lvl in levels:
+        if lvl in keys:
+            prev_value = values.get(f'{lvl}')
+        progression.append((lvl, prev_value))
+    return progression
+
+
+def damage_modifier(damage: Dict) -> str:
+    return 'slot' if damage.get('damage_at_slot_level') else 'level' if damage.get('damage_at_character_level') else ''
+
+
+def trait_damage_progression(damage_data: List[Dict]) -> List[tuple]:
+    """[(level, damage), ...] for character levels 1-20, carrying the last known damage forward."""
+    if len(damage_data) == 0:
+        return []
+    damage_at_levels = damage_data[0].get('damage_at_character_level', {})
+    progression = []
+    damage = ''
+    for lvl in range(1, 21):
+        damage = damage_at_levels.get(str(lvl)) or damage
+        progression.append((lvl, damage))
+    return progression
+
+
+def ability_bonus(ability: str) -> Callable[[List[Dict]], int]:
+    def bonus(ability_bonuses: List[Dict]):
+        found = None
+        for ability_bonus_ in ability_bonuses:
+            if ability_bonus_.get('ability_score', {}).get('name') == ability:
+                found = ability_bonus_.get('bonus')
+        return found
+    return bonus
+
+
+def class_levels(levels: List[Dict]) -> List[Dict]:
+    """The levels with the ability score bonuses gained at each one (the API only has the running total)."""
+    gained = []
+    previous = 0
+    for level in levels:
+        total = level.get('ability_score_bonuses')
+        gained.append({**level, '_ability_score_bonuses_gained': total - previous})
+        previous = max(previous, total)
+    return gained
+
+
+def is_caster(levels: List[Dict]) -> bool:
+    slots = ['cantrips_known'] + [f'spell_slots_level_{i}' for i in range(1, 10)]
+    return any(level.get('spellcasting', {}).get(slot) for level in levels for slot in slots)
+
+
+def ability_modifiers() -> List[Field]:
+    return [Field(f'{ability}_mod', 'ability_bonuses', default=(), transform=ability_bonus(ability))
+            for ability in ABILITIES]
+
+
+def reference_table(index_column: str, column: str, path: str) -> Schema:
+    """Normalized link table, one (index, referenced index) row per reference."""
+    return Schema([Field(index_column, KEY), Field(column, 'reference.index')], [Explode('reference', path, default=())])
+
+
+SPELL_FIELDS = [
+    Field('index', KEY),
+    Field('name', (None, KEY), transform=lambda spell, index: spell.get('name', f"failed to parse: {index}")),
+    Field('description', 'desc', default=(), transform=lines),
+    Field('higher_level', 'higher_level', default=(), transform=lines),
+    Field('range', 'range'),
+    Field('components', 'components', default=(), transform=', '.join),
+    Field('material', 'material'),
+    Field('area_of_effect_type', 'area_of_effect.type'),
+    Field('area_of_effect_size', 'area_of_effect.size'),
+    Field('ritual', 'ritual'),
+    Field('duration', 'duration'),
+    Field('concentration', 'concentration'),
+    Field('casting_time', 'casting_time'),
+    Field('spell_level', 'level'),
+    Field('school', 'school.name'),
+    Field('class_index', 'class.index'),
+    Field('attack_type', 'attack_type'),
+    Field('damage_type', 'damage.damage_type.name'),
+    Field('damage_modifier', 'damage', default={}, transform=damage_modifier),
+    Field('modifier_lvl', 'progression.0'),
+    Field('damage', 'progression.1'),
+]
+SPELLS = Schema(SPELL_FIELDS, [
+    Explode('class', 'classes', default=[{}]),
+    Explode('progression', transform=damage_progression, empty=[('', '')]),
+])
+SPELLS_NORMALIZED = Schema([field for field in SPELL_FIELDS
+                            if field.name not in ('class_index', 'modifier_lvl', 'damage')])
+SPELL_CLASSES = reference_table('spell_index', 'class_index', 'classes')
+SPELL_DAMAGE_PROGRESSION = Schema([
+    Field('spell_index', KEY),
+    Field('damage_modifier', 'damage', default={}, transform=damage_modifier),
+    Field('modifier_lvl', 'progression.0'),
+    Field('damage', 'progression.1'),
+], [Explode('progression', transform=damage_progression)])
+
+CLASSES = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('hit_die', 'hit_die'),
+    Field('saving_throws', 'saving_throws', default=(), transform=join_names),
+    Field('level', 'level.level'),
+    Field('ability_score_bonuses', 'level._ability_score_bonuses_gained'),
+    Field('ability_score_bonuses_total', 'level.ability_score_bonuses'),
+    Field('proficiency_bonus', 'level.prof_bonus'),
+    Field('features_names', 'level.features', default=(), transform=join_names),
+    Field('is_caster', '_levels', transform=is_caster),
+    Field('cantrips', 'level.spellcasting.cantrips_known'),
+] + [
+    Field(f'spell_slots_level_{i}', f'level.spellcasting.spell_slots_level_{i}') for i in range(1, 10)
+], [Explode('level', '_levels', transform=class_levels)])
+CLASSES_SKILLS = Schema([
+    Field('class_index', KEY),
+    Field('proficiency_skills_description', 'proficiency_choices.0.desc'),
+    Field('skills_choose', 'proficiency_choices.0.choose'),
+    Field('skill_index', 'skill.item.index', default='skill-', transform=lambda index: index.replace('skill-', '')),
+], [Explode('skill', 'proficiency_choices.0.from.options', default=[{}])])
+
+RACES = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('speed', 'speed'),
+] + ability_modifiers() + [
+    Field('alignment', 'alignment'),
+    Field('age', 'age'),
+    Field('size', 'size'),
+    Field('size_description', 'size_description'),
+    Field('proficiencies_names', 'starting_proficiencies', default=(), transform=join_names),
+    Field('languages', 'languages', default=(), transform=join_names),
+    Field('language_desc', 'language_desc'),
+    Field('traits_names', 'traits', default=(), transform=join_names),
+])
+
+FEATURES = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('class_index', 'class.index'),
+    Field('subclass_index', 'subclass.index'),
+    Field('description', 'desc', default=(), transform=lines),
+    Field('level', 'level'),
+])
+
+BREATH_WEAPON_DAMAGE = 'trait_specific.breath_weapon.damage'
+TRAIT_FIELDS = [
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('description', 'desc', default=(), transform=lines),
+    Field('race_index', 'race.index'),
+    Field('subrace_index', 'subrace.index'),
+    Field('proficiency_index', 'proficiency.index'),
+    Field('is_damage', BREATH_WEAPON_DAMAGE, default=(), transform=bool),
+    Field('damage_type', 'trait_specific.damage_type.name'),
+    Field('area_of_effect_type', 'trait_specific.breath_weapon.area_of_effect.type'),
+    Field('area_of_effect_size', 'trait_specific.breath_weapon.area_of_effect.size'),
+    Field('usage_times', 'trait_specific.breath_weapon.usage.times'),
+    Field('dc', 'trait_specific.breath_weapon.dc.dc_type.name'),
+    Field('dc_success', 'trait_specific.breath_weapon.dc.success_type'),
+    Field('level', 'progression.0'),
+    Field('damage', 'progression.1'),
+]
+TRAITS = Schema(TRAIT_FIELDS, [
+    Explode('race', 'races', empty=[{'index': ''}]),
+    Explode('subrace', 'subraces', empty=[{'index': ''}]),
+    Explode('proficiency', 'proficiencies', empty=[{'index': ''}]),
+    Explode('progression', BREATH_WEAPON_DAMAGE, default=(), transform=trait_damage_progression,
+            empty=[('', '')]),
+])
+TRAITS_NORMALIZED = Schema([
+    field for field in TRAIT_FIELDS
+    if field.name not in ('race_index', 'subrace_index', 'proficiency_index', 'level', 'damage')
+])
+TRAIT_RACES = reference_table('trait_index', 'race_index', 'races')
+TRAIT_SUBRACES = reference_table('trait_index', 'subrace_index', 'subraces')
+TRAIT_PROFICIENCIES = reference_table('trait_index', 'proficiency_index', 'proficiencies')
+TRAIT_DAMAGE_PROGRESSION = Schema([
+    Field('trait_index', KEY),
+    Field('level', 'progression.0'),
+    Field('damage', 'progression.1'),
+], [Explode('progression', BREATH_WEAPON_DAMAGE, default=(), transform=trait_damage_progression)])
+
+PROFICIENCY_FIELDS = [
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('reference_type', 'type'),
+    Field('class_index', 'class.index'),
+    Field('race_index', 'race.index'),
+    Field('reference_index', 'reference.index'),
+    Field('reference_url', 'reference.url'),
+]
+PROFICIENCIES = Schema(PROFICIENCY_FIELDS, [
+    Explode('race', 'races', empty=[{'index': ''}]),
+    Explode('class', 'classes', empty=[{'index': ''}]),
+])
+PROFICIENCIES_NORMALIZED = Schema([field for field in PROFICIENCY_FIELDS
+                                   if field.name not in ('class_index', 'race_index')])
+PROFICIENCY_CLASSES = reference_table('proficiency_index', 'class_index', 'classes')
+PROFICIENCY_RACES = reference_table('proficiency_index', 'race_index', 'races')
+
+SKILLS = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('ability_score', 'ability_score.name'),
+    Field('description', 'desc', default=(), transform=lines),
+])
+
+SUBRACES = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+] + ability_modifiers() + [
+    Field('description', 'desc'),
+    Field('race_index', 'race.index'),
+    Field('traits_names', 'racial_traits', default=(), transform=join_names),
+    Field('proficiencies_names', 'starting_proficiencies', default=(), transform=join_names),
+])
+
+SUBCLASSES = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('description', 'desc', default=(), transform=lines),
+    Field('class_index', 'class.index'),
+    Field('subclass_flavor', 'subclass_flavor'),
+    Field('level', 'level.level'),
+    Field('features_names', 'level.features', default=(), transform=join_names),
+], [Explode('level', '_levels')])
+SUBCLASSES_SPELLS = Schema([
+    Field('subclass_index', KEY),
+    Field('spell_index', 'spell.spell.index'),
+    Field('class_index', 'class.index'),
+    # 'wizard-3' -> '3'
+    Field('class_level', ('spell.prerequisites.0.index', 'class.index'),
+          transform=lambda prerequisite, class_index: prerequisite.replace(f'{class_index}-', '')),
+], [Explode('spell', 'spells', default=())])
+
+EQUIPMENT = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('category_index', 'equipment_category.index'),
+    Field('cost', ('cost.quantity', 'cost.unit'), transform=lambda quantity, unit: f'{quantity} {unit}'),
+    Field('weight', 'weight'),
+    Field('weapon_category', 'weapon_category'),
+    Field('weapon_range', 'weapon_range'),
+    Field('damage_dice', 'damage.damage_dice'),
+    Field('damage_type', 'damage.damage_type.name'),
+    Field('range_normal', 'range.normal'),
+    Field('range_long', 'range.long'),
+    Field('properties_indices', 'properties', default=(), transform=join_indices),
+    Field('2h_damage_dice', 'two_handed_damage.damage_dice'),
+    Field('2h_damage_type', 'two_handed_damage.damage_type.name'),
+    Field('armor_category', 'armor_category'),
+    Field('ac', 'armor_class.base'),
+    Field('ac_dex_bonus', ('armor_class.max_bonus', 'armor_class.dex_bonus'),
+          transform=lambda max_bonus, dex_bonus: max_bonus if dex_bonus else 0),
+    Field('str_min', 'str_minimum'),
+    Field('stealth_disadvantage', 'stealth_disadvantage'),
+])
+
+MAGIC_ITEMS = Schema([
+    Field('index', KEY),
+    Field('name', 'name'),
+    Field('description', 'desc', default=(), transform=', '.join),
+    Field('category_index', 'equipment_category.index'),
+    Field('rarity', 'rarity.name'),
+    Field('variant', 'variant'),
+    Field('has_children', 'variants', default=(), transform=bool),
+    Field('parent_index', '_parent_index'),
+])
@@ -0,0 +1,306 @@
+"""Inverted full-text index over spell, feature, trait and magic item descriptions (and the Spell Library JSON).
+
+    index = SearchIndex.load()
+    index.search('fire dam', filters={'type': 'spells', 'level': 3, 'class': 'wizard'})
+
+Every query token has to match, the last one also matches as a prefix so results follow typing. Scores are
+field weight x term frequency x idf.
+"""
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import sys
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache_service import partial_folder
+from config import SEARCH_INDEX_PATH
+
+INDEX_VERSION = 1
+TOKEN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(['a', 'an', 'and', 'as', 'at', 'be', 'by', 'for', 'in', 'is', 'it', 'of', 'on', 'or', 'that',
+                        'the', 'to', 'with', 'you', 'your'])
+FIELD_WEIGHTS = {'name': 4.0, 'desc': 1.0, 'higher_level': 0.5}
+# prefix queries like 'a' could expand to thousands of terms
+MAX_PREFIX_TERMS = 64
+# a term only matching as a prefix ('fireballs' for 'fireball') counts less than the exact one
+PREFIX_MATCH_WEIGHT = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower().replace("'", '')) if token not in STOP_WORDS]
+
+
+def _text(value) -> str:
+    return '\n'.join(value) if isinstance(value, list) else str(value or '')
+
+
+def _filter_value(value):
+    if isinstance(value, list):
+        return [_filter_value(element) for element in value]
+    return value.lower() if isinstance(value, str) else value
+
+
+def _indices(references) -> List[str]:
+    return [reference.get('index') for reference in references or [] if isinstance(reference, dict)]
+
+
+def spell_document(spell: Dict) -> Dict:
+    return {
+        'type': 'spells', 'index': spell.get('index'), 'name': spell.get('name'),
+        'fields': {'name': spell.get('name'), 'desc': _text(spell.get('desc')),
+                   'higher_level': _text(spell.get('higher_level'))},
+        'filters': {'level': spell.get('level'), 'school': (spell.get('school') or {}).get('index'),
+                    'class': _indices(spell.get('classes')) + _indices(spell.get('subclasses'))},
+    }
+
+
+def feature_document(feature: Dict) -> Dict:
+    return {
+        'type': 'features', 'index': feature.get('index'), 'name': feature.get('name'),
+        'fields': {'name': feature.get('name'), 'desc': _text(feature.get('desc'))},
+        'filters': {'level': feature.get('level'),
+                    'class': _indices([feature.get('class')]) + _indices([feature.get('subclass')])},
+    }
+
+
+def trait_document(trait: Dict) -> Dict:
+    return {
+        'type': 'traits', 'index': trait.get('index'), 'name': trait.get('name'),
+        'fields': {'name': trait.get('name'), 'desc': _text(trait.get('desc'))},
+        'filters': {'race': _indices(trait.get('races')) + _indices(trait.get('subraces'))},
+    }
+
+
+def magic_item_document(item: Dict) -> Dict:
+    return {
+        'type': 'magic_items', 'index': item.get('index'), 'name': item.get('name'),
+        'fields': {'name': item.get('name'), 'desc': _text(item.get('desc'))},
+        'filters': {'rarity': (item.get('rarity') or {}).get('name'),
+                    'category': (item.get('equipment_category') or {}).get('index')},
+    }
+
+
+def spell_library_document(spell: Dict) -> Dict:
+    """From a parsed Spell Library row (see Parser._spell_library_rows)."""
+    classes = [name for name in ('bard', 'cleric', 'druid', 'fighter', 'monk', 'paladin', 'ranger', 'rogue',
+                                 'sorcerer', 'warlock', 'wizard') if spell.get(name)]
+    level = spell.get('level')
+    return {
+        'type': 'spell_library', 'index': spell.get('name'), 'name': spell.get('name'),
+        'fields': {'name': spell.get('name'), 'desc': spell.get('description') or ''},
+        'filters': {'level': int(level) if str(level).isdigit() else level, 'school': spell.get('school'),
+                    'class': classes, 'source': spell.get('source')},
+    }
+
+
+# cache folder -> document builder
+DOCUMENT_BUILDERS = {
+    'spells': spell_document,
+    'features': feature_document,
+    'traits': trait_document,
+    'magic_items': magic_item_document,
+}
+
+
+class SearchIndex:
+    def __init__(self, documents: Optional[List[Dict]] = None, postings: Optional[Dict[str, Dict[int, float]]] = None):
+        # documents only keep what results and filters need, the text lives in the postings
+        self.documents: List[Dict] = documents or []
+        self.postings: Dict[str, Dict[int, float]] = postings or {}
+        self.terms: List[str] = sorted(self.postings)
+        self._ranked: Dict[str, List[Tuple[float, int]]] = {}
+
+    @classmethod
+    def build(cls, documents: Iterable[Dict], weights: Optional[Dict[str, float]] = None) -> 'SearchIndex':
+        weights = FIELD_WEIGHTS if weights is None else weights
+        index = cls()
+        for document in documents:
+            doc_id = len(index.documents)
+            index.documents.append({
+                'type': document['type'], 'index': document['index'], 'name': document['name'],
+                'filters': {name: _filter_value(value) for name, value in document['filters'].items()
+                            if value not in (None, '', [])},
+            })
+            for field, text in document['fields'].items():
+                weight = weights.get(field, 1.0)
+                for token in tokenize(_text(text)):
+                    postings = index.postings.setdefault(token, {})
+                    postings[doc_id] = postings.get(doc_id, 0.0) + weight
+        index.terms = sorted(index.postings)
+        return index
+
+    @classmethod
+    def from_cache(cls, cache, spell_library_rows: Optional[Iterable[List]] = None,
+                   weights: Optional[Dict[str, float]] = None) -> 'SearchIndex':
+        """Indexes the cached spells, features, traits and magic items, and the Spell Library rows if given.
+
+        Entities only the graphql backend loaded (``spells_graphql``) are indexed where no full one is cached.
+
+        ``cache`` is a CachePolicy, ``spell_library_rows`` are rows as yielded by Parser._spell_library_rows.
+        """
+        def documents():
+            folders = set(cache.backend.folders())
+            for folder, build_document in DOCUMENT_BUILDERS.items():
+                entities = cache.get_many(folder) if folder in folders else {}
+                # the graphql backend caches what it loaded in its own folder, full entities win
+                if partial_folder(folder) in folders:
+                    entities = {**cache.get_many(partial_folder(folder)), **entities}
+                for _, entity in sorted(entities.items()):
+                    yield build_document(entity)
+            if spell_library_rows is not None:
+                rows = iter(spell_library_rows)
+                headers = next(rows, None)
+                for row in rows:
+                    yield spell_library_document(dict(zip(headers, row)))
+        return cls.build(documents(), weights)
+
+    def _matching_terms(self, token: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [token] if token in self.postings else []
+        start = bisect_left(self.terms, token)
+        matched = []
+        for term in self.terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            matched.append(term)
+        return matched
+
+    def _matches(self, document: Dict, filters: Dict) -> bool:
+        for name, expected in filters.items():
+            if name == 'type':
+                if document['type'] != expected:
+                    return False
+                continue
+            value = document['filters'].get(name)
+            expected = _filter_value(expected)
+            if value != expected and not (isinstance(value, list) and expected in value):
+                return False
+        return True
+
+    def search(self, query: str, filters: Optional[Dict] = None, limit: int = 20, prefix: bool = True) -> List[Dict]:
+        """Best ``limit`` documents matching every token of ``query`` and every ``filters`` value.
+
+        Filters compare case-insensitively: ``type`` (spells, features, traits, magic_items, spell_library),
+        ``level``, ``school``, ``class``, ``race``, ``rarity``, ``category``, ``source``.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        # [(term, idf), ...] per token
+        matches = []
+        for position, token in enumerate(tokens):
+            terms = self._matching_terms(token, prefix and position == len(tokens) - 1)
+            if not terms:
+                return []
+            matches.append([(term, self._idf(term) * (1.0 if term == token else PREFIX_MATCH_WEIGHT))
+                            for term in terms])
+
+        if len(matches) == 1:
+            results = self._search_one(matches[0], filters, limit)
+        else:
+            results = self._search_all(matches, filters, limit)
+        return [
+            {**{key: self.documents[doc_id][key] for key in ('type', 'index', 'name')}, 'score': round(score, 3)}
+            for score, doc_id in results
+        ]
+
+    def _idf(self, term: str) -> float:
+        return math.log(1 + len(self.documents) / len(self.postings[term]))
+
+    def _ranked_postings(self, term: str) -> List[Tuple[float, int]]:
+        """The term's postings as [(weight, doc_id), ...] with the heaviest first, built on first use."""
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            ranked = self._ranked[term] = sorted(
+                ((weight, doc_id) for doc_id, weight in self.postings[term].items()), reverse=True
+            )
+        return ranked
+
+    def _search_one(self, terms: List[Tuple[str, float]], filters: Optional[Dict], limit: int
+                    ) -> List[Tuple[float, int]]:
+        # merging the impact ordered postings yields documents best first, so this stops after ``limit`` hits
+        merged = heapq.merge(
+            *(((weight * idf, doc_id) for weight, doc_id in self._ranked_postings(term)) for term, idf in terms),
+            reverse=True,
+        )
+        results, seen = [], set()
+        for score, doc_id in merged:
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            if not filters or self._matches(self.documents[doc_id], filters):
+                results.append((score, doc_id))
+                if len(results) == limit:
+                    break
+        return results
+
+    def _search_all(self, matches: List[List[Tuple[str, float]]], filters: Optional[Dict], limit: int
+                    ) -> List[Tuple[float, int]]:
+        def size(terms):
+            return sum(len(self.postings[term]) for term, _ in terms)
+
+        # walk the rarest token's documents and look the others up
+        matches = sorted(matches, key=size)
+        candidates: Dict[int, float] = {}
+        for term, idf in matches[0]:
+            for doc_id, weight in self.postings[term].items():
+                score = weight * idf
+                if score > candidates.get(doc_id, 0.0):
+                    candidates[doc_id] = score
+
+        for terms in matches[1:]:
+            best: Dict[int, float] = {}
+            for term, idf in terms:
+                postings = self.postings[term]
+                # iterate whichever side is smaller
+                if len(postings) < len(candidates):
+                    pairs = ((doc_id, weight) for doc_id, weight in postings.items() if doc_id in candidates)
+                else:
+                    pairs = ((doc_id, postings[doc_id]) for doc_id in candidates if doc_id in postings)
+                for doc_id, weight in pairs:
+                    score = weight * idf
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            candidates = {doc_id: candidates[doc_id] + score for doc_id, score in best.items()}
+            if not candidates:
+                return []
+
+        results = [
+            (score, doc_id) for doc_id, score in candidates.items()
+            if not filters or self._matches(self.documents[doc_id], filters)
+        ]
+        return heapq.nlargest(limit, results)
+
+    def save(self, path: str = SEARCH_INDEX_PATH) -> None:
+        temp_path = f'{path}.tmp'
+        with gzip.open(temp_path, 'wt') as index_file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'documents': self.documents,
+                # postings as [[doc_id, weight], ...], json objects would turn the ids into strings
+                'postings': {term: list(postings.items()) for term, postings in self.postings.items()},
+            }, index_file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SEARCH_INDEX_PATH) -> 'SearchIndex':
+        with gzip.open(path, 'rt') as index_file:
+            payload = json.load(index_file)
+        if payload.get('version') != INDEX_VERSION:
+            raise ValueError(f'{path} is not a version {INDEX_VERSION} search index')
+        return cls(payload['documents'], {term: dict(postings) for term, postings in payload['postings'].items()})
+
+
+if __name__ == '__main__':
+    # python search_index.py "fire dam" type=spells level=3
+    index = SearchIndex.load()
+    query_filters = dict(argument.split('=', 1) for argument in sys.argv[2:])
+    if 'level' in query_filters:
+        query_filters['level'] = int(query_filters['level'])
+    for found in index.search(sys.argv[1], query_filters):
+        print(f"{found['score']:>8} {found['type']:<14} {found['index']}")
@@ -0,0 +1,343 @@
+import csv
+import os
+import re
+import sqlite3
+import threading
+from itertools import islice
+from typing import Iterable, List, Sequence, Optional, Dict, Tuple
+
+from config import SINKS, CSV_OUTPUT_DIR, CSV_FILE_PREFIX, SQLITE_OUTPUT_PATH, PARQUET_OUTPUT_DIR, SNAPSHOT_PATH, \
+    GSHEET_SYNC_MODE, GSHEET_KEY_COLUMNS, GSHEET_BATCH_SIZE, SQL_OUTPUT_DIR, SQL_DATASET, SQL_BATCH_SIZE
+from rate_limit import RateLimiter, RateLimitedProxy, shared_limiter, SHEETS_HOST
+
+Row = Sequence
+
+
+def sheet_value(value) -> str:
+    """Renders a value the way it reads back from a Google sheet (and the exported csv files)."""
+    if value is None:
+        return ''
+    if value is True:
+        return 'TRUE'
+    if value is False:
+        return 'FALSE'
+    return str(value)
+
+
+def table_name(name: str) -> str:
+    """'Magic Items' -> 'magic_items'"""
+    return re.sub(r'\W+', '_', name).strip('_').lower()
+
+
+def column_letter(column: int) -> str:
+    """1 -> 'A', 27 -> 'AA'"""
+    letters = ''
+    while column > 0:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _trimmed(row: Sequence[str]) -> List[str]:
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def diff_rows(old: List[List[str]], new: List[Row], key_columns: Optional[List[str]] = None
+              ) -> Tuple[List[Row], Dict[str, int]]:
+    """Lays ``new`` rows (headers first) out over the ``old`` sheet values so that as few rows as possible move.
+
+    Rows are matched by ``key_columns`` (the whole row when not given): kept rows stay where they are,
+    inserted rows take the place of deleted ones first and the rest are appended, left over gaps are filled
+    with rows from the bottom of the sheet. Returns the new layout and insert/update/delete counts.
+    """
+    headers = list(new[0])
+    key_positions = [headers.index(column) for column in key_columns or [] if column in headers]
+
+    def keyed(rows):
+        seen = {}
+        for row in rows:
+            values = [sheet_value(value) for value in row]
+            values += [''] * (len(headers) - len(values))
+            key = tuple(values[i] for i in key_positions) if key_positions else tuple(_trimmed(values))
+            seen[key] = seen.get(key, 0) + 1
+            yield key + (seen[key],), row
+
+    old_body = list(keyed(old[1:]))
+    old_positions = {key: position for position, (key, _) in enumerate(old_body)}
+
+    layout: List[Optional[Row]] = [None] * len(old_body)
+    inserted = []
+    updated = 0
+    for key, row in keyed(new[1:]):
+        position = old_positions.pop(key, None)
+        if position is None:
+            inserted.append(row)
+            continue
+        layout[position] = row
+        if _trimmed(sheet_value(value) for value in row) != _trimmed(old_body[position][1]):
+            updated += 1
+    deleted = len(old_positions)
+
+    free = [position for position, row in enumerate(layout) if row is None]
+    for position, row in zip(free, inserted):
+        layout[position] = row
+    layout.extend(inserted[len(free):])
+
+    # close the gaps left by deleted rows with rows from the bottom
+    position = 0
+    while position < len(layout):
+        if layout[position] is not None:
+            position += 1
+            continue
+        last = layout.pop()
+        if last is not None and position < len(layout):
+            layout[position] = last
+
+    return [headers] + layout, {'inserted': len(inserted), 'updated': updated, 'deleted': deleted}
+
+
+class GsheetSink:
+    """Syncs the worksheet named after the table.
+
+    In ``diff`` mode the worksheet is read once and only the rows that differ are written back with one
+    batch update, so an unchanged table costs a single read and the worksheet is never left empty. The diff
+    needs the old and the new table in memory, a streamed table is collected first.
+    ``replace`` mode clears the worksheet and uploads the table in batches of ``batch_size`` rows, it is the only
+    mode with bounded memory.
+
+    Credentials are only loaded (and gspread imported) when the first table is written. Every Sheets API call
+    goes through the shared rate limiter and is retried when the API answers 429.
+    """
+
+    def __init__(self, gsheet=None, mode: str = GSHEET_SYNC_MODE,
+                 key_columns: Optional[Dict[str, List[str]]] = None, batch_size: int = GSHEET_BATCH_SIZE,
+                 limiter: Optional[RateLimiter] = None):
+        if mode not in ('diff', 'replace'):
+            raise ValueError(f'unknown gsheet sync mode {mode}, expected diff or replace')
+        self._sheet = gsheet
+        self._lock = threading.Lock()
+        self.mode = mode
+        self.batch_size = batch_size
+        self.key_columns = GSHEET_KEY_COLUMNS if key_columns is None else key_columns
+        self.limiter = limiter if limiter is not None else shared_limiter()
+
+    @property
+    def sheet(self):
+        if self._sheet is None:
+            with self._lock:
+                if self._sheet is None:
+                    from gsheet_service import Gsheet
+                    self._sheet = Gsheet()
+        return self._sheet
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        worksheet = RateLimitedProxy(
+            self.limiter.call(SHEETS_HOST, self.sheet.get_worksheet, name), self.limiter, SHEETS_HOST
+        )
+        if self.mode == 'replace':
+            worksheet.clear()
+            rows = iter(rows)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    return
+                worksheet.append_rows(batch)
+        self.sync(worksheet, list(rows), self.key_columns.get(name))
+
+    @staticmethod
+    def sync(worksheet, rows: List[Row], key_columns: Optional[List[str]] = None) -> Dict[str, int]:
+        old = worksheet.get_all_values()
+        layout, stats = diff_rows(old, rows, key_columns)
+
+        # columns the table no longer has are cleared along with the changed rows
+        width = max(max(len(row) for row in layout), max((len(row) for row in old), default=0))
+
+        changed = [
+            number for number, row in enumerate(layout)
+            if number >= len(old) or _trimmed(sheet_value(value) for value in row) != _trimmed(old[number])
+        ]
+        if not changed and len(old) <= len(layout):
+            return stats
+
+        if len(layout) > worksheet.row_count:
+            worksheet.add_rows(len(layout) - worksheet.row_count)
+        if width > worksheet.col_count:
+            worksheet.add_cols(width - worksheet.col_count)
+
+        # one range per run of consecutive changed rows
+        data = []
+        start = 0
+        while start < len(changed):
+            end = start
+            while end + 1 < len(changed) and changed[end + 1] == changed[end] + 1:
+                end += 1
+            first, last = changed[start] + 1, changed[end] + 1
+            data.append({
+                'range': f'A{first}:{column_letter(width)}{last}',
+                # None would leave the old cell value in place
+                'values': [
+                    ['' if value is None else value for value in row] + [''] * (width - len(row))
+                    for row in layout[changed[start]:changed[end] + 1]
+                ],
+            })
+            start = end + 1
+        if data:
+            worksheet.batch_update(data, value_input_option='RAW')
+
+        if len(old) > len(layout):
+            worksheet.batch_clear([f'A{len(layout) + 1}:{column_letter(width)}{len(old)}'])
+        return stats
+
+    def close(self) -> None:
+        pass
+
+
+class CsvSink:
+    """Writes csv/DnD entities data - <name>.csv like a csv export of the Google sheet."""
+
+    def __init__(self, directory: str = CSV_OUTPUT_DIR, file_prefix: str = CSV_FILE_PREFIX):
+        self.directory = directory
+        self.file_prefix = file_prefix
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f'{self.file_prefix}{name}.csv')
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerows([sheet_value(value) for value in row] for row in rows)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteSink:
+    """Recreates one table per parse result and bulk loads it in a single transaction."""
+
+    def __init__(self, path: str = SQLITE_OUTPUT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # parse jobs run in parallel but share the connection
+        self._lock = threading.Lock()
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        rows = iter(rows)
+        headers = next(rows)
+        table = table_name(name)
+        columns = ', '.join(f'"{header}"' for header in headers)
+        placeholders = ', '.join('?' * len(headers))
+        with self._lock, self.connection:
+            self.connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self.connection.execute(f'CREATE TABLE "{table}" ({columns})')
+            self.connection.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ParquetSink:
+    """Writes <directory>/<table_name>.parquet, requires pyarrow."""
+
+    def __init__(self, directory: str = PARQUET_OUTPUT_DIR):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('ParquetSink requires pyarrow, install it with `pip install pyarrow`')
+        self.directory = directory
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        import pyarrow.parquet
+        from column_table import ColumnTable
+
+        # pyarrow needs one type per column, the parsers mix e.g. ints and '' in the same column (see arrow_values)
+        table = (rows if isinstance(rows, ColumnTable) else ColumnTable.from_rows(rows)).to_arrow()
+
+        os.makedirs(self.directory, exist_ok=True)
+        pyarrow.parquet.write_table(table, os.path.join(self.directory, f'{table_name(name)}.parquet'))
+
+    def close(self) -> None:
+        pass
+
+
+class SqlSink:
+    """Writes <directory>/<table_name>.sql with batched INSERT statements (or a COPY block)."""
+
+    def __init__(self, directory: str = SQL_OUTPUT_DIR, dataset: str = SQL_DATASET,
+                 batch_size: int = SQL_BATCH_SIZE, copy: bool = False):
+        self.directory = directory
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.copy = copy
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        from sql_export import write_sql, BUFFER_SIZE
+
+        rows = iter(rows)
+        headers = next(rows)
+        table = table_name(name)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f'{table}.sql'), 'w', buffering=BUFFER_SIZE) as output:
+            write_sql(output, table, headers, rows, dataset=self.dataset, batch_size=self.batch_size, copy=self.copy)
+
+    def close(self) -> None:
+        pass
+
+
+class SnapshotSink:
+    """Collects the tables and writes them as one read-only snapshot file on close (see snapshot.py).
+
+    Tables not written in this run are carried over from the previous snapshot, readers that still map the
+    previous file keep reading it until they reopen.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.tables: Dict[str, Tuple[List[str], Iterable[Row]]] = {}
+        self._lock = threading.Lock()
+
+    def write(self, name: str, rows: Iterable[Row]) -> None:
+        from column_table import ColumnTable
+
+        table = rows if isinstance(rows, ColumnTable) else ColumnTable.from_rows(rows)
+        with self._lock:
+            self.tables[name] = (table.headers, table.rows())
+
+    def close(self) -> None:
+        from snapshot import Snapshot, write_snapshot
+
+        if not self.tables:
+            return
+        tables, generation = {}, 1
+        if os.path.exists(self.path):
+            with Snapshot(self.path) as previous:
+                generation = previous.generation + 1
+                for name, table in previous.tables.items():
+                    if name not in self.tables:
+                        tables[name] = (table.headers, list(table))
+        tables.update(self.tables)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        write_snapshot(self.path, tables, generation)
+
+
+SINK_TYPES = {
+    'gsheet': GsheetSink,
+    'csv': CsvSink,
+    'sqlite': SqliteSink,
+    'parquet': ParquetSink,
+    'sql': SqlSink,
+    'snapshot': SnapshotSink,
+}
+
+
+def build_sinks(names: Optional[str] = SINKS) -> List:
+    sinks = []
+    for name in filter(None, (name.strip() for name in (names or '').split(','))):
+        if name not in SINK_TYPES:
+            raise ValueError(f'unknown sink {name}, expected one of: {", ".join(SINK_TYPES)}')
+        sinks.append(SINK_TYPES[name]())
+    return sinks
@@ -0,0 +1,285 @@
+"""Read-only binary snapshot of the parsed tables, meant to be memory mapped by many processes at once.
+
+Layout (little endian, every section 8 byte aligned):
+
+    header      magic 'DNDSNAP\\0', format version (u32), flags (u32), directory offset (u64), directory length (u64)
+    strings     utf-8 bytes of every distinct string, then (count + 1) u64 offsets into them
+    columns     one fixed width array per column: int64 'q', float64 'd', bool 'b' (u8) or string id 's' (u32),
+                'n' is float64 for columns mixing ints and floats (like equipment weights), integral values read as int
+    key indexes per table, u32 row numbers ordered by the key column's utf-8 bytes
+    directory   json: tables with their headers, column types and offsets, key column, generation
+
+Nulls are int64 min, NaN, 255 and 0xFFFFFFFF. Like the parquet sink, '' counts as null in numeric and bool columns.
+Readers never copy a column: values are decoded from the mapping when a row or cell is accessed.
+"""
+import contextlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from config import SNAPSHOT_PATH, GSHEET_KEY_COLUMNS
+from sinks import sheet_value
+
+MAGIC = b'DNDSNAP\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+
+INT_NULL = -2 ** 63
+BOOL_NULL = 255
+STRING_NULL = 0xFFFFFFFF
+# column type -> array type code of its values
+TYPE_CODES = {'q': 'q', 'd': 'd', 'n': 'd', 'b': 'B', 's': 'I'}
+
+
+def _column_type(values: List) -> str:
+    types = {type(value) for value in values if value is not None and value != ''}
+    if types == {bool}:
+        return 'b'
+    if types == {int} and all(INT_NULL < value < 2 ** 63 for value in values if type(value) is int):
+        return 'q'
+    if types == {float}:
+        return 'd'
+    if types == {int, float}:
+        return 'n'
+    return 's'
+
+
+def _string_value(value) -> Optional[str]:
+    # mixed columns are stored the way the csv and gsheet sinks render them
+    return value if value is None or isinstance(value, str) else sheet_value(value)
+
+
+def _encode_column(values: List, column_type: str, strings: Dict[str, int]) -> array:
+    if column_type == 'q':
+        return array('q', [INT_NULL if value is None or value == '' else value for value in values])
+    if column_type in ('d', 'n'):
+        return array('d', [math.nan if value is None or value == '' else float(value) for value in values])
+    if column_type == 'b':
+        return array('B', [BOOL_NULL if value is None or value == '' else int(value) for value in values])
+    encoded = array('I')
+    for value in values:
+        value = _string_value(value)
+        encoded.append(STRING_NULL if value is None else strings.setdefault(value, len(strings)))
+    return encoded
+
+
+def _key_bytes(value) -> bytes:
+    # rows with a null key are indexed (and found) under b''
+    return b'' if value is None else _string_value(value).encode('utf-8')
+
+
+def _key_column(name: str, headers: List[str]) -> int:
+    key_columns = GSHEET_KEY_COLUMNS.get(name) or headers[:1]
+    return headers.index(key_columns[0]) if key_columns and key_columns[0] in headers else 0
+
+
+def write_snapshot(path: str, tables: Dict[str, Tuple[Sequence[str], Iterable[Sequence]]],
+                   generation: int = 1) -> None:
+    """Writes ``{name: (headers, rows)}`` to ``path`` (through a temporary file, readers keep the old one)."""
+    strings: Dict[str, int] = {}
+    encoded_tables = {}
+    for name, (headers, rows) in tables.items():
+        headers = list(headers)
+        columns = [list(column) for column in zip(*rows)] or [[] for _ in headers]
+        types = [_column_type(column) for column in columns]
+        encoded = [_encode_column(column, column_type, strings) for column, column_type in zip(columns, types)]
+
+        key = _key_column(name, headers)
+        key_values = [_key_bytes(value) for value in columns[key]] if columns else []
+        key_index = array('I', sorted(range(len(key_values)), key=key_values.__getitem__))
+        encoded_tables[name] = (headers, types, encoded, key, key_index, len(columns[0]) if columns else 0)
+
+    # a temporary file of its own, concurrent writers would clobber a shared one
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(b'\0' * HEADER.size)
+
+            def section(data: bytes) -> int:
+                padding = -output.tell() % 8
+                output.write(b'\0' * padding)
+                offset = output.tell()
+                output.write(data)
+                return offset
+
+            pool = [value.encode('utf-8') for value in strings]
+            string_offsets = array('Q', [0])
+            for encoded_string in pool:
+                string_offsets.append(string_offsets[-1] + len(encoded_string))
+            directory = {
+                'generation': generation,
+                'created_at': time.time(),
+                'strings': {'count': len(pool), 'data': section(b''.join(pool)), 'offsets': section(string_offsets.tobytes())},
+                'tables': {},
+            }
+            for name, (headers, types, encoded, key, key_index, row_count) in encoded_tables.items():
+                directory['tables'][name] = {
+                    'rows': row_count,
+                    'headers': headers,
+                    'types': types,
+                    'offsets': [section(column.tobytes()) for column in encoded],
+                    'key_column': key,
+                    'key_index': section(key_index.tobytes()),
+                }
+
+            directory_bytes = json.dumps(directory).encode('utf-8')
+            directory_offset = section(directory_bytes)
+            output.seek(0)
+            output.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, directory_offset, len(directory_bytes)))
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+class SnapshotTable:
+    def __init__(self, snapshot: 'Snapshot', name: str, meta: Dict):
+        self.snapshot = snapshot
+        self.name = name
+        self.headers: List[str] = meta['headers']
+        self.types: List[str] = meta['types']
+        self._rows: int = meta['rows']
+        self._columns = [
+            snapshot._view(offset, self._rows, TYPE_CODES[column_type])
+            for offset, column_type in zip(meta['offsets'], self.types)
+        ]
+        self._key_column = meta['key_column']
+        self._key_index = snapshot._view(meta['key_index'], self._rows, 'I')
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _value(self, column: int, row: int):
+        value = self._columns[column][row]
+        column_type = self.types[column]
+        if column_type == 's':
+            return None if value == STRING_NULL else self.snapshot.string(value)
+        if column_type == 'q':
+            return None if value == INT_NULL else value
+        if column_type == 'd':
+            return None if math.isnan(value) else value
+        if column_type == 'n':
+            return None if math.isnan(value) else int(value) if value.is_integer() else value
+        return None if value == BOOL_NULL else bool(value)
+
+    def cell(self, row: int, header: str):
+        return self._value(self.headers.index(header), row)
+
+    def row(self, row: int) -> List:
+        if not 0 <= row < self._rows:
+            raise IndexError(f'{self.name} has {self._rows} rows')
+        return [self._value(column, row) for column in range(len(self.headers))]
+
+    def row_dict(self, row: int) -> Dict:
+        return dict(zip(self.headers, self.row(row)))
+
+    def __iter__(self) -> Iterator[List]:
+        for row in range(self._rows):
+            yield self.row(row)
+
+    def rows(self) -> Iterator[List]:
+        """Headers first, like the tables handed to the sinks."""
+        yield list(self.headers)
+        yield from self
+
+    def _key_bytes(self, position: int) -> bytes:
+        row = self._key_index[position]
+        if self.types[self._key_column] == 's':
+            string_id = self._columns[self._key_column][row]
+            return b'' if string_id == STRING_NULL else self.snapshot.string_bytes(string_id)
+        return _key_bytes(self._value(self._key_column, row))
+
+    def find(self, key) -> List[int]:
+        """Row numbers whose key column (the sheet's first key column) equals ``key``, by binary search."""
+        target = _key_bytes(key)
+        low, high = 0, self._rows
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self._rows and self._key_bytes(low) == target:
+            found.append(self._key_index[low])
+            low += 1
+        return sorted(found)
+
+    def get(self, key) -> List[Dict]:
+        return [self.row_dict(row) for row in self.find(key)]
+
+
+class Snapshot:
+    """Memory maps a snapshot file read-only, tables are opened without reading their columns."""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        self._views = [self._buffer]
+
+        magic, version, _, directory_offset, directory_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a snapshot')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{path} is a version {version} snapshot, expected {FORMAT_VERSION}')
+        self.directory = json.loads(bytes(self._buffer[directory_offset:directory_offset + directory_length]))
+        self.generation: int = self.directory['generation']
+
+        strings = self.directory['strings']
+        self._string_data = strings['data']
+        self._string_offsets = self._view(strings['offsets'], strings['count'] + 1, 'Q')
+        self.tables = {name: SnapshotTable(self, name, meta) for name, meta in self.directory['tables'].items()}
+
+    def _view(self, offset: int, count: int, type_code: str) -> memoryview:
+        view = self._buffer[offset:offset + count * array(type_code).itemsize].cast(type_code)
+        self._views.append(view)
+        return view
+
+    def string_bytes(self, string_id: int) -> bytes:
+        start = self._string_data + self._string_offsets[string_id]
+        return self._mmap[start:self._string_data + self._string_offsets[string_id + 1]]
+
+    def string(self, string_id: int) -> str:
+        return self.string_bytes(string_id).decode('utf-8')
+
+    def table(self, name: str) -> SnapshotTable:
+        return self.tables[name]
+
+    def __getitem__(self, name: str) -> SnapshotTable:
+        return self.tables[name]
+
+    def close(self) -> None:
+        # exported views have to be released before the mapping can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self.tables.clear()
+        self._mmap.close()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python snapshot.py [path] [table] [key]
+    with Snapshot(*sys.argv[1:2]) as opened:
+        if len(sys.argv) < 3:
+            for table_name, table in opened.tables.items():
+                print(f'{table_name}: {len(table)} rows, {len(table.headers)} columns')
+        else:
+            for found in opened.table(sys.argv[2]).get(sys.argv[3]) if len(sys.argv) > 3 else opened.table(sys.argv[2]):
+                print(found)
@@ -0,0 +1,110 @@
+import csv
+import os
+import sys
+from itertools import islice
+from typing import Iterable, Sequence, TextIO
+
+from config import CSV_OUTPUT_DIR, CSV_FILE_PREFIX, SQL_OUTPUT_DIR, SQL_DATASET, SQL_BATCH_SIZE
+from sinks import table_name
+
+# big write buffer, the output is produced in many small pieces
+BUFFER_SIZE = 1 << 20
+
+
+def sql_literal(value) -> str:
+    """Renders a value for an INSERT statement.
+
+    Strings follow the csv conventions: empty is null, TRUE/FALSE and digits are kept as is.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    value = str(value)
+    if value == '':
+        return 'null'
+    if value in ('TRUE', 'FALSE') or value.isdigit():
+        return value
+    return "'" + value.replace("'", "''") + "'"
+
+
+def copy_literal(value) -> str:
+    """Renders a value in PostgreSQL COPY text format."""
+    if value is None or value == '':
+        return '\\N'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def write_sql(output: TextIO, table: str, headers: Sequence[str], rows: Iterable[Sequence],
+              dataset: str = SQL_DATASET, batch_size: int = SQL_BATCH_SIZE, copy: bool = False) -> int:
+    """Streams ``rows`` to ``output`` as multi-row INSERT batches or as one ``COPY ... FROM STDIN`` block.
+
+    Only one batch is held in memory at a time. Returns the number of rows written.
+    """
+    columns = ', '.join(headers)
+    written = 0
+
+    if copy:
+        print(f'COPY {dataset}.{table} ({columns}) FROM STDIN;', file=output)
+        for row in rows:
+            output.write('\t'.join(copy_literal(value) for value in row))
+            output.write('\n')
+            written += 1
+        print('\\.', file=output)
+        return written
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, max(1, batch_size)))
+        if not batch:
+            return written
+        print(f'INSERT INTO {dataset}.{table} ({columns}) \nVALUES', file=output)
+        output.write(',\n'.join(f'({", ".join(sql_literal(value) for value in row)})' for row in batch))
+        output.write(';\n')
+        written += len(batch)
+
+
+def export_csv(path_to_csv: str, table: str, output_path: str = 'output.sql', dataset: str = SQL_DATASET,
+               batch_size: int = SQL_BATCH_SIZE, copy: bool = False) -> int:
+    with open(path_to_csv, newline='') as csv_file, open(output_path, 'w', buffering=BUFFER_SIZE) as output:
+        csv_reader = csv.reader(csv_file)
+        headers = next(csv_reader)
+        return write_sql(output, table, headers, csv_reader, dataset=dataset, batch_size=batch_size, copy=copy)
+
+
+def export_csv_dir(directory: str = CSV_OUTPUT_DIR, output_dir: str = SQL_OUTPUT_DIR, dataset: str = SQL_DATASET,
+                   batch_size: int = SQL_BATCH_SIZE, copy: bool = False) -> dict:
+    """Exports every csv file of ``directory`` to ``<output_dir>/<table>.sql``, returns rows written per table."""
+    os.makedirs(output_dir, exist_ok=True)
+    exported = {}
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.csv'):
+            continue
+        name = file_name[:-len('.csv')]
+        if name.startswith(CSV_FILE_PREFIX):
+            name = name[len(CSV_FILE_PREFIX):]
+        table = table_name(name)
+        exported[table] = export_csv(
+            os.path.join(directory, file_name), table, os.path.join(output_dir, f'{table}.sql'),
+            dataset=dataset, batch_size=batch_size, copy=copy,
+        )
+    return exported
+
+
+if __name__ == '__main__':
+    # python sql_export.py [csv dir] [output dir] [--copy]
+    args = [arg for arg in sys.argv[1:] if arg != '--copy']
+    for exported_table, count in export_csv_dir(
+            *args[:2], copy='--copy' in sys.argv[1:]
+    ).items():
+        print(f'{exported_table}: {count} rows')
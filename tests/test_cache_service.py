@@ -0,0 +1,125 @@
+import json
+import time
+
+import pytest
+
+from cache_service import CacheEntry, CachePolicy, FileCache, SqliteCache, content_hash
+from journal import RunJournal
+from parser import Parser
+from transport import build_response
+
+SPELL = {'index': 'fireball', 'name': 'Fireball', 'level': 3}
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def backend(request, tmp_path):
+    backend = FileCache(str(tmp_path / 'json_dumps')) if request.param == 'files' \
+        else SqliteCache(str(tmp_path / 'cache.sqlite'))
+    yield backend
+    backend.close()
+
+
+def test_backend_round_trip(backend):
+    backend.put_entries('spells', {'fireball': CacheEntry(SPELL, 100.0, '"v1"', 'Mon', 'hash')})
+    entry = backend.get_entries('spells')['fireball']
+    assert entry == CacheEntry(SPELL, 100.0, '"v1"', 'Mon', 'hash')
+    assert backend.keys('spells') == ['fireball']
+    assert backend.folders() == ['spells']
+    backend.put_meta('spells', {'fireball': CacheEntry(SPELL, 200.0, '"v2"')})
+    assert backend.get_entries('spells', ['fireball', 'missing'])['fireball'].etag == '"v2"'
+
+
+
+def test_truncated_meta_file_is_treated_as_empty(tmp_path):
+    FileCache(str(tmp_path)).put_entries('spells', {'fireball': CacheEntry(SPELL, 100.0, '"v1"')})
+    meta_path = FileCache(str(tmp_path))._meta_path('spells')
+    with open(meta_path, 'w') as meta_file:
+        meta_file.write('{"fireball": {"fetched_at": 10')
+    cache = FileCache(str(tmp_path))
+    entry = cache.get_entries('spells')['fireball']
+    assert entry.data == SPELL and entry.etag is None
+    cache.put_meta('spells', {'fireball': CacheEntry(SPELL, 200.0, '"v2"')})
+    with open(meta_path) as meta_file:
+        assert json.load(meta_file)['fireball']['etag'] == '"v2"'
+
+
+def test_ttl(backend):
+    policy = CachePolicy(backend, ttls={'spells': 60}, default_ttl=None, memory_size=0)
+    now = time.time()
+    backend.put_entries('spells', {'fresh': CacheEntry(SPELL, now - 10), 'old': CacheEntry(SPELL, now - 120)})
+    backend.put_entries('skills', {'old': CacheEntry(SPELL, now - 10 ** 6)})
+    fresh, stale = policy.lookup('spells', ['fresh', 'old', 'missing'])
+    assert list(fresh) == ['fresh'] and list(stale) == ['old']
+    # no TTL for the folder and no default: cached entries never expire
+    assert list(policy.lookup('skills', ['old'])[0]) == ['old']
+    assert not CachePolicy(backend, ttls={}, default_ttl=60).is_fresh('skills', CacheEntry(SPELL, now - 120))
+
+
+def test_update_only_rewrites_changed_entities(backend):
+    policy = CachePolicy(backend, ttls={}, default_ttl=60, memory_size=0)
+    old = CacheEntry(SPELL, time.time() - 120, '"v1"', hash=content_hash(SPELL))
+    backend.put_entries('spells', {'fireball': old, 'wish': old})
+    changed = dict(SPELL, level=4)
+    stored = policy.update('spells', {
+        # 304 Not Modified
+        'fireball': None,
+        'wish': CacheEntry(changed, etag='"v2"'),
+    }, {'fireball': old, 'wish': old})
+    assert stored['fireball'].data == SPELL and stored['fireball'].etag == '"v1"'
+    assert stored['fireball'].fetched_at > old.fetched_at
+    entries = backend.get_entries('spells')
+    assert entries['wish'].data == changed and entries['wish'].hash == content_hash(changed)
+    assert policy.is_fresh('spells', entries['fireball'])
+
+
+def test_memory_tier(backend):
+    policy = CachePolicy(backend, ttls={}, default_ttl=None, memory_size=10)
+    policy.put_many('spells', {'fireball': SPELL})
+    backend.put_entries('spells', {'fireball': CacheEntry(dict(SPELL, level=9))})
+    # served from memory, not the backend
+    assert policy.get_many('spells', ['fireball']) == {'fireball': SPELL}
+
+
+def test_conditional_headers():
+    assert CachePolicy.conditional_headers(None) == {}
+    assert CachePolicy.conditional_headers(CacheEntry(SPELL, etag='"v1"', last_modified='Mon')) == {
+        'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon',
+    }
+
+
+class EtagTransport:
+    """Serves SPELL with an ETag and answers 304 when the request already has it."""
+
+    def __init__(self, etag='"v1"'):
+        self.etag = etag
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        headers = kwargs.get('headers') or {}
+        self.requests.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            return build_response({'status': 304, 'body': ''}, url)
+        return build_response({'status': 200, 'headers': {'ETag': self.etag}, 'body': json.dumps(SPELL)}, url)
+
+    def close(self):
+        pass
+
+
+def test_parser_revalidates_expired_entries(tmp_path, backend):
+    transport = EtagTransport()
+
+    def get():
+        parser = Parser(cache=backend, sinks=[], transport=transport, max_workers=1,
+                        journal=RunJournal(str(tmp_path / 'journal.jsonl')))
+        parser.cache.ttls = {'spells': 60}
+        return parser._get_items(['fireball'], 'spells', 'spells/')
+
+    assert get() == [SPELL]
+    assert backend.get_entries('spells')['fireball'].etag == '"v1"'
+    # fresh: no request
+    assert get() == [SPELL] and len(transport.requests) == 1
+
+    backend.put_meta('spells', {'fireball': CacheEntry(SPELL, time.time() - 120, '"v1"')})
+    assert get() == [SPELL]
+    assert transport.requests[-1]['If-None-Match'] == '"v1"'
+    assert time.time() - backend.get_entries('spells')['fireball'].fetched_at < 60
@@ -0,0 +1,82 @@
+import pytest
+
+from column_table import ColumnTable, DictionaryColumn, TypedColumn, TYPED_COLUMN_THRESHOLD, EXTEND_CHUNK
+
+HEADERS = ['index', 'level', 'weight', 'ritual']
+
+
+def sample_rows(count):
+    return [
+        [f'spell-{row % 7}', row % 10, [1, 1.0, 2.5, None, ''][row % 5], [True, False, 1, 0][row % 4]]
+        for row in range(count)
+    ]
+
+
+def appended(rows):
+    table = ColumnTable(HEADERS)
+    for row in rows:
+        table.append(row)
+    return table
+
+
+def test_round_trip_keeps_values_and_types():
+    rows = sample_rows(50)
+    table = appended(rows)
+    assert len(table) == 50
+    assert list(table) == [HEADERS] + rows
+    # 1, 1.0 and True are equal but come back as they went in
+    assert [[type(value) for value in row] for row in table.rows()] == [[type(value) for value in row] for row in rows]
+
+
+@pytest.mark.parametrize('count', [0, 1, EXTEND_CHUNK, EXTEND_CHUNK + 1, 3 * EXTEND_CHUNK + 5])
+def test_extend_matches_append(count):
+    rows = sample_rows(count)
+    extended = ColumnTable.from_rows([HEADERS] + rows)
+    assert list(extended) == list(appended(rows)) == [HEADERS] + rows
+
+
+def test_row_length_is_checked():
+    table = ColumnTable(HEADERS)
+    with pytest.raises(ValueError):
+        table.append(['fireball', 3])
+    with pytest.raises(ValueError):
+        table.extend([['fireball', 3]])
+
+
+def test_many_distinct_ints_become_a_typed_column():
+    rows = [[str(row), row, row * 0.5, ''] for row in range(TYPED_COLUMN_THRESHOLD + 10)]
+    rows += [['empty', '', None, None], ['none', None, 'n/a', None]]
+    for table in (appended(rows), ColumnTable.from_rows([HEADERS] + rows)):
+        assert type(table.columns[0]) is DictionaryColumn
+        assert type(table.columns[1]) is TypedColumn and type(table.columns[2]) is TypedColumn
+        assert list(table.rows()) == rows
+
+
+def test_dictionary_codes_widen_past_256_values():
+    values = [f'value-{row}' for row in range(70000)]
+    table = ColumnTable.from_rows([['name']] + [[value] for value in values])
+    assert table.columns[0].codes.typecode == 'I'
+    assert table.column('name') == values
+
+
+def test_negative_rows():
+    rows = [[str(row), row, float(row), None] for row in range(TYPED_COLUMN_THRESHOLD + 1)] + [['last', '', None, True]]
+    table = ColumnTable.from_rows([HEADERS] + rows)
+    assert type(table.columns[1]) is TypedColumn
+    assert table.row(-1) == table.row(len(table) - 1) == rows[-1]
+    assert table.row(-len(table)) == rows[0]
+    with pytest.raises(IndexError):
+        table.row(len(table))
+    with pytest.raises(IndexError):
+        table.row(-len(table) - 1)
+
+
+def test_to_arrow():
+    pyarrow = pytest.importorskip('pyarrow')
+    rows = sample_rows(20)
+    table = ColumnTable.from_rows([HEADERS] + rows)
+    arrow_table = table.to_arrow()
+    assert arrow_table.column_names == HEADERS
+    assert arrow_table.column('index').to_pylist() == [row[0] for row in rows]
+    assert arrow_table.column('level').to_pylist() == [row[1] for row in rows]
+    assert pyarrow.types.is_dictionary(table.to_arrow(dictionary=True).column('index').type)
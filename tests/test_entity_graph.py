@@ -0,0 +1,96 @@
+from cache_service import CacheEntry, FileCache, partial_folder
+from entity_graph import EntityGraph
+
+
+def ref(index):
+    return {'index': index, 'name': index.title(), 'url': f'/api/x/{index}'}
+
+
+ENTITIES = {
+    'spells': {
+        'fireball': {'index': 'fireball', 'classes': [ref('wizard'), ref('sorcerer')], 'subclasses': [ref('lore')]},
+        'shield': {'index': 'shield', 'classes': [ref('wizard'), ref('wizard')]},
+    },
+    'subclasses': {
+        'lore': {'index': 'lore', 'class': ref('bard'),
+                 'spells': [{'spell': ref('shield')}, {'spell': ref('fireball')}]},
+    },
+    'races': {
+        'elf': {'index': 'elf', 'traits': [ref('darkvision')], 'subraces': [ref('high-elf')],
+                'starting_proficiencies': [ref('perception')]},
+        'dwarf': {'index': 'dwarf', 'traits': [ref('darkvision')]},
+    },
+    'subraces': {
+        'high-elf': {'index': 'high-elf', 'race': ref('elf'), 'racial_traits': [ref('cantrip')],
+                     'starting_proficiencies': [ref('longswords')]},
+    },
+    'traits': {
+        'darkvision': {'index': 'darkvision', 'races': [ref('elf'), ref('half-orc')], 'subraces': []},
+        'cantrip': {'index': 'cantrip', 'subraces': [ref('high-elf')]},
+        'keen-senses': {'index': 'keen-senses', 'subraces': [ref('high-elf')], 'proficiencies': [ref('perception')]},
+    },
+    'proficiencies': {
+        'perception': {'index': 'perception', 'races': [ref('half-orc')], 'classes': []},
+        'longswords': {'index': 'longswords', 'races': [ref('elf')]},
+    },
+    'magic_items': {
+        'armor': {'index': 'armor', 'variants': [ref('armor-1'), ref('armor-2')]},
+        'armor-1': {'index': 'armor-1', 'variants': []},
+    },
+}
+
+
+def test_forward_and_reverse_indexes():
+    graph = EntityGraph(ENTITIES)
+    # duplicates are dropped, order is kept
+    assert graph.linked('spells', 'shield', 'classes') == ('wizard',)
+    assert graph.linked('spells', 'fireball', 'classes') == ('wizard', 'sorcerer')
+    assert graph.linked('subclasses', 'lore', 'spells.spell') == ('shield', 'fireball')
+    assert graph.linked('spells', 'missing', 'classes') == ()
+    assert graph.linked('spells', 'fireball', 'unknown') == ()
+
+    assert graph.referencing('spells', 'classes', 'wizard') == ('fireball', 'shield')
+    assert graph.referencing('subclasses', 'class', 'bard') == ('lore',)
+    assert graph.referencing('spells', 'classes', 'cleric') == ()
+    assert graph.spells_of_class('sorcerer') == ['fireball']
+
+
+def test_linked_entities_skips_uncached_targets():
+    graph = EntityGraph(ENTITIES)
+    assert [trait['index'] for trait in graph.linked_entities('races', 'elf', 'traits')] == ['darkvision']
+    assert [item['index'] for item in graph.linked_entities('magic_items', 'armor', 'variants')] == ['armor-1']
+
+
+def test_union_queries():
+    graph = EntityGraph(ENTITIES)
+    # listed by the subrace first, then by the traits naming it
+    assert graph.traits_of_subrace('high-elf') == ['cantrip', 'keen-senses']
+    assert graph.traits_of_race('elf') == ['darkvision']
+    assert graph.traits_of_race('half-orc') == ['darkvision']
+    assert graph.races_with_proficiency('perception') == ['half-orc', 'elf']
+    assert graph.races_with_proficiency('longswords') == ['elf', 'high-elf']
+    assert graph.spells_of_subclass('lore') == ['shield', 'fireball']
+    assert graph.traits_of_subrace('hill-dwarf') == []
+
+
+def test_magic_item_variants():
+    graph = EntityGraph(ENTITIES)
+    assert graph.variants_of('armor') == ['armor-1', 'armor-2']
+    assert graph.parent_of('armor-2') == 'armor'
+    assert graph.parent_of('armor') is None
+
+
+def test_custom_references():
+    graph = EntityGraph(ENTITIES, references=[('races', ('subraces',), 'subraces')])
+    assert graph.linked('races', 'elf', 'subraces') == ('high-elf',)
+    assert graph.linked('spells', 'fireball', 'classes') == ()
+
+
+def test_from_cache_skips_lists_and_partial_folders(tmp_path):
+    cache = FileCache(str(tmp_path))
+    cache.put_entries('spells', {'shield': CacheEntry(ENTITIES['spells']['shield'])})
+    cache.put_entries('lists', {'spells': CacheEntry({'count': 1, 'results': [ref('shield')]})})
+    cache.put_entries(partial_folder('spells'), {'fireball': CacheEntry(ENTITIES['spells']['fireball'])})
+    graph = EntityGraph.from_cache(cache)
+    assert set(graph.entities) == {'spells'}
+    assert graph.spells_of_class('wizard') == ['shield']
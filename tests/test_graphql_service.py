@@ -0,0 +1,72 @@
+import json
+
+from cache_service import FileCache
+from graphql_service import to_rest_shape
+from journal import RunJournal
+from parser import Parser
+from transport import ReplayTransport, request_key
+
+API_URL = 'https://www.dnd5eapi.co/api/'
+FULL_SPELL = {'index': 'fireball', 'name': 'Fireball', 'level': 3, 'desc': ['Boom.'], 'material': 'Bat guano.'}
+PARTIAL_SPELL = {'index': 'fireball', 'name': 'Fireball', 'level': 3, 'desc': ['Boom.'], 'material': None}
+
+
+class GraphqlTransport(ReplayTransport):
+    """Answers every POST with one page of PARTIAL_SPELL, GET requests are replayed."""
+
+    def __init__(self, entries=None):
+        super().__init__(latency=0, entries=entries or {})
+        self.queries = 0
+
+    def request(self, method, url, **kwargs):
+        if method != 'POST':
+            return super().request(method, url, **kwargs)
+        self.queries += 1
+        entry = {'status': 200, 'body': json.dumps({'data': {'spells': [PARTIAL_SPELL]}})}
+        return ReplayTransport(latency=0, entries={request_key(method, url, None, kwargs['json']): entry}).request(
+            method, url, **kwargs
+        )
+
+
+def parser(tmp_path, cache, fetch_backend, transport):
+    return Parser(cache=cache, sinks=[], fetch_backend=fetch_backend, transport=transport, max_workers=1,
+                  journal=RunJournal(str(tmp_path / 'journal.jsonl')))
+
+
+def test_to_rest_shape():
+    shaped = to_rest_shape({'a': None, 'damage': {'damage_at_slot_level': [{'level': 3, 'damage': '8d6'}]}})
+    assert shaped == {'damage': {'damage_at_slot_level': {'3': '8d6'}}}
+
+
+def test_partial_entities_are_cached_apart(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    transport = GraphqlTransport()
+    assert parser(tmp_path, cache, 'graphql', transport)._get_items(['fireball'], 'spells', 'spells/') \
+        == [to_rest_shape(PARTIAL_SPELL)]
+    assert transport.queries == 1
+    assert cache.keys('spells') == []
+    assert cache.keys('spells_graphql') == ['fireball']
+
+    # a second graphql run uses the cached partial entity
+    assert parser(tmp_path, cache, 'graphql', GraphqlTransport())._get_items(['fireball'], 'spells', 'spells/') \
+        == [to_rest_shape(PARTIAL_SPELL)]
+
+    # REST consumers never see it and fetch the full entity
+    rest_transport = ReplayTransport(latency=0, entries={
+        request_key('GET', API_URL + 'spells/fireball'): {'status': 200, 'body': json.dumps(FULL_SPELL)},
+    })
+    assert parser(tmp_path, cache, 'rest', rest_transport)._get_items(['fireball'], 'spells', 'spells/') \
+        == [FULL_SPELL]
+    assert cache.get_entries('spells')['fireball'].data == FULL_SPELL
+
+
+def test_full_entities_serve_the_graphql_backend(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    rest_transport = ReplayTransport(latency=0, entries={
+        request_key('GET', API_URL + 'spells/fireball'): {'status': 200, 'body': json.dumps(FULL_SPELL)},
+    })
+    parser(tmp_path, cache, 'rest', rest_transport)._get_items(['fireball'], 'spells', 'spells/')
+    transport = GraphqlTransport()
+    assert parser(tmp_path, cache, 'graphql', transport)._get_items(['fireball'], 'spells', 'spells/') \
+        == [FULL_SPELL]
+    assert transport.queries == 0
@@ -0,0 +1,86 @@
+import json
+import time
+
+from cache_service import CacheEntry, FileCache
+from journal import RunJournal
+from parser import Parser
+
+
+def interrupted_run(path):
+    journal = RunJournal(path)
+    journal.start()
+    journal.job_done('parse_skills')
+    journal.items_done('spells', ['fireball', 'wish'])
+    journal.items_done('spells', [])
+    journal.close()
+    # a record cut short by a crash
+    with open(path, 'a') as journal_file:
+        journal_file.write('{"event": "items", "folder": "spells", "it')
+
+
+def test_resume_reads_the_interrupted_run(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted_run(path)
+    journal = RunJournal(path)
+    journal.start(resume=True)
+    assert journal.completed_jobs == {'parse_skills'}
+    assert journal.item_done('spells', 'fireball') and not journal.item_done('spells', 'acid-arrow')
+    assert not journal.item_done('skills', 'fireball')
+    journal.close()
+    with open(path) as journal_file:
+        events = [json.loads(line)['event'] for line in journal_file if line.endswith('}\n')]
+    assert events == ['start', 'job', 'items', 'resume']
+
+
+def test_without_resume_the_journal_starts_over(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted_run(path)
+    journal = RunJournal(path)
+    journal.start()
+    assert not journal.completed_jobs and not journal.completed_items
+    journal.close()
+    with open(path) as journal_file:
+        assert [json.loads(line)['event'] for line in journal_file] == ['start']
+
+
+def test_a_finished_run_is_not_resumed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path)
+    journal.start()
+    journal.job_done('parse_skills')
+    journal.finish()
+    assert not journal.active
+    journal = RunJournal(path)
+    journal.start(resume=True)
+    assert not journal.completed_jobs
+    journal.close()
+
+
+def test_nothing_is_written_before_start(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = RunJournal(str(path))
+    journal.job_done('parse_skills')
+    journal.items_done('spells', ['fireball'])
+    assert not path.exists()
+
+
+class FailingTransport:
+    def request(self, method, url, **kwargs):
+        raise AssertionError(f'unexpected request {url}')
+
+    def close(self):
+        pass
+
+
+def test_resumed_run_does_not_revalidate_fetched_items(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted_run(path)
+    cache = FileCache(str(tmp_path / 'json_dumps'))
+    spell = {'index': 'fireball', 'name': 'Fireball'}
+    cache.put_entries('spells', {'fireball': CacheEntry(spell, time.time() - 10 ** 6, '"v1"')})
+    journal = RunJournal(path)
+    parser = Parser(cache=cache, sinks=[], transport=FailingTransport(), max_workers=1, journal=journal)
+    parser.cache.ttls = {'spells': 60}
+    journal.start(resume=True)
+    assert parser._get_items(['fireball'], 'spells', 'spells/') == [spell]
+    journal.close()
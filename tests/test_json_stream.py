@@ -0,0 +1,52 @@
+import io
+import json
+
+import pytest
+
+from json_stream import iter_object_items
+
+DOCUMENT = json.dumps({
+    'a': 12.5,
+    'b': -1e3,
+    'c': [1, 2.25e-2, -0.5, 10],
+    'd': 'chunked \\"string\\" é',
+    'e': {'nested': [True, False, None], 'n': 123456789},
+    'f': 7,
+    'g': -42,
+    'h': 3.0E+2,
+}, ensure_ascii=False)
+
+
+def items(document, chunk_size):
+    return list(iter_object_items(io.StringIO(document), chunk_size))
+
+
+def test_matches_json_loads():
+    assert dict(items(DOCUMENT, 1 << 16)) == json.loads(DOCUMENT)
+
+
+def test_every_chunk_size_gives_the_same_items():
+    expected = items(DOCUMENT, len(DOCUMENT))
+    for chunk_size in range(1, len(DOCUMENT) + 1):
+        assert items(DOCUMENT, chunk_size) == expected, chunk_size
+
+
+@pytest.mark.parametrize('document', ['{"a": 12.5}', '{"a": 1e5}', '{"a": -3}', '{"a":12}', '{"a": 0.25E-1 }'])
+def test_numbers_split_across_chunks(document):
+    for chunk_size in range(1, len(document) + 1):
+        assert items(document, chunk_size) == list(json.loads(document).items()), chunk_size
+
+
+def test_empty_object_and_bom():
+    assert items('{}', 1) == []
+    assert items('﻿ { "a" : 1 }', 2) == [('a', 1)]
+
+
+def test_not_an_object():
+    with pytest.raises(ValueError):
+        items('[1, 2]', 4)
+
+
+def test_truncated_document():
+    with pytest.raises(ValueError):
+        items('{"a": 1, "b": ', 3)
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+from metrics import Metrics, MeteredTransport, Progress, UNATTRIBUTED
+from transport import ReplayTransport, request_key
+
+
+def test_progress_prints_at_the_end(capsys):
+    progress = Progress('spells', 3, interval=3600)
+    for _ in range(3):
+        progress.advance()
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1 and lines[0].startswith('spells: 3 of 3 (')
+
+
+def test_progress_of_a_single_item_is_silent(capsys):
+    Progress('lists', 1, interval=0).advance()
+    assert capsys.readouterr().out == ''
+
+
+def test_nested_stages_count_exclusive_time():
+    metrics = Metrics()
+    with metrics.job('parse_spells'):
+        with metrics.stage('sink'):
+            time.sleep(0.01)
+            with metrics.stage('request'):
+                time.sleep(0.1)
+    stages = metrics.jobs['parse_spells'].stages
+    assert stages['request'] >= 0.1
+    # the sink stage took over 0.11s in total, of which only 0.01s outside of the request
+    assert 0.01 <= stages['sink'] < 0.1
+    assert metrics.jobs['parse_spells'].seconds >= stages['request'] + stages['sink']
+
+
+def test_attach_carries_the_job_to_worker_threads():
+    metrics = Metrics()
+    seen = []
+
+    def worker(attach):
+        if attach:
+            with metrics.attach('parse_spells'):
+                metrics.count_response(200, 10)
+                seen.append(metrics.current_job())
+        metrics.count_response(404, 0)
+        seen.append(metrics.current_job())
+
+    with metrics.job('parse_spells'):
+        for attach in (True, False):
+            thread = threading.Thread(target=worker, args=(attach,))
+            thread.start()
+            thread.join()
+        assert metrics.current_job() == 'parse_spells'
+    assert seen == ['parse_spells', UNATTRIBUTED, UNATTRIBUTED]
+    assert dict(metrics.jobs['parse_spells'].statuses) == {'200': 1}
+    assert dict(metrics.jobs[UNATTRIBUTED].statuses) == {'404': 2}
+    assert metrics.current_job() == UNATTRIBUTED
+
+
+def test_report():
+    metrics = Metrics()
+    metrics.jobs['parse_spells'].seconds = 2.0
+    metrics.jobs['parse_spells'].stages.update(request=0.5, sink=0.25)
+    with metrics.attach('parse_spells'):
+        metrics.count_response(200, 100)
+        metrics.count_response(304, 0)
+        metrics.count_cache(hits=3, misses=1)
+        metrics.count_rows('Spells', 40)
+    metrics.count_rows('Skills', 2)
+
+    report = metrics.report()
+    job = report['jobs']['parse_spells']
+    # transform is the rest of the job's time
+    assert job['stages'] == {'request': 0.5, 'cache': 0.0, 'transform': 1.25, 'sink': 0.25}
+    assert job['requests'] == 2 and job['status_codes'] == {'200': 1, '304': 1}
+    assert job['cache_hit_ratio'] == 0.75
+    assert report['jobs'][UNATTRIBUTED]['cache_hit_ratio'] is None
+    assert report['totals'] == {'requests': 2, 'response_bytes': 100, 'cache_hits': 3, 'cache_misses': 1, 'rows': 42}
+    assert json.loads(json.dumps(report)) == report
+
+
+def test_prometheus_text_format():
+    metrics = Metrics()
+    with metrics.attach('parse_spells'):
+        metrics.count_response(200, 100)
+        metrics.count_rows('Magic "Items"', 3)
+    text = metrics.prometheus()
+    lines = text.splitlines()
+    assert text.endswith('\n')
+    assert '# HELP dnd_parser_requests_total API responses by status code' in lines
+    assert '# TYPE dnd_parser_requests_total counter' in lines
+    assert '# TYPE dnd_parser_job_seconds gauge' in lines
+    assert 'dnd_parser_requests_total{job="parse_spells",status="200"} 1' in lines
+    assert 'dnd_parser_response_bytes_total{job="parse_spells"} 100' in lines
+    assert 'dnd_parser_rows_total{job="parse_spells",table="Magic \\"Items\\""} 3' in lines
+    # every sample follows the HELP and TYPE lines of its metric
+    metric = None
+    for line in lines:
+        if line.startswith('# TYPE '):
+            metric = line.split()[2]
+        elif not line.startswith('#'):
+            assert line.split('{')[0] == metric
+
+
+def test_export(tmp_path):
+    metrics = Metrics()
+    metrics.count_rows('Spells', 1)
+    json_path, prometheus_path = tmp_path / 'out' / 'metrics.json', tmp_path / 'metrics.prom'
+    metrics.export(str(json_path), str(prometheus_path))
+    assert json.loads(json_path.read_text())['totals']['rows'] == 1
+    assert prometheus_path.read_text() == metrics.prometheus()
+    assert sorted(path.name for path in tmp_path.rglob('*')) == ['metrics.json', 'metrics.prom', 'out']
+
+
+def test_metered_transport():
+    metrics = Metrics()
+    url = 'https://www.dnd5eapi.co/api/spells/wish'
+    replay = ReplayTransport(latency=0, entries={
+        request_key('GET', url): {'status': 200, 'headers': {}, 'body': '{"index": "wish"}'},
+    })
+    with metrics.attach('parse_spells'):
+        MeteredTransport(replay, metrics).request('GET', url)
+    job = metrics.jobs['parse_spells']
+    assert dict(job.statuses) == {'200': 1} and job.response_bytes == 17
@@ -0,0 +1,65 @@
+import json
+
+from cache_service import FileCache
+from journal import RunJournal
+from mirror import Mirror, cache_location, iter_references
+from parser import Parser
+from transport import ReplayTransport, request_key
+
+API_URL = 'https://www.dnd5eapi.co/api/'
+API = {
+    '': {'spells': '/api/spells', 'classes': '/api/classes'},
+    'spells': {'count': 1, 'results': [{'index': 'fireball', 'url': '/api/spells/fireball'}]},
+    'spells/fireball': {
+        'index': 'fireball',
+        'classes': [{'index': 'wizard', 'url': '/api/classes/wizard'}],
+        # not recorded, the crawl reports it as failed and goes on
+        'damage': {'damage_type': {'index': 'fire', 'url': '/api/damage-types/fire'}},
+    },
+    'classes': {'count': 1, 'results': [{'index': 'wizard', 'url': '/api/classes/wizard'}]},
+    'classes/wizard': {'index': 'wizard', 'class_levels': '/api/classes/wizard/levels'},
+    'classes/wizard/levels': [{'level': 3, 'url': '/api/classes/wizard/levels/3'}],
+    'classes/wizard/levels/3': {'level': 3, 'class': {'index': 'wizard', 'url': '/api/classes/wizard'}},
+}
+
+
+def test_cache_location():
+    assert cache_location('/api') is None
+    assert cache_location('/api/2014') is None
+    assert cache_location('/api/spells') == ('lists', 'spells')
+    assert cache_location('/api/spells/acid-arrow') == ('spells', 'acid-arrow')
+    assert cache_location('/api/2014/spells/acid-arrow') == ('spells', 'acid-arrow')
+    assert cache_location('/api/classes/wizard/levels') == ('classes_levels', 'wizard')
+    assert cache_location('/api/classes/wizard/levels/3') == ('classes_levels', 'wizard-3')
+    assert cache_location('/api/2014/classes/wizard/levels/3/?x=1') == ('classes_levels', 'wizard-3')
+    assert cache_location('/api/magic-items/bag-of-holding') == ('magic_items', 'bag-of-holding')
+    assert cache_location('/api/magic-items') == ('lists', 'magic-items')
+
+
+def test_iter_references():
+    data = {'url': '/api/spells/', 'list': [{'url': '/api/spells?level=1'}, '/api/skills'], 'name': 'api'}
+    assert list(iter_references(data)) == ['/api/spells', '/api/skills']
+
+
+def test_crawl(tmp_path):
+    entries = {
+        request_key('GET', API_URL + path): {'status': 200, 'headers': {}, 'body': json.dumps(body)}
+        for path, body in API.items()
+    }
+    cache = FileCache(str(tmp_path / 'json_dumps'))
+
+    def crawl():
+        parser = Parser(cache=cache, sinks=[], transport=ReplayTransport(latency=0, entries=entries),
+                        max_workers=1, journal=RunJournal(str(tmp_path / 'journal.jsonl')))
+        try:
+            return Mirror(parser, max_workers=2).crawl()
+        finally:
+            parser.close()
+
+    assert crawl() == {'resources': 7, 'cached': 0, 'fetched': 7, 'failed': 1}
+    assert cache.get_entries('lists')['spells'].data == API['spells']
+    assert cache.get_entries('classes_levels')['wizard-3'].data == API['classes/wizard/levels/3']
+    assert set(cache.folders()) >= {'lists', 'spells', 'classes', 'classes_levels'}
+
+    # everything but the root is served from the cache the second time
+    assert crawl() == {'resources': 7, 'cached': 6, 'fetched': 1, 'failed': 1}
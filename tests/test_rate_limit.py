@@ -0,0 +1,125 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from rate_limit import TokenBucket, HostLimiter, RateLimiter, retry_after_seconds
+
+
+class Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {} if retry_after is None else {'Retry-After': retry_after}
+
+
+class ThrottledError(Exception):
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+def replies(*results):
+    """A stub request returning (or raising) ``results`` one call after the other."""
+    calls = []
+
+    def request():
+        result = results[len(calls)]
+        calls.append(result)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return request, calls
+
+
+def limiter(retries=2):
+    return RateLimiter(rates={}, default_rate=1000, max_concurrency=4, retries=retries, backoff_factor=0.01)
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(Response(429, '2')) == 2.0
+    assert retry_after_seconds(Response(429, '-1')) == 0.0
+    assert 55 < retry_after_seconds(Response(429, formatdate(time.time() + 60, usegmt=True))) <= 60
+    assert retry_after_seconds(Response(429, formatdate(time.time() - 60, usegmt=True))) == 0.0
+    assert retry_after_seconds(Response(429, 'soon')) is None
+    assert retry_after_seconds(Response(429)) is None
+    assert retry_after_seconds(None) is None
+
+
+def test_token_bucket_waits_once_the_burst_is_spent():
+    bucket = TokenBucket(rate=50, capacity=2)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert 0.01 < time.monotonic() - started < 0.5
+
+
+def test_token_bucket_block_for():
+    bucket = TokenBucket(rate=1000)
+    bucket.block_for(0.05)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_host_limiter_grows_additively_and_halves_on_errors():
+    host = HostLimiter(rate=100, max_concurrency=8, latency_target=1)
+    host.on_error()
+    assert host.window == 4 and host.bucket.rate == 50
+    # parallel failures right after count as the same congestion signal
+    host.on_error()
+    assert host.window == 4
+
+    for _ in range(4):
+        host.on_success(0.01)
+    assert 4.9 < host.window < 5
+    assert host.bucket.rate == 70
+
+    host._decreased_at = 0
+    host.on_success(5)
+    assert host.concurrency == 2
+
+
+def test_host_limiter_throttle_blocks_the_bucket():
+    host = HostLimiter(rate=100, max_concurrency=8)
+    host.on_throttle(0.5)
+    assert host.throttled == 1 and host.window == 4
+    assert host.bucket.blocked_until > time.monotonic() + 0.4
+
+
+def test_call_retries_throttled_responses():
+    rate_limiter = limiter()
+    request, calls = replies(Response(429, '0'), Response(503, '0'), Response(200))
+    assert rate_limiter.call('api', request).status_code == 200
+    assert len(calls) == 3
+    assert rate_limiter.host('api').throttled == 2
+
+
+def test_call_retries_throttled_exceptions():
+    rate_limiter = limiter()
+    request, calls = replies(ThrottledError(Response(429, '0')), Response(200))
+    assert rate_limiter.call('api', request).status_code == 200
+    assert len(calls) == 2
+
+
+def test_call_raises_other_errors_at_once():
+    rate_limiter = limiter()
+    request, calls = replies(ValueError('broken'), Response(200))
+    with pytest.raises(ValueError):
+        rate_limiter.call('api', request)
+    assert len(calls) == 1
+    assert rate_limiter.host('api').window == 2
+
+
+def test_exhausted_throttling_counts_as_an_error():
+    rate_limiter = limiter(retries=1)
+    request, calls = replies(Response(429, '0'), Response(429, '0'))
+    assert rate_limiter.call('api', request).status_code == 429
+    assert len(calls) == 2
+    host = rate_limiter.host('api')
+    assert host.latency is None
+    assert host.window == 2
+
+    request, calls = replies(ThrottledError(Response(429, '0')), ThrottledError(Response(429, '0')))
+    with pytest.raises(ThrottledError):
+        rate_limiter.call('api', request)
+    assert len(calls) == 2
@@ -0,0 +1,217 @@
+import json
+import os
+
+import pytest
+
+import schemas
+from cache_service import FileCache
+from extractors import Explode, Field, KEY, Schema
+from journal import RunJournal
+from parser import Parser
+from transport import ReplayTransport, request_key
+
+API_URL = 'https://www.dnd5eapi.co/api/'
+# recorded API responses by path: a few entities of every route, their route lists and /levels
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'api.json')
+PARSE_METHODS = [
+    'parse_spells', 'parse_classes', 'parse_races', 'parse_traits', 'parse_features', 'parse_proficiencies',
+    'parse_skills', 'parse_subraces', 'parse_subclasses', 'parse_equipment', 'parse_magic_items',
+]
+
+
+class CollectingSink:
+    def __init__(self):
+        self.tables = {}
+
+    def write(self, name, rows):
+        self.tables[name] = [list(row) for row in rows]
+
+    def close(self):
+        pass
+
+
+def replay_entries():
+    with open(FIXTURE) as fixture:
+        responses = json.load(fixture)
+    return {
+        request_key('GET', API_URL + path): {'status': 200, 'headers': {}, 'body': json.dumps(body)}
+        for path, body in responses.items()
+    }
+
+
+def parse(tmp_path, normalized):
+    sink = CollectingSink()
+    parser = Parser(cache=FileCache(str(tmp_path / 'json_dumps')), sinks=[sink], normalized=normalized,
+                    transport=ReplayTransport(latency=0, entries=replay_entries()), max_workers=1,
+                    journal=RunJournal(str(tmp_path / 'journal.jsonl')))
+    for method in PARSE_METHODS:
+        assert getattr(parser, method)() == 'jobs done', method
+    return {name: [dict(zip(rows[0], row)) for row in rows[1:]] for name, rows in sink.tables.items()}
+
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    return parse(tmp_path_factory.mktemp('parsed'), normalized=False)
+
+
+@pytest.fixture(scope='module')
+def normalized_tables(tmp_path_factory):
+    return parse(tmp_path_factory.mktemp('normalized'), normalized=True)
+
+
+def rows(table, **values):
+    return [row for row in table if all(row[column] == value for column, value in values.items())]
+
+
+def test_spells(tables):
+    spells = tables['Spells']
+    fireball = rows(spells, index='fireball')
+    # one row per class and slot level 3-9
+    assert [(row['class_index'], row['modifier_lvl'], row['damage']) for row in fireball][:8] == [
+        ('sorcerer', level, f'{level + 5}d6') for level in range(3, 10)
+    ] + [('wizard', 3, '8d6')]
+    assert len(fireball) == 14
+    assert fireball[0]['components'] == 'V, S, M'
+    assert fireball[0]['area_of_effect_size'] == 20
+    assert fireball[0]['school'] == 'Evocation'
+    assert fireball[0]['damage_modifier'] == 'slot'
+    assert fireball[0]['description'].count('\n') == 1
+
+    sacred_flame = rows(spells, index='sacred-flame')
+    assert [row['modifier_lvl'] for row in sacred_flame] == list(range(1, 21))
+    assert [row['damage'] for row in sacred_flame if row['modifier_lvl'] in (4, 5, 17)] == ['1d8', '2d8', '4d8']
+    assert sacred_flame[0]['higher_level'] == '' and sacred_flame[0]['material'] is None
+
+    shield = rows(spells, index='shield')
+    assert [(row['class_index'], row['modifier_lvl'], row['damage_modifier']) for row in shield] == [
+        ('sorcerer', '', ''), ('wizard', '', ''),
+    ]
+
+
+def test_normalized_spells(normalized_tables):
+    # the denormalized sheets keep their layout, normalized entities get tables of their own
+    assert not {'Spells', 'Traits', 'Proficiencies'} & set(normalized_tables)
+    assert [row['index'] for row in normalized_tables['Spells_Normalized']] == ['fireball', 'sacred-flame', 'shield']
+    assert 'class_index' not in normalized_tables['Spells_Normalized'][0]
+    assert [(row['spell_index'], row['class_index']) for row in normalized_tables['Spell_Classes']] == [
+        ('fireball', 'sorcerer'), ('fireball', 'wizard'), ('sacred-flame', 'cleric'),
+        ('shield', 'sorcerer'), ('shield', 'wizard'),
+    ]
+    progression = normalized_tables['Spell_Damage_Progression']
+    assert len(rows(progression, spell_index='fireball')) == 7
+    assert len(rows(progression, spell_index='sacred-flame')) == 20
+    assert not rows(progression, spell_index='shield')
+
+
+def test_classes(tables):
+    levels = tables['Classes']
+    assert [row['level'] for row in levels] == [1, 2, 3, 4]
+    assert levels[0]['saving_throws'] == 'INT, WIS'
+    assert levels[0]['features_names'] == 'Spellcasting: Wizard, Arcane Recovery'
+    assert [row['ability_score_bonuses'] for row in levels] == [0, 0, 0, 1]
+    assert [row['spell_slots_level_2'] for row in levels] == [0, 0, 2, 3]
+    assert all(row['is_caster'] for row in levels)
+    assert [row['skill_index'] for row in tables['Classes_Skills']] == [
+        'arcana', 'history', 'insight', 'investigation', 'medicine', 'religion',
+    ]
+    assert tables['Classes_Skills'][0]['skills_choose'] == 2
+
+
+def test_races_and_subraces(tables):
+    dragonborn, = tables['Races']
+    assert (dragonborn['STR_mod'], dragonborn['CHA_mod'], dragonborn['DEX_mod']) == (2, 1, None)
+    assert dragonborn['languages'] == 'Common, Draconic'
+    assert dragonborn['proficiencies_names'] == ''
+    high_elf, = tables['Subraces']
+    assert high_elf['INT_mod'] == 1 and high_elf['race_index'] == 'elf'
+    assert high_elf['proficiencies_names'] == 'Longswords, Shortswords, Shortbows, Longbows'
+
+
+def test_traits(tables, normalized_tables):
+    red = rows(tables['Traits'], index='draconic-ancestry-red')
+    assert [row['level'] for row in red] == list(range(1, 21))
+    assert [row['damage'] for row in red if row['level'] in (5, 6, 11, 16, 20)] == ['2d6', '3d6', '4d6', '5d6', '5d6']
+    assert {(row['race_index'], row['subrace_index'], row['damage_type'], row['dc']) for row in red} == {
+        ('dragonborn', '', 'Fire', 'DEX'),
+    }
+    darkvision = rows(tables['Traits'], index='darkvision')
+    assert all(row['level'] == '' and row['is_damage'] is False for row in darkvision)
+    assert [row['race_index'] for row in darkvision] == [
+        row['race_index'] for row in rows(normalized_tables['Trait_Races'], trait_index='darkvision')
+    ]
+    assert len(normalized_tables['Traits_Normalized']) == 2
+    assert len(normalized_tables['Trait_Damage_Progression']) == 20
+
+
+def test_features_skills_subclasses(tables):
+    assert tables['Features'] == [{
+        'index': 'arcane-recovery', 'name': 'Arcane Recovery', 'class_index': 'wizard', 'subclass_index': None,
+        'description': tables['Features'][0]['description'], 'level': 1,
+    }]
+    assert tables['Skills'][0]['ability_score'] == 'INT'
+    assert [(row['level'], row['features_names']) for row in tables['Subclasses']] == [
+        (3, 'Channel Divinity: Sacred Weapon, Channel Divinity: Turn the Unholy'), (7, 'Aura of Devotion'),
+    ]
+    spells = tables['Subclasses_Spells']
+    assert rows(spells, spell_index='sanctuary') == [
+        {'subclass_index': 'devotion', 'spell_index': 'sanctuary', 'class_index': 'paladin', 'class_level': '3'},
+    ]
+    assert len(spells) == 10
+
+
+def test_proficiencies(tables, normalized_tables):
+    assert [(row['class_index'], row['race_index']) for row in tables['Proficiencies']] == [
+        ('bard', 'high-elf'), ('rogue', 'high-elf'),
+    ]
+    assert tables['Proficiencies'][0]['reference_index'] == 'longsword'
+    assert len(normalized_tables['Proficiencies_Normalized']) == 1
+    assert [row['class_index'] for row in normalized_tables['Proficiency_Classes']] == ['bard', 'rogue']
+
+
+def test_equipment(tables):
+    armor, longsword = tables['Equipment']
+    assert (armor['index'], armor['cost'], armor['ac'], armor['ac_dex_bonus']) == ('leather-armor', '10 gp', 11, None)
+    assert (longsword['damage_dice'], longsword['2h_damage_dice'], longsword['properties_indices']) == (
+        '1d8', '1d10', 'versatile',
+    )
+    assert longsword['ac_dex_bonus'] == 0
+
+
+def test_magic_items(tables):
+    # the variant is listed before the item it belongs to
+    assert [(row['index'], row['has_children'], row['parent_index']) for row in tables['Magic Items']] == [
+        ('armor-1', False, 'armor'), ('armor', True, None),
+    ]
+
+
+def test_schema_extract():
+    schema = Schema([
+        Field('index', KEY),
+        Field('name', 'name', default='?'),
+        Field('first', 'tags.0'),
+        Field('deep', 'a.b.c', default=0),
+        Field('tag', 'tag'),
+        Field('both', ('name', 'tag'), transform=lambda name, tag: f'{name}/{tag}'),
+    ], [Explode('tag', 'tags', empty=['-'])])
+    table = schema.extract([('x', {'name': 'X', 'tags': ['t1', 't2'], 'a': {'b': {'c': 5}}}), ('y', {'tags': []})])
+    assert list(table) == [
+        ['index', 'name', 'first', 'deep', 'tag', 'both'],
+        ['x', 'X', 't1', 5, 't1', 'X/t1'],
+        ['x', 'X', 't1', 5, 't2', 'X/t2'],
+        ['y', '?', None, 0, '-', 'None/-'],
+    ]
+    assert 'def extract' in schema.source
+
+
+def test_schema_errors():
+    with pytest.raises(ValueError):
+        Schema([Field('index', KEY)], [Explode('a', 'x'), Explode('a', 'y')])
+    with pytest.raises(ValueError):
+        Schema([Field('index', KEY)], [Explode('a', 'b.items'), Explode('b', 'x')])
+
+
+def test_every_schema_compiles():
+    for name in dir(schemas):
+        schema = getattr(schemas, name)
+        if isinstance(schema, Schema):
+            assert list(schema.extract([])) == [schema.headers], name
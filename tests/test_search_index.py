@@ -0,0 +1,102 @@
+import pytest
+
+from cache_service import CachePolicy, FileCache
+from search_index import SearchIndex, spell_document, spell_library_document, tokenize
+
+SPELLS = [
+    {'index': 'fireball', 'name': 'Fireball', 'level': 3, 'school': {'index': 'evocation'},
+     'desc': ['A bright streak blossoms into an explosion of flame. A target takes 8d6 fire damage.'],
+     'higher_level': ['The damage increases by 1d6.'],
+     'classes': [{'index': 'sorcerer'}, {'index': 'wizard'}], 'subclasses': [{'index': 'lore'}]},
+    {'index': 'fire-bolt', 'name': 'Fire Bolt', 'level': 0, 'school': {'index': 'evocation'},
+     'desc': ['You hurl a mote of fire. A target takes 1d10 fire damage. Fire fire fire.'],
+     'classes': [{'index': 'wizard'}]},
+    {'index': 'cure-wounds', 'name': 'Cure Wounds', 'level': 1, 'school': {'index': 'evocation'},
+     'desc': ['A creature you touch regains hit points.'], 'classes': [{'index': 'cleric'}]},
+    {'index': 'firewall', 'name': 'Wall of Fire', 'level': 4, 'school': {'index': 'evocation'},
+     'desc': ['You create a wall of fire. Damage on a failed save.'], 'classes': [{'index': 'wizard'}]},
+]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex.build(spell_document(spell) for spell in SPELLS)
+
+
+def indices(results):
+    return [result['index'] for result in results]
+
+
+def test_tokenize():
+    assert tokenize("The Dragon's Breath, 8d6 fire-damage!") == ['dragons', 'breath', '8d6', 'fire', 'damage']
+
+
+def test_single_term(index):
+    results = index.search('wounds', prefix=False)
+    assert indices(results) == ['cure-wounds']
+    assert index.search('nothing') == []
+    assert index.search('the of') == []
+
+
+def test_ranking(index):
+    # a name match weighs more than a mention, more mentions more than fewer
+    assert indices(index.search('fire', prefix=False)) == ['fire-bolt', 'firewall', 'fireball']
+    results = index.search('fire', prefix=False)
+    assert results == sorted(results, key=lambda result: -result['score'])
+
+
+def test_prefix(index):
+    assert indices(index.search('wal')) == ['firewall']
+    assert indices(index.search('wal', prefix=False)) == []
+    # the exact term beats terms it is only a prefix of
+    assert indices(index.search('fire'))[0] == 'fire-bolt'
+    assert set(indices(index.search('fir'))) == {'fireball', 'fire-bolt', 'firewall'}
+
+
+def test_every_token_has_to_match(index):
+    assert set(indices(index.search('fire damage'))) == {'fireball', 'fire-bolt', 'firewall'}
+    assert indices(index.search('fire target hurl')) == ['fire-bolt']
+    assert indices(index.search('fire touch')) == []
+    # only the last token matches as a prefix
+    assert indices(index.search('wal fire')) == []
+    assert indices(index.search('fire wal')) == ['firewall']
+
+
+def test_filters_and_limit(index):
+    assert set(indices(index.search('fire', filters={'level': 3}))) == {'fireball'}
+    assert set(indices(index.search('fire', filters={'class': 'LORE'}))) == {'fireball'}
+    assert set(indices(index.search('fire damage', filters={'class': 'wizard', 'level': 4}))) == {'firewall'}
+    assert index.search('fire', filters={'type': 'features'}) == []
+    assert len(index.search('fire', limit=2)) == 2
+    assert len(index.search('fire damage', limit=1)) == 1
+
+
+def test_save_and_load(tmp_path, index):
+    path = str(tmp_path / 'index.json.gz')
+    index.save(path)
+    loaded = SearchIndex.load(path)
+    for query in ('fire', 'fire damage', 'cur', 'wall fi'):
+        assert loaded.search(query) == index.search(query)
+
+
+def test_spell_library_rows():
+    headers = ['name', 'description', 'level', 'school', 'wizard', 'cleric', 'source']
+    document = spell_library_document(dict(zip(headers, ['Acid Splash', 'Acid hurled.', '0', 'Conjuration', True,
+                                                         False, 'PHB'])))
+    index = SearchIndex.build([document])
+    assert index.search('acid', filters={'level': 0, 'class': 'wizard', 'source': 'phb'})[0]['name'] == 'Acid Splash'
+
+
+def test_from_cache_reads_graphql_entities(tmp_path):
+    cache = CachePolicy(FileCache(str(tmp_path / 'json_dumps')), ttls={}, default_ttl=None)
+    cache.put_many('spells', {'fireball': SPELLS[0]})
+    cache.put_many('spells_graphql', {
+        'fireball': dict(SPELLS[0], name='Partial Fireball'), 'fire-bolt': SPELLS[1],
+    })
+    cache.put_many('traits', {'darkvision': {'index': 'darkvision', 'name': 'Darkvision', 'desc': ['See.']}})
+    index = SearchIndex.from_cache(cache)
+    assert sorted((document['type'], document['name']) for document in index.documents) == [
+        ('spells', 'Fire Bolt'), ('spells', 'Fireball'), ('traits', 'Darkvision'),
+    ]
+    # folders that were never cached are not created
+    assert cache.backend.folders() == ['spells', 'spells_graphql', 'traits']
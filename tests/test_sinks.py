@@ -0,0 +1,136 @@
+from sinks import GsheetSink, column_letter, diff_rows, sheet_value, table_name
+
+HEADERS = ['index', 'level', 'name']
+
+
+def test_helpers():
+    assert [column_letter(column) for column in (1, 26, 27, 52, 703)] == ['A', 'Z', 'AA', 'AZ', 'AAA']
+    assert table_name('Magic Items') == 'magic_items'
+    assert [sheet_value(value) for value in (None, True, False, 3, 1.5, 'x')] == ['', 'TRUE', 'FALSE', '3', '1.5', 'x']
+
+
+def test_unchanged_table():
+    old = [HEADERS, ['fireball', '3', 'Fireball'], ['wish', '9', 'Wish']]
+    new = [HEADERS, ['fireball', 3, 'Fireball'], ['wish', 9, 'Wish']]
+    layout, counts = diff_rows(old, new, ['index'])
+    assert layout == new
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_updated_rows_stay_in_place():
+    old = [HEADERS, ['fireball', '3', 'Fireball'], ['wish', '9', 'Wish']]
+    new = [HEADERS, ['wish', 9, 'Wish!'], ['fireball', 3, 'Fireball']]
+    layout, counts = diff_rows(old, new, ['index'])
+    assert layout == [HEADERS, ['fireball', 3, 'Fireball'], ['wish', 9, 'Wish!']]
+    assert counts == {'inserted': 0, 'updated': 1, 'deleted': 0}
+
+
+def test_inserted_rows_fill_deleted_ones_first():
+    old = [HEADERS, ['a', '1', 'A'], ['b', '2', 'B'], ['c', '3', 'C']]
+    new = [HEADERS, ['a', 1, 'A'], ['c', 3, 'C'], ['d', 4, 'D'], ['e', 5, 'E']]
+    layout, counts = diff_rows(old, new, ['index'])
+    assert layout == [HEADERS, ['a', 1, 'A'], ['d', 4, 'D'], ['c', 3, 'C'], ['e', 5, 'E']]
+    assert counts == {'inserted': 2, 'updated': 0, 'deleted': 1}
+
+
+def test_gaps_are_closed_from_the_bottom():
+    old = [HEADERS, ['a', '1', 'A'], ['b', '2', 'B'], ['c', '3', 'C'], ['d', '4', 'D']]
+    new = [HEADERS, ['c', 3, 'C'], ['d', 4, 'D']]
+    layout, counts = diff_rows(old, new, ['index'])
+    assert layout == [HEADERS, ['d', 4, 'D'], ['c', 3, 'C']]
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 2}
+
+
+def test_duplicate_keys_and_whole_row_matching():
+    old = [HEADERS, ['a', '1', ''], ['a', '1']]
+    new = [HEADERS, ['a', 1, None], ['a', 1, None], ['a', 1, None]]
+    layout, counts = diff_rows(old, new)
+    assert layout == new
+    assert counts == {'inserted': 1, 'updated': 0, 'deleted': 0}
+
+
+def test_empty_sheet():
+    new = [HEADERS, ['a', 1, 'A']]
+    assert diff_rows([], new, ['index']) == (new, {'inserted': 1, 'updated': 0, 'deleted': 0})
+    assert diff_rows([HEADERS, ['a', '1', 'A']], [HEADERS], ['index']) == (
+        [HEADERS], {'inserted': 0, 'updated': 0, 'deleted': 1}
+    )
+
+
+class FakeWorksheet:
+    """The worksheet calls GsheetSink makes, on a grid of strings padded like gspread's get_all_values."""
+
+    def __init__(self, values, rows=100, cols=10):
+        self.row_count, self.col_count = rows, cols
+        self.cells = {}
+        for row_number, row in enumerate(values, 1):
+            for column, value in enumerate(row, 1):
+                self.cells[(row_number, column)] = value
+        self.updates = 0
+
+    def get_all_values(self):
+        filled = [cell for cell, value in self.cells.items() if value != '']
+        height = max((row for row, _ in filled), default=0)
+        width = max((column for _, column in filled), default=0)
+        return [[self.cells.get((row, column), '') for column in range(1, width + 1)] for row in range(1, height + 1)]
+
+    @staticmethod
+    def _cell(reference):
+        letters = reference.rstrip('0123456789')
+        column = 0
+        for letter in letters:
+            column = column * 26 + ord(letter) - ord('A') + 1
+        return int(reference[len(letters):]), column
+
+    def add_rows(self, count):
+        self.row_count += count
+
+    def add_cols(self, count):
+        self.col_count += count
+
+    def batch_update(self, data, value_input_option=None):
+        self.updates += 1
+        for update in data:
+            (first_row, first_column), (last_row, last_column) = map(self._cell, update['range'].split(':'))
+            assert len(update['values']) == last_row - first_row + 1
+            for row_number, row in enumerate(update['values'], first_row):
+                assert len(row) == last_column - first_column + 1
+                for column, value in enumerate(row, first_column):
+                    self.cells[(row_number, column)] = str(value)
+
+    def batch_clear(self, ranges):
+        for cell_range in ranges:
+            (first_row, first_column), (last_row, last_column) = map(self._cell, cell_range.split(':'))
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    self.cells.pop((row, column), None)
+
+
+def test_sync_writes_only_changes():
+    worksheet = FakeWorksheet([HEADERS, ['a', '1', 'A'], ['b', '2', 'B']])
+    stats = GsheetSink.sync(worksheet, [HEADERS, ['a', 1, 'A'], ['b', 2, 'B']], ['index'])
+    assert stats == {'inserted': 0, 'updated': 0, 'deleted': 0} and worksheet.updates == 0
+
+    stats = GsheetSink.sync(worksheet, [HEADERS, ['b', 2, 'B!'], ['c', 3, None]], ['index'])
+    assert stats == {'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert worksheet.get_all_values() == [HEADERS, ['c', '3', ''], ['b', '2', 'B!']]
+
+
+def test_sync_shrinks_the_sheet():
+    worksheet = FakeWorksheet([HEADERS, ['a', '1', 'A'], ['b', '2', 'B'], ['c', '3', 'C']])
+    GsheetSink.sync(worksheet, [HEADERS, ['a', 1, 'A']], ['index'])
+    assert worksheet.get_all_values() == [HEADERS, ['a', '1', 'A']]
+
+
+def test_sync_clears_columns_the_table_no_longer_has():
+    worksheet = FakeWorksheet([['index', 'class_index', 'desc'], ['fireball', 'wizard', 'Boom'],
+                               ['wish', 'wizard', 'Anything']])
+    GsheetSink.sync(worksheet, [['index', 'desc'], ['fireball', 'Boom'], ['wish', 'Anything']], ['index'])
+    assert worksheet.get_all_values() == [['index', 'desc'], ['fireball', 'Boom'], ['wish', 'Anything']]
+
+
+def test_sync_grows_the_sheet():
+    worksheet = FakeWorksheet([], rows=1, cols=2)
+    GsheetSink.sync(worksheet, [HEADERS, ['a', 1, 'A'], ['b', 2, 'B']], ['index'])
+    assert (worksheet.row_count, worksheet.col_count) == (3, 3)
+    assert worksheet.get_all_values() == [HEADERS, ['a', '1', 'A'], ['b', '2', 'B']]
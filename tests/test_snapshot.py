@@ -0,0 +1,114 @@
+import os
+import threading
+
+import pytest
+
+from column_table import ColumnTable
+from sinks import SnapshotSink
+from snapshot import Snapshot, write_snapshot
+
+SPELLS = [
+    ['index', 'name', 'level', 'weight', 'ritual', 'mixed'],
+    ['fireball', 'Fireball', 3, 1.5, False, 1],
+    ['acid-arrow', 'Acid Arrow', 2, None, True, 'a'],
+    [None, 'Nameless', None, 2, None, 2.5],
+    ['fireball', 'Fireball', 4, '', '', None],
+    ['wish', 'Wish', 9, 0.25, True, ''],
+]
+LEVELS = [['level', 'count'], [1, 10], [2, 20], [3, 30]]
+
+
+def write(path, tables, generation=1):
+    write_snapshot(str(path), {name: (rows[0], rows[1:]) for name, rows in tables.items()}, generation)
+
+
+def expected(rows):
+    # '' is null in numeric and bool columns, mixed columns come back as their sheet text
+    return [
+        [row[0], row[1], None if row[2] == '' else row[2], None if row[3] == '' else row[3],
+         None if row[4] == '' else row[4], None if row[5] is None else str(row[5])]
+        for row in rows[1:]
+    ]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'test.dndsnap'
+    write(path, {'Spells': SPELLS, 'Levels': LEVELS}, generation=7)
+    with Snapshot(str(path)) as snapshot:
+        assert snapshot.generation == 7
+        spells = snapshot.table('Spells')
+        assert spells.types == ['s', 's', 'q', 'n', 'b', 's']
+        assert list(spells.rows()) == [SPELLS[0]] + expected(SPELLS)
+        assert spells.row_dict(1)['name'] == 'Acid Arrow'
+        assert spells.cell(0, 'weight') == 1.5 and spells.cell(2, 'weight') == 2
+        assert type(spells.cell(2, 'weight')) is int
+        assert list(snapshot['Levels']) == LEVELS[1:]
+        with pytest.raises(IndexError):
+            spells.row(len(spells))
+
+
+def test_find(tmp_path):
+    path = tmp_path / 'test.dndsnap'
+    write(path, {'Spells': SPELLS, 'Levels': LEVELS})
+    with Snapshot(str(path)) as snapshot:
+        spells = snapshot.table('Spells')
+        assert spells.find('fireball') == [0, 3]
+        assert [row['level'] for row in spells.get('fireball')] == [3, 4]
+        assert spells.find('missing') == []
+        # rows without a key are indexed under the empty key
+        assert spells.find(None) == [2]
+        assert snapshot.table('Levels').find(2) == [1]
+
+
+def test_empty_table(tmp_path):
+    path = tmp_path / 'test.dndsnap'
+    write(path, {'Empty': [['index', 'name']]})
+    with Snapshot(str(path)) as snapshot:
+        assert len(snapshot.table('Empty')) == 0
+        assert list(snapshot.table('Empty').rows()) == [['index', 'name']]
+        assert snapshot.table('Empty').find('x') == []
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'test.dndsnap'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+
+
+def test_concurrent_writers(tmp_path):
+    path = tmp_path / 'test.dndsnap'
+    errors = []
+
+    def writer(generation):
+        try:
+            for _ in range(20):
+                write(path, {'Spells': SPELLS, 'Levels': LEVELS}, generation)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=writer, args=(generation,)) for generation in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert os.listdir(tmp_path) == ['test.dndsnap']
+    with Snapshot(str(path)) as snapshot:
+        assert snapshot.generation in range(1, 5)
+        assert list(snapshot.table('Spells').rows()) == [SPELLS[0]] + expected(SPELLS)
+
+
+def test_sink_carries_over_tables(tmp_path):
+    path = str(tmp_path / 'test.dndsnap')
+    sink = SnapshotSink(path)
+    sink.write('Spells', SPELLS)
+    sink.write('Levels', ColumnTable.from_rows(LEVELS))
+    sink.close()
+    sink = SnapshotSink(path)
+    sink.write('Levels', LEVELS[:2])
+    sink.close()
+    with Snapshot(path) as snapshot:
+        assert snapshot.generation == 2
+        assert list(snapshot.table('Spells').rows()) == [SPELLS[0]] + expected(SPELLS)
+        assert list(snapshot.table('Levels').rows()) == LEVELS[:2]
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+from sinks import SqlSink
+from sql_export import copy_literal, export_csv, export_csv_dir, sql_literal, write_sql
+
+
+@pytest.mark.parametrize('value, literal', [
+    (None, 'null'), ('', 'null'), (True, 'TRUE'), (False, 'FALSE'), ('TRUE', 'TRUE'), ('FALSE', 'FALSE'),
+    (3, '3'), (1.5, '1.5'), ('42', '42'), ('1.5', "'1.5'"), ('-1', "'-1'"),
+    ("Tasha's Hideous Laughter", "'Tasha''s Hideous Laughter'"), ("''", "''''''"), ('a\nb', "'a\nb'"),
+])
+def test_sql_literal(value, literal):
+    assert sql_literal(value) == literal
+
+
+@pytest.mark.parametrize('value, literal', [
+    (None, '\\N'), ('', '\\N'), (True, 'true'), (False, 'false'), (3, '3'), ("it's", "it's"),
+    ('a\tb\nc\rd\\e', 'a\\tb\\nc\\rd\\\\e'),
+])
+def test_copy_literal(value, literal):
+    assert copy_literal(value) == literal
+
+
+def sql(rows, **options):
+    output = io.StringIO()
+    written = write_sql(output, 'spells', ['name', 'level'], rows, dataset='core', **options)
+    return written, output.getvalue()
+
+
+def test_single_batch():
+    written, text = sql([['x', '1'], ['y', '2']])
+    assert written == 2
+    assert text == "INSERT INTO core.spells (name, level) \nVALUES\n('x', 1),\n('y', 2);\n"
+
+
+@pytest.mark.parametrize('count, batch_size, statements', [(0, 2, 0), (1, 2, 1), (4, 2, 2), (5, 2, 3), (3, 0, 3)])
+def test_batch_boundaries(count, batch_size, statements):
+    rows = [[f'spell {number}', str(number)] for number in range(count)]
+    written, text = sql(rows, batch_size=batch_size)
+    assert written == count
+    assert text.count('INSERT INTO') == statements
+    assert text.count(';\n') == statements
+    assert all(f"('spell {number}', {number})" in text for number in range(count))
+
+
+def test_duplicate_last_row_ends_the_statement():
+    # the old export looked rows up with rows.index, a repeated last row was written with ',' instead of ';'
+    written, text = sql([['x', '1'], ['y', '2'], ['x', '1']], batch_size=10)
+    assert written == 3
+    assert text.endswith("('y', 2),\n('x', 1);\n")
+
+
+def test_copy():
+    written, text = sql(iter([['x', '1'], ['tab\there', ''], [None, True]]), copy=True)
+    assert written == 3
+    assert text == 'COPY core.spells (name, level) FROM STDIN;\nx\t1\ntab\\there\t\\N\n\\N\ttrue\n\\.\n'
+
+
+def test_export_csv(tmp_path):
+    (tmp_path / 'csv').mkdir()
+    csv_path = tmp_path / 'csv' / 'DnD entities data - Magic Items.csv'
+    csv_path.write_text('name,rare\nBag,FALSE\n"Wand, +1",TRUE\n')
+    output = tmp_path / 'output.sql'
+    assert export_csv(str(csv_path), 'items', str(output), dataset='core', batch_size=1) == 2
+    assert output.read_text() == (
+        "INSERT INTO core.items (name, rare) \nVALUES\n('Bag', FALSE);\n"
+        "INSERT INTO core.items (name, rare) \nVALUES\n('Wand, +1', TRUE);\n"
+    )
+    assert export_csv_dir(str(tmp_path / 'csv'), str(tmp_path / 'sql'), dataset='core') == {'magic_items': 2}
+    assert (tmp_path / 'sql' / 'magic_items.sql').read_text().startswith('INSERT INTO core.magic_items (name, rare)')
+
+
+def test_sink(tmp_path):
+    sink = SqlSink(str(tmp_path), dataset='core', copy=True)
+    sink.write('Magic Items', [['name', 'rare'], ['Bag', False]])
+    assert (tmp_path / 'magic_items.sql').read_text() == \
+        'COPY core.magic_items (name, rare) FROM STDIN;\nBag\tfalse\n\\.\n'
@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Callable
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import TRANSPORT_MODE, TRANSPORT_ARCHIVE, REPLAY_LATENCY
+
+ARCHIVE_VERSION = 1
+
+
+class ReplayMissError(KeyError):
+    pass
+
+
+def request_key(method: str, url: str, params: Optional[Dict] = None, json_payload=None) -> str:
+    """'GET https://www.dnd5eapi.co/api/spells', query params and request bodies are part of the key."""
+    key = f'{method.upper()} {url}'
+    if params:
+        key += '?' + '&'.join(f'{name}={params[name]}' for name in sorted(params))
+    if json_payload is not None:
+        key += ' #' + hashlib.sha1(json.dumps(json_payload, sort_keys=True).encode()).hexdigest()
+    return key
+
+
+def load_archive(path: str) -> Dict[str, Dict]:
+    with gzip.open(path, 'rt') as archive:
+        payload = json.load(archive)
+    if payload.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f'{path} is not a version {ARCHIVE_VERSION} http archive')
+    return payload['entries']
+
+
+def save_archive(path: str, entries: Dict[str, Dict]) -> None:
+    temp_path = f'{path}.tmp'
+    with gzip.open(temp_path, 'wt') as archive:
+        json.dump({'version': ARCHIVE_VERSION, 'entries': entries}, archive)
+    os.replace(temp_path, path)
+
+
+def build_response(entry: Dict, url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+    response._content = entry['body'].encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+
+class PassthroughTransport:
+    """Sends requests through a (pooled) requests session."""
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method=method, url=url, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingTransport(PassthroughTransport):
+    """Passes requests through and keeps every exchange, the archive is written on close."""
+
+    def __init__(self, session: requests.Session, archive_path: str = TRANSPORT_ARCHIVE):
+        super().__init__(session)
+        self.archive_path = archive_path
+        self.entries = load_archive(archive_path) if os.path.exists(archive_path) else {}
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = super().request(method, url, **kwargs)
+        # conditional revalidations would record a bodyless 304, throttled requests are retried
+        if response.status_code not in (304, 429, 503):
+            key = request_key(method, url, kwargs.get('params'), kwargs.get('json'))
+            with self._lock:
+                self.entries[key] = {
+                    'status': response.status_code,
+                    'headers': {
+                        name: value for name, value in response.headers.items()
+                        if name.lower() in ('content-type', 'etag', 'last-modified')
+                    },
+                    'body': response.text,
+                }
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            save_archive(self.archive_path, self.entries)
+
+
+class ReplayTransport:
+    """Serves recorded exchanges with an optional artificial latency, requests missing from the archive raise."""
+
+    def __init__(self, archive_path: str = TRANSPORT_ARCHIVE, latency: float = REPLAY_LATENCY,
+                 entries: Optional[Dict[str, Dict]] = None):
+        self.entries = load_archive(archive_path) if entries is None else entries
+        self.latency = latency
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        key = request_key(method, url, kwargs.get('params'), kwargs.get('json'))
+        entry = self.entries.get(key)
+        if self.latency:
+            time.sleep(self.latency)
+        if entry is None:
+            raise ReplayMissError(f'{key} is not in the http archive')
+        return build_response(entry, url)
+
+    def close(self) -> None:
+        pass
+
+
+def build_transport(mode: str = TRANSPORT_MODE, session_factory: Optional[Callable[[], requests.Session]] = None,
+                    archive_path: str = TRANSPORT_ARCHIVE, latency: float = REPLAY_LATENCY, limiter=None):
+    """Network transports are rate limited by ``limiter`` (a rate_limit.RateLimiter) when given, replay is not."""
+    if mode == 'replay':
+        return ReplayTransport(archive_path, latency=latency)
+    if mode not in ('passthrough', 'record'):
+        raise ValueError(f'unknown transport mode {mode}, expected passthrough, record or replay')
+    session = session_factory() if session_factory else requests.Session()
+    transport = RecordingTransport(session, archive_path) if mode == 'record' else PassthroughTransport(session)
+    if limiter is None:
+        return transport
+    from rate_limit import RateLimitedTransport
+    return RateLimitedTransport(transport, limiter)